@@ -1,5 +1,8 @@
+import numpy as np
 import pandas as pd
 
+from precompute import get_weekly_aggregates, stack_weekly_aggregates
+
 def get_luck_index_v3(league_data):
     '''
     Calculate how 'lucky' a team is based on opponent performance.
@@ -12,33 +15,18 @@ def get_luck_index_v3(league_data):
     Returns:
     - luck_indices: A list of luck indices for all teams.
     '''
+    aggregates = get_weekly_aggregates(league_data)
+
     num_teams = len(league_data['teams'])
     luck_indices = [0] * (num_teams + 5)  # add arbitrary buffer for non-sequential IDs, in case of missing teams
 
-    current_week = league_data['current_week']
-    reg_season_count = league_data['regular_season_count']
-
-    # Loop through each regular season week
-    for week in range(1, min(current_week + 1, reg_season_count + 1)):
-        box_scores = league_data['box_scores'][week]
+    # Each team's luck is the sum over every week up to the current one of how far
+    # its opponent fell short of their projection (weeks without a game are NaN)
+    team_luck = np.nansum(aggregates['opponent_projected'] - aggregates['opponent_scores'], axis=1)
 
-        # Process each matchup
-        for box_score in box_scores:
-            # Skip invalid matchups (Bye weeks or incomplete data)
-            if box_score['away_team_id'] == 0 or box_score['home_team_id'] == 0:
-                continue
-
-            # Update luck index for the home team
-            home_team_id = box_score['home_team_id']
-            home_luck = box_score['away_projected'] - box_score['away_score']
-            if 0 <= home_team_id < len(luck_indices):
-                luck_indices[home_team_id] += home_luck
-
-            # Update luck index for the away team
-            away_team_id = box_score['away_team_id']
-            away_luck = box_score['home_projected'] - box_score['home_score']
-            if 0 <= away_team_id < len(luck_indices):
-                luck_indices[away_team_id] += away_luck
+    for team_id, luck in zip(aggregates['team_ids'], team_luck):
+        if 0 <= team_id < len(luck_indices):
+            luck_indices[team_id] += float(luck)
 
     return luck_indices
 
@@ -97,93 +85,144 @@ def calculate_pythagorean_expectation_luck(league_data, p=2):
 
     return team_luck_data
 
-def calculate_scatterplot_luck(league_data):
+def normal_cdf(x):
     """
-    Calculate matchup-based scatterplot luck for all teams.
+    Standard normal CDF of an array, via the Abramowitz-Stegun 7.1.26 approximation of erf
+    (absolute error below 1.5e-7).
+    """
+    z = np.abs(np.asarray(x, dtype=float)) / np.sqrt(2)
+    t = 1.0 / (1.0 + 0.3275911 * z)
+    polynomial = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - polynomial * np.exp(-z * z)
+    return 0.5 * (1.0 + np.sign(x) * erf)
+
+def calculate_projection_luck(seasons):
+    """
+    Calculate projection-based win probability luck: each matchup's projected scores are turned into
+    a pregame win probability, and a team's expected wins are the sum of those probabilities.
+
+    The uncertainty of a projected margin is fitted from the league's own projection errors
+    (actual margin - projected margin) over every completed matchup of every season given.
 
     Parameters:
-    - league_data: The dictionary with data on teams and matchups.
+    - seasons: A league_data dictionary or a list of them (e.g. a league's full history).
 
     Returns:
-    - Pandas DataFrame with Team Name, Points For, Points Against, Result, Matchup Luck Type, and Opponent.
+    - List of dictionaries with Team Name, Team ID, Actual Wins, Expected Wins, and Luck Index.
+    """
+    return projection_luck_records(stack_weekly_aggregates(seasons))
+
+def projection_margin_std(aggregates, num_weeks=None):
     """
-    matchup_luck_data = []
+    Standard deviation of the projection error of matchup margins, fitted over all completed matchups.
 
-    # Preprocess teams for quick lookups
-    team_id_to_team = {team["id"]: team for team in league_data["teams"]}
+    Parameters:
+    - aggregates: Weekly aggregates (single season or stacked seasons).
+    - num_weeks: Optional. Only use the first num_weeks week columns (default: all of them).
 
-    # Calculate weekly league averages
-    weekly_avg_scores = {}
-    current_week = league_data['current_week']
-    regular_season_count = league_data['regular_season_count']
+    Returns:
+    - The fitted standard deviation, NaN if there is no completed matchup.
+    """
+    margin_errors, valid = _projection_margins(aggregates, num_weeks)[1:]
+    if not valid.any():
+        return float('nan')
+    # Both teams of a matchup contribute the same squared error, so this is the per-matchup RMS
+    return float(np.sqrt(np.mean(margin_errors[valid] ** 2)))
+
+def _projection_margins(aggregates, num_weeks=None):
+    weeks = slice(None, num_weeks)
+    projected_margins = aggregates['projected'][:, weeks] - aggregates['opponent_projected'][:, weeks]
+    actual_margins = aggregates['scores'][:, weeks] - aggregates['opponent_scores'][:, weeks]
+    valid = aggregates['played'][:, weeks] & ~np.isnan(projected_margins) & ~np.isnan(actual_margins)
+    return projected_margins, actual_margins - projected_margins, valid
+
+def projection_luck_records(aggregates, num_weeks=None):
+    """
+    Projection win probability luck from (possibly stacked or edited) weekly aggregates.
+
+    Parameters:
+    - aggregates: Weekly aggregates with 'team_ids', 'team_names', 'scores', 'projected',
+      'opponent_scores', 'opponent_projected' and 'played'.
+    - num_weeks: Optional. Only use the first num_weeks week columns (default: all of them).
 
-    for week in range(1, min(current_week, regular_season_count + 1)):
-        box_scores = league_data['box_scores'].get(week, [])
-        if not box_scores:
-            continue
+    Returns:
+    - List of dictionaries with Team Name, Team ID, Actual Wins, Expected Wins, and Luck Index,
+      for every team with at least one completed matchup.
+    """
+    projected_margins, margin_errors, valid = _projection_margins(aggregates, num_weeks)
+    if not valid.any():
+        return []
 
-        total_weekly_score = sum(box_score['home_score'] + box_score['away_score'] for box_score in box_scores)
-        num_teams = len(box_scores) * 2  # Each matchup involves two teams
-        weekly_avg_scores[week] = total_weekly_score / num_teams
+    # Guard against a league whose projections were always exactly right
+    sigma = max(projection_margin_std(aggregates, num_weeks), 1e-9)
+    win_probabilities = np.where(valid, normal_cdf(np.where(valid, projected_margins, 0.0) / sigma), 0.0)
 
-    # Iterate through weeks and matchups
-    for week in range(1, min(current_week, regular_season_count + 1)):
-        box_scores = league_data['box_scores'].get(week, [])  # Safely get box scores for the week
-        league_avg_score = weekly_avg_scores.get(week, 0)
+    expected_wins = win_probabilities.sum(axis=1)
+    actual_wins = (valid & (projected_margins + margin_errors > 0)).sum(axis=1)
 
-        for box_score in box_scores:
-            # Skip invalid matchups
-            if box_score.get('home_team_id') == 0 or box_score.get('away_team_id') == 0:
-                continue
+    team_luck_data = []
+    for index in np.flatnonzero(valid.any(axis=1)):
+        team_luck_data.append({
+            "Team Name": aggregates['team_names'][index],
+            "Team ID": int(aggregates['team_ids'][index]),
+            "Actual Wins": int(actual_wins[index]),
+            "Expected Wins": round(float(expected_wins[index]), 2),
+            "Luck Index": round(float(actual_wins[index] - expected_wins[index]), 2)
+        })
+
+    return team_luck_data
 
-            # Extract match info
-            home_score = box_score['home_score']
-            away_score = box_score['away_score']
-            home_team = team_id_to_team[box_score['home_team_id']]
-            away_team = team_id_to_team[box_score['away_team_id']]
-
-            # Normalize scores by league average for Home Team
-            home_points_for = home_score - league_avg_score
-            home_points_against = away_score - league_avg_score
-            home_result = "Win" if home_score > away_score else "Loss"
-            home_luck_type = (
-                "Lucky Win" if home_result == "Win" and home_points_for < 0 else
-                "Unlucky Loss" if home_result == "Loss" and home_points_for > 0 else
-                "Neutral"
-            )
-
-            matchup_luck_data.append({
-                "Week": week,
-                "Team Name": home_team["name"],
-                "Points For": home_points_for,
-                "Points Against": home_points_against,
-                "Result": home_result,
-                "Matchup Luck Type": home_luck_type,
-                "Opponent": away_team["name"]
-            })
-
-            # Normalize scores by league average for Away Team
-            away_points_for = away_score - league_avg_score
-            away_points_against = home_score - league_avg_score
-            away_result = "Win" if away_score > home_score else "Loss"
-            away_luck_type = (
-                "Lucky Win" if away_result == "Win" and away_points_for < 0 else
-                "Unlucky Loss" if away_result == "Loss" and away_points_for > 0 else
-                "Neutral"
-            )
-
-            matchup_luck_data.append({
-                "Week": week,
-                "Team Name": away_team["name"],
-                "Points For": away_points_for,
-                "Points Against": away_points_against,
-                "Result": away_result,
-                "Matchup Luck Type": away_luck_type,
-                "Opponent": home_team["name"]
-            })
-
-    # Convert the list to a DataFrame
-    df = pd.DataFrame(matchup_luck_data)
+def calculate_scatterplot_luck(league_data):
+    """
+    Calculate matchup-based scatterplot luck for all teams.
+
+    Parameters:
+    - league_data: The dictionary with data on teams and matchups.
+
+    Returns:
+    - Pandas DataFrame with Team Name, Points For, Points Against, Result, Matchup Luck Type, and Opponent.
+    """
+    return scatterplot_luck_frame(get_weekly_aggregates(league_data))
+
+def scatterplot_luck_frame(aggregates):
+    """
+    Build the scatterplot luck DataFrame (see calculate_scatterplot_luck) from weekly aggregates.
+
+    Parameters:
+    - aggregates: Weekly aggregates (see precompute.build_weekly_aggregates), or any dictionary
+      with the same 'team_names', 'weeks', 'num_completed_weeks', 'played', 'scores',
+      'opponents', 'opponent_scores' and 'weekly_mean' entries.
+
+    Returns:
+    - Pandas DataFrame with one row per team per completed week it played.
+    """
+    num_weeks = aggregates['num_completed_weeks']
+    team_names = np.array(aggregates['team_names'], dtype=object)
+
+    # One row per team per completed week it played, ordered by week
+    week_columns, team_rows = np.nonzero(aggregates['played'][:, :num_weeks].T)
+    league_avg_scores = aggregates['weekly_mean'][week_columns]
+    scores = aggregates['scores'][team_rows, week_columns]
+    opponent_scores = aggregates['opponent_scores'][team_rows, week_columns]
+
+    # Normalize scores by the weekly league average
+    points_for = scores - league_avg_scores
+    points_against = opponent_scores - league_avg_scores
+    won = scores > opponent_scores
+    luck_types = np.where(
+        won & (points_for < 0), "Lucky Win",
+        np.where(~won & (points_for > 0), "Unlucky Loss", "Neutral")
+    )
+
+    df = pd.DataFrame({
+        "Week": aggregates['weeks'][week_columns],
+        "Team Name": team_names[team_rows],
+        "Points For": points_for,
+        "Points Against": points_against,
+        "Result": np.where(won, "Win", "Loss"),
+        "Matchup Luck Type": luck_types,
+        "Opponent": team_names[aggregates['opponents'][team_rows, week_columns]]
+    })
 
     return df
 
@@ -196,45 +235,52 @@ def calculate_scheduling_luck(league_data):
     Used in scheduling luck analysis.
     '''
     teams = league_data['teams']
-    num_weeks = min(league_data['current_week'], league_data['regular_season_count'] + 1)
-
-    # Step 1: Build a dict mapping each team to their weekly scores and opponent IDs
-    team_scores_by_week = {team['id']: [] for team in teams}
-    opponent_ids_by_week = {team['id']: [] for team in teams}
-
-    for week in range(1, num_weeks):
-        for box_score in league_data['box_scores'].get(week, []):
-            home_id = box_score['home_team_id']
-            away_id = box_score['away_team_id']
-            home_score = box_score['home_score']
-            away_score = box_score['away_score']
-
-            # Skip invalid matches
-            if home_id == 0 or away_id == 0:
-                continue
-
-            team_scores_by_week[home_id].append(home_score)
-            opponent_ids_by_week[home_id].append(away_id)
+    hypothetical_wins, hypothetical_losses = scheduling_luck_counts(get_weekly_aggregates(league_data))
+    return scheduling_luck_records(teams, hypothetical_wins, hypothetical_losses)
 
-            team_scores_by_week[away_id].append(away_score)
-            opponent_ids_by_week[away_id].append(home_id)
+def scheduling_luck_counts(aggregates):
+    """
+    Count hypothetical wins and losses of every team (rows) on every other team's schedule (columns)
+    over the completed weeks.
 
-    # Step 2: Simulate hypothetical records
-    hypothetical_records = {
-        team['id']: {
-            opponent['id']: {'wins': 0, 'losses': 0}
-            for opponent in teams
-        }
-        for team in teams
-    }
+    Parameters:
+    - aggregates: Weekly aggregates (see precompute.build_weekly_aggregates), or any dictionary
+      with the same 'num_completed_weeks', 'scores', 'opponents' and 'opponent_scores' entries.
 
-    for simulated_team in teams:
+    Returns:
+    - (hypothetical_wins, hypothetical_losses): Two (teams x teams) integer arrays. The diagonal
+      counts a team on its own schedule from box scores alone.
+    """
+    num_weeks = aggregates['num_completed_weeks']
+    scores = aggregates['scores'][:, :num_weeks]
+    opponents = aggregates['opponents'][:, :num_weeks]
+    opponent_scores = aggregates['opponent_scores'][:, :num_weeks]
+
+    # Compare every simulated team (axis 0) against every schedule donor's (axis 1) opponent, week by week (axis 2)
+    wins = scores[:, None, :] > opponent_scores[None, :, :]
+
+    # A week counts only if both teams have a score, and mirror matchups (the donor's
+    # opponent is the simulated team itself) are skipped
+    simulated_rows = np.arange(len(scores))[:, None, None]
+    counted = (
+        ~np.isnan(scores)[:, None, :]
+        & ~np.isnan(opponent_scores)[None, :, :]
+        & (opponents[None, :, :] != simulated_rows)
+    )
+    return (wins & counted).sum(axis=2), (~wins & counted).sum(axis=2)
+
+def scheduling_luck_records(teams, hypothetical_wins, hypothetical_losses):
+    """
+    Convert hypothetical win/loss count matrices into the nested records returned by calculate_scheduling_luck.
+    A team on its own schedule gets its actual record.
+    """
+    hypothetical_records = {}
+    for sim_index, simulated_team in enumerate(teams):
         sim_id = simulated_team['id']
-        sim_scores = team_scores_by_week[sim_id]
+        hypothetical_records[sim_id] = {}
 
-        for schedule_donor in teams:
+        for donor_index, schedule_donor in enumerate(teams):
             donor_id = schedule_donor['id']
-            donor_opponents = opponent_ids_by_week[donor_id]
 
             if sim_id == donor_id:
                 hypothetical_records[sim_id][donor_id] = {
@@ -243,26 +289,9 @@ def calculate_scheduling_luck(league_data):
                 }
                 continue
 
-            wins = 0
-            losses = 0
-            for week_index, opponent_id in enumerate(donor_opponents):
-                if opponent_id == sim_id:
-                    # Skip mirror matchup
-                    continue
-
-                opp_score_list = team_scores_by_week.get(opponent_id, [])
-                if week_index >= len(sim_scores) or week_index >= len(opp_score_list):
-                    continue
-
-                my_score = sim_scores[week_index]
-                opp_score = opp_score_list[week_index]
-
-                if my_score > opp_score:
-                    wins += 1
-                else:
-                    losses += 1
-
-            hypothetical_records[sim_id][donor_id]['wins'] = wins
-            hypothetical_records[sim_id][donor_id]['losses'] = losses
+            hypothetical_records[sim_id][donor_id] = {
+                'wins': int(hypothetical_wins[sim_index, donor_index]),
+                'losses': int(hypothetical_losses[sim_index, donor_index])
+            }
 
-    return hypothetical_records
\ No newline at end of file
+    return hypothetical_records
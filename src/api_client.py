@@ -1,36 +1,143 @@
-def fetch_league_data(league):
+import os
+
+# Set to "fake" to serve every league from fake_espn instead of ESPN (offline testing and load tests)
+ESPN_SOURCE_ENV = "ESPN_SOURCE"
+
+def create_league(league_id, year, espn_s2, swid):
+    """
+    Create an espn_api League whose requests (and those of every later fetch through it) go
+    through the shared pooled, compressed and revalidating HTTP transport.
+    """
+    if os.getenv(ESPN_SOURCE_ENV, "espn") == "fake":
+        from fake_espn import FakeLeague
+        return FakeLeague(league_id, year, espn_s2, swid)
+
+    from espn_api.football import League
+    from http_transport import install_transport
+
+    install_transport()
+    return League(league_id=league_id, year=year, espn_s2=espn_s2, swid=swid)
+
+# Lineup slots whose points do not count toward the team's score
+BENCH_SLOTS = {"BE", "IR"}
+
+def fetch_league_data(league, include_players=False):
     """
     Fetch all necessary league data once and store it for reuse.
+
+    Parameters:
+    - league: The espn_api League.
+    - include_players: Optional. Also keep every starter's actual and projected points (from the same
+      box score requests) as columnar lists in data["players"]:
+        - 'week', 'team_id', 'player_id', 'position', 'points', 'projected': One entry per starter per matchup.
+        - 'names': Dict mapping str(player_id) to the player's name.
     """
     data = {
+        "league_id": league.league_id,
+        "year": league.year,
         "league_name": league.settings.name,
         "teams": [{"id": team.team_id, "name": team.team_name, "wins": team.wins, "losses": team.losses, "points_for": team.points_for, "points_against": team.points_against} for team in league.teams],
         "current_week": league.current_week,
         "regular_season_count": league.settings.reg_season_count,
+        "playoff_team_count": league.settings.playoff_team_count,
         "box_scores": {}
     }
+    if include_players:
+        players = {"week": [], "team_id": [], "player_id": [], "position": [], "points": [], "projected": [], "names": {}}
+        data["players"] = players
 
-    # Fetch box scores for each week up to the end of the regular season
-    for week in range(1, data["regular_season_count"] + 1):
+    # Fetch box scores for each week played so far. ESPN answers a request for a later week with the
+    # current week's matchups, so the rest of the regular season comes from the teams' schedules.
+    last_fetched_week = min(data["current_week"], data["regular_season_count"])
+    for week in range(1, last_fetched_week + 1):
+        num_player_rows = len(data["players"]["week"]) if include_players else 0
         try:
-            box_scores = league.box_scores(week=week)
-            data["box_scores"][week] = []
-            for box_score in box_scores:
-                # Handle bye weeks where the team is set as the integer 0
-                if isinstance(box_score.home_team, int) and box_score.home_team == 0:
-                    continue
-                if isinstance(box_score.away_team, int) and box_score.away_team == 0:
-                    continue
-
-                data["box_scores"][week].append({
-                    "home_team_id": box_score.home_team.team_id,
-                    "home_score": box_score.home_score,
-                    "home_projected": box_score.home_projected,
-                    "away_team_id": box_score.away_team.team_id,
-                    "away_score": box_score.away_score,
-                    "away_projected": box_score.away_projected
-                })
+            data["box_scores"][week] = fetch_week_box_scores(league, week, data.get("players"))
         except Exception as e:
             data["box_scores"][week] = None
+            # Drop the starters of a week that failed part way through
+            if include_players:
+                for column in ("week", "team_id", "player_id", "position", "points", "projected"):
+                    del players[column][num_player_rows:]
+
+    for week in range(last_fetched_week + 1, data["regular_season_count"] + 1):
+        data["box_scores"][week] = scheduled_matchups(league, week)
+
+    return data
+
+def scheduled_matchups(league, week):
+    """
+    Build a future week's matchups from the teams' schedules (no ESPN request).
+
+    Parameters:
+    - league: The espn_api League.
+    - week: The week (matchup period) to build.
+
+    Returns:
+    - List of box score dictionaries as returned by fetch_week_box_scores, with scores of 0 and
+      projected scores of None, since ESPN has no projections for future weeks. Bye weeks are skipped.
+    """
+    week_box_scores = []
+    seen = set()
+    for team in league.teams:
+        if len(team.schedule) < week:
+            continue
+        opponent = team.schedule[week - 1]
+        # A team on a bye is scheduled against itself
+        if isinstance(opponent, int) or opponent.team_id == team.team_id or opponent.team_id in seen:
+            continue
+        seen.add(team.team_id)
+        week_box_scores.append({
+            "home_team_id": team.team_id,
+            "home_score": 0.0,
+            "home_projected": None,
+            "away_team_id": opponent.team_id,
+            "away_score": 0.0,
+            "away_projected": None
+        })
+    return week_box_scores
+
+def fetch_week_box_scores(league, week, players=None):
+    """
+    Fetch one week's matchups (a single ESPN request).
+
+    Parameters:
+    - league: The espn_api League.
+    - week: The week to fetch.
+    - players: Optional. Columnar player lists (see fetch_league_data) to append the week's starters to.
+
+    Returns:
+    - List of dictionaries with home/away team IDs, scores and projected scores, as stored in
+      league_data["box_scores"][week]. Bye weeks are skipped.
+    """
+    week_box_scores = []
+    for box_score in league.box_scores(week=week):
+        # Handle bye weeks where the team is set as the integer 0
+        if isinstance(box_score.home_team, int) and box_score.home_team == 0:
+            continue
+        if isinstance(box_score.away_team, int) and box_score.away_team == 0:
+            continue
+
+        week_box_scores.append({
+            "home_team_id": box_score.home_team.team_id,
+            "home_score": box_score.home_score,
+            "home_projected": box_score.home_projected,
+            "away_team_id": box_score.away_team.team_id,
+            "away_score": box_score.away_score,
+            "away_projected": box_score.away_projected
+        })
+
+        if players is not None:
+            for team, lineup in ((box_score.home_team, box_score.home_lineup), (box_score.away_team, box_score.away_lineup)):
+                for player in lineup:
+                    if player.slot_position in BENCH_SLOTS:
+                        continue
+                    players["week"].append(week)
+                    players["team_id"].append(team.team_id)
+                    players["player_id"].append(player.playerId)
+                    players["position"].append(player.position)
+                    players["points"].append(player.points)
+                    players["projected"].append(player.projected_points)
+                    players["names"][str(player.playerId)] = player.name
 
-    return data
\ No newline at end of file
+    return week_box_scores
@@ -1,16 +1,18 @@
 import streamlit as st
-from espn_api.football import League
-from api_client import fetch_league_data
-from visualization import generate_opponent_underperformance_chart, plot_pythagorean_expectation_luck, save_luck_indices_to_file_v3, \
-create_scheduling_luck_dataframe, create_scatterplot_luck_figure
-from analysis import calculate_pythagorean_expectation_luck, calculate_scatterplot_luck, get_luck_index_v3
 import os
 from dotenv import load_dotenv
 
+# NOTE: espn_api, pandas, matplotlib, plotly and the analysis/visualization modules
+# are imported inside the functions that need them. Importing them here would make
+# every cold start pay for all of them before the login form can render.
+
 # Load environment variables from .env file
 load_dotenv()
 
 DEBUG_MODE = False
+
+# Seconds between reruns of the live view (it only reads the league's shared live poller)
+LIVE_VIEW_REFRESH_SECONDS = 10
 LEAGUE_ID = os.getenv('LEAGUE_ID')
 SWID = os.getenv('SWID')
 ESPN_S2 = os.getenv('ESPN_S2')
@@ -27,13 +29,162 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
+def load_league(league_id, swid, espn_s2, include_players=False):
+    """
+    Load the league through the analysis worker, which fetches it from ESPN and starts computing
+    every metric in the background. Only the league key and data are kept in session state.
+    """
+    from worker_client import get_worker
+
+    league_key, league_data = get_worker().load_league(league_id, 2024, swid, espn_s2, include_players)
+    st.session_state['league_key'] = league_key
+    st.session_state['league_data'] = league_data
+    st.session_state['include_players'] = include_players
+    st.session_state['metric_results'] = {}
+    st.session_state['what_if_results'] = {}
+
+def get_metric_result(metric, what_if=None):
+    """
+    Return a metric's result from the worker, waiting only for that metric if it is still being computed.
+    Results are kept in session state so reruns do not ask the worker again.
+    With active what-if edits, the worker rebuilds the result from the edited scores instead.
+    """
+    from metric_names import WHAT_IF_METRICS
+
+    if what_if and metric in WHAT_IF_METRICS:
+        # Only the latest edits' result is kept per metric
+        cached = st.session_state.setdefault('what_if_results', {}).get(metric)
+        if cached is None or cached[0] != what_if:
+            result = fetch_from_worker(lambda worker: worker.get_what_if_metric(
+                st.session_state['league_key'], st.session_state['what_if_session'], what_if, metric
+            ))
+            cached = ({key: dict(fields) for key, fields in what_if.items()}, result)
+            st.session_state['what_if_results'][metric] = cached
+        return cached[1]
+
+    results = st.session_state.setdefault('metric_results', {})
+    if metric not in results:
+        result = fetch_from_worker(lambda worker: worker.get_metric(st.session_state['league_key'], metric))
+        st.session_state['metric_results'][metric] = result
+    return st.session_state['metric_results'][metric]
+
+def fetch_from_worker(request, spinner_text='Crunching the numbers...'):
+    """
+    Run request(worker) against the analysis worker. If the worker restarted or dropped the league
+    after its TTL, load the league again and retry once; if that fails too, show an error and stop.
+    Pass spinner_text=None for requests that should not show a spinner.
+    """
+    from contextlib import nullcontext
+    from worker_client import get_worker, WorkerError
+
+    with st.spinner(spinner_text) if spinner_text else nullcontext():
+        try:
+            return request(get_worker())
+        except (KeyError, WorkerError):
+            try:
+                reload_league()
+                return request(get_worker())
+            except (KeyError, WorkerError) as e:
+                st.error(f"The results could not be loaded right now ({e}). Please try again in a moment.")
+                st.stop()
+
+def reload_league():
+    """
+    Load the session's league again with the same credentials and options, e.g. after the worker lost it.
+    """
+    load_league(st.session_state['league_id'], st.session_state['swid'], st.session_state['espn_s2'],
+                st.session_state.get('include_players', False))
+
+def matchup_scores(league_data, team_id, week):
+    """
+    Return a team's (score, projected) in a week, or None if it has no matchup that week.
+    """
+    team_ids = {team['id'] for team in league_data['teams']}
+    for box_score in league_data['box_scores'].get(week) or []:
+        # Matchups against teams we have no record of are not part of any metric
+        if box_score['home_team_id'] not in team_ids or box_score['away_team_id'] not in team_ids:
+            continue
+        if box_score['home_team_id'] == team_id:
+            return box_score['home_score'], box_score['home_projected']
+        if box_score['away_team_id'] == team_id:
+            return box_score['away_score'], box_score['away_projected']
+    return None
+
+def _apply_what_if_edit(team_id, week, field, key):
+    import uuid
+
+    # The worker keeps one what-if engine per session, created on its first edit
+    st.session_state.setdefault('what_if_session', uuid.uuid4().hex)
+    edits = st.session_state.setdefault('what_if_edits', {})
+    edits.setdefault((team_id, week), {})[field] = st.session_state[key]
+
+def what_if_panel(league_data):
+    """
+    Controls for overriding any matchup's score or projection. The edits are kept in session state
+    and applied by the analysis worker, which only recomputes what each edit touches.
+
+    Returns:
+    - Dict mapping (team_id, week) to the edited fields if any edit is active, otherwise None.
+    """
+    edits = st.session_state.get('what_if_edits', {})
+
+    with st.expander("What-if mode: change any matchup's score"):
+        team_ids = {team['name']: team['id'] for team in league_data['teams']}
+        num_weeks = max(min(league_data['current_week'], league_data['regular_season_count']), 0)
+        week_col, team_col = st.columns(2)
+        with week_col:
+            week = st.selectbox("Week", options=list(range(1, num_weeks + 1)))
+        with team_col:
+            team_name = st.selectbox("Team", options=list(team_ids))
+        team_id = team_ids[team_name]
+        scores = matchup_scores(league_data, team_id, week) if week is not None else None
+
+        if scores is None:
+            st.info(f"{team_name} has no matchup in week {week}.")
+        else:
+            score_col, projected_col = st.columns(2)
+            for column, field, label, value in (
+                (score_col, 'score', "Score", scores[0]),
+                (projected_col, 'projected', "Projected", scores[1])
+            ):
+                key = f"what_if_{field}_{team_id}_{week}"
+                with column:
+                    st.number_input(
+                        label, value=float(edits.get((team_id, week), {}).get(field, value)), step=1.0, key=key,
+                        on_change=_apply_what_if_edit, args=(team_id, week, field, key)
+                    )
+
+        if edits:
+            names = {team['id']: team['name'] for team in league_data['teams']}
+            for (edited_team_id, edited_week), override in edits.items():
+                changes = ", ".join(f"{field} {value:.2f}" for field, value in override.items())
+                st.write(f"Week {edited_week}, {names[edited_team_id]}: {changes}")
+            if st.button("Reset all edits"):
+                for key in [key for key in st.session_state if str(key).startswith("what_if_")]:
+                    del st.session_state[key]
+                st.rerun()
+
+    return edits or None
+
+def show_matplotlib_figure(figure):
+    """
+    Render a matplotlib figure, which a remote worker sends as PNG bytes.
+    """
+    if isinstance(figure, bytes):
+        st.image(figure)
+    else:
+        from visualization import FIGURE_RENDER_LOCK
+
+        with FIGURE_RENDER_LOCK:
+            st.pyplot(figure)
+
 def log_in():
     st.title("ESPN Fantasy Football Luck Analyzer")
     st.write("Welcome to the Fantasy Football Luck Analyzer!")
     st.write("This tool will help you determine how lucky or unlucky you've been in your fantasy football league.") 
 
-    if 'league' not in st.session_state:
-        st.session_state['league'] = None
+    if 'league_key' not in st.session_state:
+        st.session_state['league_key'] = None
     if 'league_data' not in st.session_state:
         st.session_state['league_data'] = None
 
@@ -44,9 +195,7 @@ def log_in():
         st.session_state['espn_s2'] = ESPN_S2
         # Fetch league data and store in session state
         with st.spinner('Just a moment. Fetching your custom league data...'):
-            league = League(league_id=LEAGUE_ID, year=2024, espn_s2=ESPN_S2, swid=SWID)
-            st.session_state['league'] = league
-            st.session_state['league_data'] = fetch_league_data(league)
+            load_league(LEAGUE_ID, SWID, ESPN_S2)
         st.rerun()
     else:
         # Input Fields
@@ -65,6 +214,11 @@ def log_in():
                 6. Look for the `SWID` and `ESPN_S2` cookies and copy their values.
             """)
 
+        include_players = st.checkbox(
+            "Include player-level breakdown",
+            help="Also keeps every starter's points, to show which players drove your luck. Makes the results larger to load."
+        )
+
         # Submit Button
         if st.button("Submit"):
             if not league_id or not swid or not espn_s2:
@@ -78,12 +232,106 @@ def log_in():
 
                 # Fetch league data and store in session state
                 with st.spinner('Just a moment. Fetching your custom league data...'):
-                    league = League(league_id=league_id, year=2024, espn_s2=espn_s2, swid=swid)
-                    st.session_state['league'] = league
-                    st.session_state['league_data'] = fetch_league_data(league)
+                    load_league(league_id, swid, espn_s2, include_players)
 
                 st.rerun()
 
+def player_luck_breakdown(result):
+    """
+    Show which positions and players drove a team's opponent underperformance luck.
+    """
+    st.write("""
+        **Which players drove it?** The heatmap splits each team's luck by position of the opposing 
+        starters: positive values mean opponents at that position scored less than projected against you.
+    """)
+    show_matplotlib_figure(result['position_figure'])
+
+    team_names = list(result['player_positions']["Team Name"].unique())
+    team_name = st.selectbox("Team", options=team_names, key='player_luck_team')
+
+    opponents = result['player_opponents']
+    st.write(f"Opposing starters who gave {team_name} the most luck (projected - actual points):")
+    st.dataframe(opponents[opponents["Team Name"] == team_name].drop(columns="Team Name"), hide_index=True)
+
+    starters = result['player_starters']
+    st.write(f"{team_name}'s own starters against their projections (actual - projected points):")
+    st.dataframe(starters[starters["Team Name"] == team_name].drop(columns="Team Name"), hide_index=True)
+
+def ordinal(number):
+    """
+    Format a whole number with its English ordinal suffix (1st, 2nd, 3rd, 11th, ...).
+    """
+    if 10 <= number % 100 <= 20:
+        suffix = 'th'
+    else:
+        suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(number % 10, 'th')
+    return f"{number}{suffix}"
+
+def luck_percentiles_section():
+    """
+    Show where each team's luck ranks among every team-season in the cross-league corpus.
+    """
+    with st.expander("How does your luck compare to other leagues?"):
+        result = get_metric_result('luck_percentiles')
+        if result['corpus_size'] == 0:
+            st.write("No finished seasons have been analyzed yet. Check back once more leagues have been added!")
+            return
+
+        table = result['table']
+        team_name = st.selectbox("Team", options=list(table["Team Name"]), key='percentile_team')
+        row = table[table["Team Name"] == team_name].iloc[0]
+        for column in table.columns[1:]:
+            st.write(f"**{column}:** {team_name} is in the {ordinal(int(round(row[column])))} percentile "
+                     f"of all {result['corpus_size']:,} team-seasons we have seen.")
+        st.caption("Luck is measured per game, so seasons of any length compare fairly. Higher percentiles mean luckier.")
+        st.dataframe(table, hide_index=True)
+
+@st.fragment(run_every=LIVE_VIEW_REFRESH_SECONDS)
+def live_view():
+    """
+    Live scores and luck of the in-progress week. Reruns on its own every LIVE_VIEW_REFRESH_SECONDS,
+    reading the snapshot of the league's poller on the analysis worker (no ESPN requests of its own).
+    """
+    import time
+
+    snapshot = fetch_from_worker(lambda worker: worker.live_snapshot(st.session_state['league_key']), spinner_text=None)
+    league_data = st.session_state['league_data']
+
+    if snapshot['rolled_over_at'] is not None or snapshot['week'] > league_data['current_week']:
+        st.info(f"Week {league_data['current_week']} is over. Reload your league to include it in every metric.")
+        if snapshot['ratings']:
+            st.write(f"Team ratings including week {snapshot['week']}:")
+            st.dataframe(snapshot['ratings'], hide_index=True)
+        if st.button("Reload league"):
+            # The worker refetches league data it loaded before the week ended
+            with st.spinner('Just a moment. Fetching your custom league data...'):
+                reload_league()
+            st.rerun()
+
+    if snapshot['error']:
+        st.warning(f"Could not refresh live scores: {snapshot['error']}")
+    if snapshot['updated_at'] is None:
+        st.caption("Fetching live scores...")
+    else:
+        updated = time.strftime('%H:%M:%S', time.localtime(snapshot['updated_at']))
+        st.caption(f"Week {snapshot['week']} scores as of {updated}, refreshed every {snapshot['interval']:g} seconds. "
+                   f"Updated marks the matchups that changed in the latest update.")
+
+    st.dataframe(snapshot['matchups'], hide_index=True)
+    st.write("Opponent underperformance so far this season, including the games in progress:")
+    st.dataframe(snapshot['luck'], hide_index=True)
+
+def live_section():
+    """
+    Switch for the live game-day view, offered while the regular season is in progress.
+    """
+    league_data = st.session_state['league_data']
+    if league_data['current_week'] > league_data['regular_season_count']:
+        return
+    if st.toggle("Live game-day mode", key='live_mode',
+                 help="Follow this week's games as they happen. Scores refresh automatically."):
+        live_view()
+
 def display_visualizations():
     if 'league_data' not in st.session_state or st.session_state['league_data'] is None:
             st.error("League data not found. Please log in.")
@@ -95,9 +343,30 @@ def display_visualizations():
 
     st.write("Here are some visualizations to help you analyze your luck in the league. Postseason fantasy weeks are omitted.")
 
-    # Create a 2x2 grid for the buttons
+    from worker_client import get_worker, WorkerError
+    from metric_names import METRICS
+
+    try:
+        num_ready = len(get_worker().ready_metrics(st.session_state['league_key']))
+    except (KeyError, WorkerError):
+        try:
+            reload_league()
+            num_ready = len(get_worker().ready_metrics(st.session_state['league_key']))
+        except (KeyError, WorkerError):
+            st.error("League data has expired. Please log in again.")
+            st.session_state['logged_in'] = False
+            st.rerun()
+            return
+    if num_ready < len(METRICS):
+        st.caption(f"Preparing your metrics in the background ({num_ready}/{len(METRICS)} ready)...")
+
+    live_section()
+
+    # Create a grid for the buttons
     col1, col2 = st.columns(2)
     col3, col4 = st.columns(2)
+    col5, col6 = st.columns(2)
+    col7, _ = st.columns(2)
 
     with col1:
         if st.button("Opponent Underperformance"):
@@ -111,16 +380,29 @@ def display_visualizations():
     with col4:
         if st.button("Scheduling Luck"):
             st.session_state['metric'] = 'scheduling_luck'
+    with col5:
+        if st.button("Projection Luck"):
+            st.session_state['metric'] = 'projection_luck'
+    with col6:
+        if st.button("Close Game Luck"):
+            st.session_state['metric'] = 'close_game_luck'
+    with col7:
+        if st.button("Playoff Odds"):
+            st.session_state['metric'] = 'playoff_odds'
 
     # Display the selected metric
     if 'metric' in st.session_state:
-        if 'league_data' not in st.session_state or 'league' not in st.session_state:
+        if 'league_data' not in st.session_state or 'league_key' not in st.session_state:
             st.error("League data not found. Please log in again.")
             st.session_state['logged_in'] = False
             st.rerun()
         else:
             league_data = st.session_state['league_data']
-            league = st.session_state['league']
+            what_if = what_if_panel(league_data)
+            if what_if is not None:
+                st.caption("Showing what-if results with your edited scores. Confidence intervals, the player-level "
+                           "breakdown and the week-by-week luck curves only exist for the actual scores, so they are "
+                           "hidden while edits are active.")
 
             if st.session_state['metric'] == 'opponent_underperformance':
                 
@@ -135,11 +417,12 @@ def display_visualizations():
                     points but scored 120, your luck index is -20 (unlucky for you!).
                 """)
                 
-                luck_indices = get_luck_index_v3(league_data)
-                luck_indices_df = save_luck_indices_to_file_v3(league_data, luck_indices)
-                st.dataframe(luck_indices_df, hide_index=True)
-                plot = generate_opponent_underperformance_chart(luck_indices_df)
-                st.pyplot(plot)
+                result = get_metric_result('opponent_underperformance', what_if)
+                st.dataframe(result['table'], hide_index=True)
+                show_matplotlib_figure(result['figure'])
+
+                if 'player_positions' in result:
+                    player_luck_breakdown(result)
             elif st.session_state['metric'] == 'pythagorean_expectation':
                 
                 st.subheader("Pythagorean Expectation")
@@ -149,9 +432,16 @@ def display_visualizations():
                     than expected, while teams with a negative Luck Index have won fewer games than expected.
                 """)
                 
-                pythagorean_luck_data = calculate_pythagorean_expectation_luck(league_data)
-                fig = plot_pythagorean_expectation_luck(pythagorean_luck_data)
-                st.pyplot(fig)
+                result = get_metric_result('pythagorean_expectation', what_if)
+                if result['figure'] is None:
+                    st.info(result['message'])
+                else:
+                    st.caption(f"Exponent fitted to your league's results, pulled toward the classic 2 while few games "
+                               f"have been played: p = {result['exponent']:.2f}")
+                    show_matplotlib_figure(result['figure'])
+                if result.get('rolling_figure') is not None:
+                    st.write("How each team's luck built up over the season:")
+                    show_matplotlib_figure(result['rolling_figure'])
             elif st.session_state['metric'] == 'scatterplot_luck':
                 
                 st.subheader("Scatterplot Luck")
@@ -163,12 +453,13 @@ def display_visualizations():
                     - The regions highlight "Lucky Wins" and "Unlucky Losses."
                 """)
                 
-                scatterplot_luck_df = calculate_scatterplot_luck(league_data)
-                team_names = scatterplot_luck_df["Team Name"].unique()
-                selected_team = st.selectbox("Select a team to highlight", options=["All Teams"] + list(team_names))
-                if selected_team == "All Teams":
-                    selected_team = None
-                fig = create_scatterplot_luck_figure(scatterplot_luck_df, selected_team)
+                result = get_metric_result('scatterplot_luck', what_if)
+                selected_team = st.selectbox("Select a team to highlight", options=["All Teams"] + result['team_names'])
+                selected_team = None if selected_team == "All Teams" else selected_team
+                fig = result.get('team_figures', {}).get(selected_team) if selected_team else result.get('figure')
+                if fig is None:
+                    from visualization import create_scatterplot_luck_figure
+                    fig = create_scatterplot_luck_figure(result['table'], selected_team)
                 st.plotly_chart(fig)
             elif st.session_state['metric'] == 'scheduling_luck':
                 st.subheader("Scheduling Luck")
@@ -189,8 +480,71 @@ def display_visualizations():
                 excluded from the simulation).
                 """)
                 
-                scheduling_luck_df = create_scheduling_luck_dataframe(league_data)
-                st.dataframe(scheduling_luck_df)
+                result = get_metric_result('scheduling_luck', what_if)
+                st.dataframe(result['table'])
+
+                st.write("""
+                **Strength of schedule.** Each team's **Rating** is how many points per game better than an 
+                average team it is, fitted over every matchup's score margin while adjusting for the opponents 
+                it faced. **Schedule Strength** is the average Rating of a team's opponents (higher means a 
+                tougher schedule). **Expected Wins** adds up each game's win chance given both teams' Ratings, 
+                so the **Luck Index** is the luck left over once opponent quality is accounted for.
+                """)
+                st.dataframe(result['ratings'], hide_index=True)
+            elif st.session_state['metric'] == 'projection_luck':
+                st.subheader("Projection Luck")
+                st.write("""
+                    This visualization turns every matchup's projected scores into a pregame win probability 
+                    and adds them up into expected wins. Teams with a positive Luck Index won more games than 
+                    their projections gave them, while teams with a negative Luck Index won fewer.
+
+                    e.g. If you were projected to win by 10 points and projections in your league typically 
+                    miss margins by about 30 points, you had roughly a 63% chance to win. A win adds 0.37 to 
+                    your luck index; a loss subtracts 0.63.
+                """)
+
+                result = get_metric_result('projection_luck', what_if)
+                if result['figure'] is None:
+                    st.info(result['message'])
+                else:
+                    st.caption(f"Projected margins in your league miss by about {result['sigma']:.1f} points per game.")
+                    show_matplotlib_figure(result['figure'])
+            elif st.session_state['metric'] == 'close_game_luck':
+                st.subheader("Close Game Luck")
+                st.write("""
+                    This visualization looks at one-score games. Good teams should win more of their close 
+                    games than bad teams, so each team's chance to win a close game is estimated from its 
+                    average margin and how much margins vary in your league. Teams with a positive Luck Index 
+                    won more close games than that, while teams with a negative Luck Index won fewer.
+                """)
+
+                result = get_metric_result('close_game_luck', what_if)
+                if result['figure'] is None:
+                    st.info(result['message'])
+                else:
+                    st.caption(f"Games decided by fewer than {result['close_margin']:g} points count as close. Margins in your "
+                               f"league vary by about {result['margin_sigma']:.1f} points around each team's average.")
+                    show_matplotlib_figure(result['figure'])
+                    st.write("How every team's games were decided, with the close games outlined:")
+                    show_matplotlib_figure(result['histogram_figure'])
+            elif st.session_state['metric'] == 'playoff_odds':
+                st.subheader("Playoff Odds")
+                st.write("""
+                    This simulation plays out the rest of the regular season 100,000 times, with every team 
+                    scoring like it has so far (leaning on ESPN's projections where there are any). Luck-adjusted 
+                    odds replay the same seasons, but start every team from its all-play expected wins instead 
+                    of its actual record. A positive Playoff Luck means your luck so far has raised your odds.
+                """)
+
+                result = get_metric_result('playoff_odds', what_if)
+                if what_if is not None:
+                    st.caption("Playoff odds are simulated from the actual scores; your edits are not included.")
+                st.dataframe(result['table'], hide_index=True)
+                show_matplotlib_figure(result['figure'])
+                st.write(f"Chance of every final seed (the top {result['playoff_teams']} make the playoffs):")
+                show_matplotlib_figure(result['seed_figure'])
+
+    luck_percentiles_section()
 
     # Back Button
     if st.button("Back"):
@@ -1,21 +1,98 @@
-from visualization import save_luck_indices_to_file_v3
-from legacy_functions import save_luck_indices_to_file_v1, save_luck_indices_to_file_v2
-from api_client import fetch_league_data
-from analysis import get_luck_index_v3
 from dotenv import load_dotenv
+import argparse
+import json
 import os
+import subprocess
+import sys
 import time
-from espn_api.football import League
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Fetch credentials from environment variables
-LEAGUE_ID = int(os.getenv('LEAGUE_ID'))
+LEAGUE_ID = os.getenv('LEAGUE_ID')
 SWID = os.getenv('SWID')
 ESPN_S2 = os.getenv('ESPN_S2')
 
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Time budget for importing app.py (everything that runs before the login form renders)
+STARTUP_BUDGET_SECONDS = 1.0
+
+# Modules that must not be imported before the user has logged in.
+# plotly is not listed because streamlit itself imports it.
+DEFERRED_MODULES = ["espn_api", "pandas", "numpy", "matplotlib", "analysis", "visualization", "api_client"]
+
+# Runs in a fresh interpreter so nothing is already cached in sys.modules
+STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+loaded = sorted({name.split('.')[0] for name in sys.modules} & set(json.loads(sys.argv[1])))
+print(json.dumps({"import_seconds": elapsed, "deferred_modules_loaded": loaded}))
+"""
+
+def parse_import_times(importtime_output):
+    """
+    Parse the stderr of `python -X importtime` into a list of
+    (module, self_seconds, cumulative_seconds) tuples for the direct imports of app.py.
+    """
+    # importtime prints in post-order: a module's nested imports are listed (indented)
+    # right before the module itself, so app.py's direct imports are the depth 1 lines
+    # between the previous top-level line and the "app" line.
+    direct_imports = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        depth = (len(module) - len(module.lstrip()) - 1) // 2
+        if depth == 0:
+            if module.strip() == "app":
+                return direct_imports
+            direct_imports = []
+        elif depth == 1:
+            direct_imports.append((module.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return direct_imports
+
+def benchmark_startup(top_n=10):
+    """
+    Measure the cold start cost of the Streamlit app, i.e. the time to import app.py
+    before the login page can render, and print an import-time breakdown.
+
+    Returns:
+    - startup_seconds: Wall-clock seconds spent importing app.py in a fresh interpreter.
+    """
+    print("Timing cold import of app.py...")
+    probe = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_PROBE, json.dumps(DEFERRED_MODULES)],
+        cwd=SRC_DIR, capture_output=True, text=True, check=True
+    )
+    result = json.loads(probe.stdout.strip().splitlines()[-1])
+    startup_seconds = result["import_seconds"]
+
+    breakdown = parse_import_times(probe.stderr)
+    breakdown.sort(key=lambda row: row[2], reverse=True)
+
+    print(f"\nTop {top_n} imports by cumulative time:")
+    print(f"{'Module':<40}{'Self (s)':>12}{'Cumulative (s)':>18}")
+    for module, self_seconds, cumulative_seconds in breakdown[:top_n]:
+        print(f"{module:<40}{self_seconds:>12.3f}{cumulative_seconds:>18.3f}")
+
+    print(f"\napp.py import (time to first render of login page): {startup_seconds:.2f} seconds")
+    if result["deferred_modules_loaded"]:
+        print(f"WARNING: modules that should be deferred were imported at startup: {', '.join(result['deferred_modules_loaded'])}")
+    if startup_seconds > STARTUP_BUDGET_SECONDS:
+        print(f"WARNING: startup exceeded budget of {STARTUP_BUDGET_SECONDS:.2f} seconds")
+
+    return startup_seconds
+
 def benchmark_comparison(league):
+    from visualization import save_luck_indices_to_file_v3
+    from legacy_functions import save_luck_indices_to_file_v1, save_luck_indices_to_file_v2
+    from api_client import fetch_league_data
+    from analysis import get_luck_index_v3
+
     # Time the original function
     print("Timing save_luck_indices_to_file_v1...")
     start_time = time.time()
@@ -52,10 +129,125 @@ def benchmark_comparison(league):
     print(f"Performance improvement (3 vs 1): {((original_time - new_time) / original_time) * 100:.2f}% faster")
     print(f"Performance improvement (3 vs 2): {((optimized_time - new_time) / optimized_time) * 100:.2f}% faster")
 
+def benchmark_simulation(league, num_simulations=100_000):
+    """
+    Time the rest-of-season playoff odds simulation, in-process and with a process pool.
+    """
+    from api_client import fetch_league_data
+    from simulation import simulate_playoff_odds
+
+    league_data = fetch_league_data(league)
+
+    print(f"Timing simulate_playoff_odds ({num_simulations} seasons, single process)...")
+    start_time = time.time()
+    simulate_playoff_odds(league_data, num_simulations, seed=0)
+    single_time = time.time() - start_time
+    print(f"Single process runtime: {single_time:.2f} seconds")
+
+    processes = os.cpu_count() or 1
+    print(f"\nTiming simulate_playoff_odds ({num_simulations} seasons, {processes} processes)...")
+    start_time = time.time()
+    simulate_playoff_odds(league_data, num_simulations, seed=0, processes=processes)
+    pool_time = time.time() - start_time
+    print(f"Process pool runtime: {pool_time:.2f} seconds")
+
+def benchmark_transport(league_id, year=2024):
+    """
+    Time a full league fetch through espn_api's own request handling, then cold and warm through
+    the shared transport, and report connections opened and bytes transferred.
+    """
+    import requests
+    from espn_api.football import League
+    from espn_api.requests import espn_requests
+    from api_client import fetch_league_data
+    from http_transport import CachingTransport, install_transport
+
+    print("Timing league fetch with espn_api's default requests handling...")
+    espn_requests.requests = requests
+    start_time = time.time()
+    fetch_league_data(League(league_id=league_id, year=year, espn_s2=ESPN_S2, swid=SWID))
+    default_time = time.time() - start_time
+    print(f"Default runtime: {default_time:.2f} seconds")
+
+    transport = install_transport(CachingTransport())
+    for label in ("cold", "warm"):
+        before = transport.stats()
+        print(f"\nTiming league fetch through the shared transport ({label})...")
+        start_time = time.time()
+        fetch_league_data(League(league_id=league_id, year=year, espn_s2=ESPN_S2, swid=SWID))
+        print(f"Transport runtime ({label}): {time.time() - start_time:.2f} seconds")
+        after = transport.stats()
+        for key in after:
+            print(f"  {key}: {after[key] - before[key]}")
+
+def benchmark_corpus(num_team_seasons=2_000_000, batch_size=10_000, num_queries=1_000):
+    """
+    Time appends to and percentile lookups in a luck corpus of synthetic team-seasons.
+    """
+    import tempfile
+    import numpy as np
+    from luck_corpus import CORPUS_METRICS, LuckCorpus
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = LuckCorpus(directory)
+
+        print(f"Appending {num_team_seasons} synthetic team-seasons in batches of {batch_size}...")
+        start_time = time.time()
+        for batch in range(num_team_seasons // batch_size):
+            rates = {metric: rng.normal(size=batch_size) for metric in CORPUS_METRICS}
+            corpus.append_rates(f"synthetic-{batch}", 0, np.arange(batch_size), rates)
+        print(f"Bulk append runtime: {time.time() - start_time:.2f} seconds")
+
+        print("\nTiming single-league appends (12 teams)...")
+        start_time = time.time()
+        for league in range(100):
+            rates = {metric: rng.normal(size=12) for metric in CORPUS_METRICS}
+            corpus.append_rates(f"league-{league}", 0, np.arange(12), rates)
+        print(f"Average append: {(time.time() - start_time) / 100 * 1000:.3f} ms")
+
+        print(f"\nTiming {num_queries} percentile lookups (12 teams, every metric) against {len(corpus)} team-seasons...")
+        values = rng.normal(size=12)
+        start_time = time.perf_counter()
+        for _ in range(num_queries):
+            for metric in CORPUS_METRICS:
+                corpus.percentiles(metric, values)
+        print(f"Average lookup: {(time.perf_counter() - start_time) / num_queries * 1000:.3f} ms")
+
+        print("\nTiming a cold open of the corpus...")
+        start_time = time.perf_counter()
+        LuckCorpus(directory).percentiles(CORPUS_METRICS[0], values)
+        print(f"Open + first lookup: {(time.perf_counter() - start_time) * 1000:.1f} ms")
+
 def main():
+    parser = argparse.ArgumentParser(description="Benchmark the luck analyzer.")
+    parser.add_argument("mode", nargs="?", default="luck_index", choices=["luck_index", "startup", "simulation", "corpus", "transport"],
+                        help="luck_index: compare the v1/v2/v3 luck index pipelines (needs ESPN credentials). "
+                             "startup: report app.py cold start import times. "
+                             "simulation: time the playoff odds simulator (needs ESPN credentials). "
+                             "corpus: time luck corpus appends and percentile lookups on synthetic data. "
+                             "transport: compare ESPN fetches with and without the shared HTTP transport (needs ESPN credentials).")
+    args = parser.parse_args()
+
+    if args.mode == "startup":
+        benchmark_startup()
+        return
+    if args.mode == "corpus":
+        benchmark_corpus()
+        return
+
+    if args.mode == "transport":
+        benchmark_transport(int(LEAGUE_ID))
+        return
+
+    from api_client import create_league
+
     # Use environment variables to initialize the League object
-    league = League(league_id=LEAGUE_ID, year=2024, espn_s2=ESPN_S2, swid=SWID)
-    benchmark_comparison(league)
+    league = create_league(int(LEAGUE_ID), 2024, ESPN_S2, SWID)
+    if args.mode == "simulation":
+        benchmark_simulation(league)
+    else:
+        benchmark_comparison(league)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,132 @@
+import numpy as np
+
+from precompute import stack_weekly_aggregates
+
+# Number of bootstrap resamples used by default
+DEFAULT_RESAMPLES = 5000
+
+def resample_week_counts(num_weeks, num_resamples=DEFAULT_RESAMPLES, seed=None):
+    """
+    Draw bootstrap resamples of weeks, returned as how many times each week was drawn.
+
+    Resampling whole weeks keeps every matchup of a week together, so week-level effects
+    (e.g. a high-scoring week league-wide) are preserved. Representing a resample as counts
+    turns every resampled total into a single matrix product.
+
+    Parameters:
+    - num_weeks: Number of weeks to resample from.
+    - num_resamples: Number of bootstrap resamples.
+    - seed: Optional. Seed for the random generator.
+
+    Returns:
+    - (num_resamples x num_weeks) array of draw counts; each row sums to num_weeks.
+    """
+    rng = np.random.default_rng(seed)
+    if num_weeks == 0:
+        return np.zeros((num_resamples, 0))
+    return rng.multinomial(num_weeks, np.full(num_weeks, 1 / num_weeks), size=num_resamples).astype(float)
+
+def _intervals(team_ids, estimates, resampled, confidence):
+    """
+    Turn resampled values (resamples x teams) into per-team percentile intervals.
+    """
+    tail = (1 - confidence) / 2 * 100
+    lower, upper = np.percentile(resampled, [tail, 100 - tail], axis=0)
+    return {
+        int(team_id): {"estimate": float(estimate), "lower": float(low), "upper": float(high)}
+        for team_id, estimate, low, high in zip(team_ids, estimates, lower, upper)
+    }
+
+def bootstrap_opponent_underperformance(league_data, num_resamples=DEFAULT_RESAMPLES, confidence=0.95, seed=None):
+    """
+    Bootstrap confidence intervals for the opponent underperformance luck index (see get_luck_index_v3).
+
+    Parameters:
+    - league_data: A league_data dictionary, or a list of them to pool several seasons.
+    - num_resamples: Number of bootstrap resamples.
+    - confidence: Confidence level of the intervals.
+    - seed: Optional. Seed for the random generator.
+
+    Returns:
+    - Dictionary mapping team ID to {"estimate", "lower", "upper"}.
+    """
+    aggregates = stack_weekly_aggregates(league_data, include_current_week=True)
+
+    # (teams x weeks) opponent shortfall vs. projection, 0 for weeks without a game
+    weekly_luck = np.nan_to_num(aggregates['opponent_projected'] - aggregates['opponent_scores'])
+    counts = resample_week_counts(weekly_luck.shape[1], num_resamples, seed)
+
+    resampled = counts @ weekly_luck.T
+    return _intervals(aggregates['team_ids'], weekly_luck.sum(axis=1), resampled, confidence)
+
+def _pythagorean_luck(counts, points_for, points_against, wins, games, p):
+    """
+    Normalized Pythagorean luck (actual wins - expected wins) for every resample at once.
+    All weekly inputs are (teams x weeks); counts is (resamples x weeks).
+    """
+    total_for = counts @ points_for.T
+    total_against = counts @ points_against.T
+    total_wins = counts @ wins.T
+    total_games = counts @ games.T
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected_win_percentage = np.nan_to_num(total_for ** p / (total_for ** p + total_against ** p), nan=0.5)
+        expected_wins = expected_win_percentage * total_games
+        scaling_factor = total_wins.sum(axis=1, keepdims=True) / expected_wins.sum(axis=1, keepdims=True)
+
+    return total_wins - expected_wins * np.nan_to_num(scaling_factor, nan=1.0)
+
+def bootstrap_pythagorean_luck(league_data, p=2, num_resamples=DEFAULT_RESAMPLES, confidence=0.95, seed=None):
+    """
+    Bootstrap confidence intervals for the Pythagorean expectation luck index
+    (see calculate_pythagorean_expectation_luck), from completed weeks only.
+
+    Parameters:
+    - league_data: A league_data dictionary, or a list of them to pool several seasons.
+    - p: The exponent for the Pythagorean formula.
+    - num_resamples: Number of bootstrap resamples.
+    - confidence: Confidence level of the intervals.
+    - seed: Optional. Seed for the random generator.
+
+    Returns:
+    - Dictionary mapping team ID to {"estimate", "lower", "upper"}.
+    """
+    aggregates = stack_weekly_aggregates(league_data)
+
+    played = aggregates['played']
+    points_for = np.where(played, aggregates['scores'], 0.0)
+    points_against = np.where(played, aggregates['opponent_scores'], 0.0)
+    wins = aggregates['wins'].astype(float)
+    games = played.astype(float)
+
+    counts = resample_week_counts(played.shape[1], num_resamples, seed)
+    resampled = _pythagorean_luck(counts, points_for, points_against, wins, games, p)
+    estimates = _pythagorean_luck(np.ones((1, played.shape[1])), points_for, points_against, wins, games, p)[0]
+    return _intervals(aggregates['team_ids'], estimates, resampled, confidence)
+
+def attach_confidence_intervals(rows, intervals):
+    """
+    Add "CI Lower" and "CI Upper" to luck index rows, centered on each row's own Luck Index, plus
+    the unrounded distances "CI Minus" and "CI Plus" from the Luck Index to them (for error bars).
+
+    The bootstrap estimate can differ slightly from the displayed value (e.g. Pythagorean luck is
+    shown from ESPN season totals), so the interval's offsets from the bootstrap estimate are
+    applied to the displayed value. An estimate that falls outside its own percentile interval
+    gets an offset of 0 on that side.
+
+    Parameters:
+    - rows: List of dictionaries with "Team ID" and "Luck Index".
+    - intervals: Output of one of the bootstrap_* functions.
+
+    Returns:
+    - The same rows, updated in place.
+    """
+    for row in rows:
+        interval = intervals.get(int(row["Team ID"]))
+        if interval is None:
+            continue
+        row["CI Minus"] = max(0.0, float(interval["estimate"] - interval["lower"]))
+        row["CI Plus"] = max(0.0, float(interval["upper"] - interval["estimate"]))
+        row["CI Lower"] = round(row["Luck Index"] - row["CI Minus"], 2)
+        row["CI Upper"] = round(row["Luck Index"] + row["CI Plus"], 2)
+    return rows
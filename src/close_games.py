@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+from analysis import normal_cdf
+from precompute import stack_weekly_aggregates
+
+# Games decided by fewer points than this count as one-score (close) games
+CLOSE_GAME_MARGIN = 10.0
+
+# Margin histogram bins: MARGIN_BIN_WIDTH points wide, with everything beyond
+# +/- MAX_HISTOGRAM_MARGIN falling into the two outermost bins
+MARGIN_BIN_WIDTH = 10.0
+MAX_HISTOGRAM_MARGIN = 60.0
+
+def completed_margins(aggregates, num_weeks=None):
+    """
+    Flatten the margins of every completed game into arrays, one entry per team per game.
+
+    Parameters:
+    - aggregates: Weekly aggregates (single season, stacked or edited).
+    - num_weeks: Optional. Only use the first num_weeks week columns (default: all of them).
+
+    Returns:
+    - (rows, margins): the team row of every entry and its score minus its opponent's score.
+    """
+    weeks = slice(None, num_weeks)
+    margins = aggregates['scores'][:, weeks] - aggregates['opponent_scores'][:, weeks]
+    valid = aggregates['played'][:, weeks] & ~np.isnan(margins)
+    rows = np.broadcast_to(np.arange(len(margins))[:, None], margins.shape)
+    return rows[valid], margins[valid]
+
+def _margin_model(rows, margins, num_teams):
+    """
+    Games played and average margin of every team, plus the league-wide standard deviation of
+    game margins around each team's own average (NaN if no team has two games).
+    """
+    games = np.bincount(rows, minlength=num_teams)
+    team_means = np.bincount(rows, weights=margins, minlength=num_teams) / np.maximum(games, 1)
+    degrees_of_freedom = len(margins) - np.count_nonzero(games)
+    if degrees_of_freedom <= 0:
+        return games, team_means, float('nan')
+    return games, team_means, float(np.sqrt(np.sum((margins - team_means[rows]) ** 2) / degrees_of_freedom))
+
+def close_game_records(aggregates, num_weeks=None, close_margin=CLOSE_GAME_MARGIN):
+    """
+    Close-game luck from (possibly stacked or edited) weekly aggregates.
+
+    Each team's margins are modeled as normal around the team's own average margin, with the
+    league-wide spread of margins around those averages. Given that a game was close, the team's
+    chance to win it is then P(0 < X < close_margin) / P(|X| < close_margin), so a team that is much
+    better than its opponents is still expected to win most of its close games. Ties count as neither.
+
+    Parameters:
+    - aggregates: Weekly aggregates with 'team_ids', 'team_names', 'scores', 'opponent_scores' and 'played'.
+    - num_weeks: Optional. Only use the first num_weeks week columns (default: all of them).
+    - close_margin: Optional. Margin below which a game counts as close.
+
+    Returns:
+    - (records, sigma): a list of dictionaries with Team Name, Team ID, Close Games, Close Wins,
+      Close Losses, Expected Close Wins and Luck Index for every team with at least one completed
+      game, and the fitted margin spread.
+    """
+    num_teams = len(aggregates['team_ids'])
+    rows, margins = completed_margins(aggregates, num_weeks)
+    games, team_means, sigma = _margin_model(rows, margins, num_teams)
+    if len(margins) == 0:
+        return [], sigma
+
+    close = np.abs(margins) < close_margin
+    close_games = np.bincount(rows, weights=close, minlength=num_teams)
+    close_wins = np.bincount(rows, weights=close & (margins > 0), minlength=num_teams)
+    close_losses = np.bincount(rows, weights=close & (margins < 0), minlength=num_teams)
+
+    # Win chance of a close game for every team, conditioned on the game being close
+    spread = 1e-9 if np.isnan(sigma) else max(sigma, 1e-9)
+    below_zero = normal_cdf((0 - team_means) / spread)
+    below_upper = normal_cdf((close_margin - team_means) / spread)
+    below_lower = normal_cdf((-close_margin - team_means) / spread)
+    close_probability = below_upper - below_lower
+    # A team so far from the close band that it has no probability of a close game just wins (or loses) it
+    close_win_rate = np.where(close_probability > 0, (below_upper - below_zero) / np.maximum(close_probability, 1e-300),
+                              (team_means > 0).astype(float))
+    expected_close_wins = close_games * close_win_rate
+
+    team_close_data = []
+    for index in np.flatnonzero(games):
+        team_close_data.append({
+            "Team Name": aggregates['team_names'][index],
+            "Team ID": int(aggregates['team_ids'][index]),
+            "Close Games": int(close_games[index]),
+            "Close Wins": int(close_wins[index]),
+            "Close Losses": int(close_losses[index]),
+            "Expected Close Wins": round(float(expected_close_wins[index]), 2),
+            "Luck Index": round(float(close_wins[index] - expected_close_wins[index]), 2)
+        })
+    return team_close_data, sigma
+
+def margin_histograms(aggregates, num_weeks=None, bin_width=MARGIN_BIN_WIDTH, max_margin=MAX_HISTOGRAM_MARGIN):
+    """
+    Count every team's games by margin, all teams at once.
+
+    Parameters:
+    - aggregates: Weekly aggregates (single season, stacked or edited).
+    - num_weeks: Optional. Only use the first num_weeks week columns (default: all of them).
+    - bin_width, max_margin: Optional. Bin layout, see MARGIN_BIN_WIDTH and MAX_HISTOGRAM_MARGIN.
+
+    Returns:
+    - DataFrame with one row per team that played (indexed by Team Name, in league order) and one
+      column of game counts per margin bin, labeled by its range (e.g. "-10 to 0").
+    """
+    num_teams = len(aggregates['team_ids'])
+    rows, margins = completed_margins(aggregates, num_weeks)
+
+    edges = np.arange(-max_margin, max_margin + bin_width, bin_width)
+    num_bins = len(edges) + 1
+    bins = np.searchsorted(edges, margins, side='right')
+    counts = np.bincount(rows * num_bins + bins, minlength=num_teams * num_bins).reshape(num_teams, num_bins)
+
+    labels = [f"< {edges[0]:g}"]
+    labels += [f"{lower:g} to {upper:g}" for lower, upper in zip(edges[:-1], edges[1:])]
+    labels += [f"{edges[-1]:g}+"]
+
+    played = np.flatnonzero(counts.sum(axis=1))
+    team_names = np.array(aggregates['team_names'], dtype=object)
+    return pd.DataFrame(counts[played], index=pd.Index(team_names[played], name="Team Name"), columns=labels)
+
+def calculate_close_game_luck(seasons, close_margin=CLOSE_GAME_MARGIN):
+    """
+    Calculate close-game luck and margin histograms for a league.
+
+    Parameters:
+    - seasons: A league_data dictionary or a list of them (e.g. a league's full history).
+    - close_margin: Optional. Margin below which a game counts as close.
+
+    Returns:
+    - Dictionary with 'data' (records as returned by close_game_records), 'sigma' (the fitted
+      margin spread) and 'histograms' (DataFrame as returned by margin_histograms).
+    """
+    aggregates = stack_weekly_aggregates(seasons)
+    records, sigma = close_game_records(aggregates, close_margin=close_margin)
+    return {"data": records, "sigma": sigma, "histograms": margin_histograms(aggregates)}
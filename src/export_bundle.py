@@ -0,0 +1,183 @@
+from dotenv import load_dotenv
+import argparse
+import html
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Fetch credentials from environment variables
+LEAGUE_ID = os.getenv('LEAGUE_ID')
+SWID = os.getenv('SWID')
+ESPN_S2 = os.getenv('ESPN_S2')
+
+# Section titles in the report, in the app's button order. Each of these depends on the league alone
+# (the Pythagorean exponent is shrunk toward a fixed prior); the luck percentiles depend on the
+# shared corpus, so they are not part of a static report and exporting never touches the corpus.
+BUNDLE_METRICS = {
+    'opponent_underperformance': "Opponent Underperformance",
+    'pythagorean_expectation': "Pythagorean Expectation",
+    'scatterplot_luck': "Scatterplot Luck",
+    'scheduling_luck': "Scheduling Luck",
+    'projection_luck': "Projection Luck",
+    'close_game_luck': "Close Game Luck",
+    'playoff_odds': "Playoff Odds",
+}
+
+# Descriptions of the scalar values some metrics return
+SCALAR_LABELS = {
+    'exponent': "Fitted Pythagorean exponent",
+    'sigma': "Typical miss of projected margins (points)",
+    'close_margin': "Close-game margin (points)",
+    'margin_sigma': "Spread of margins around each team's average (points)",
+    'playoff_teams': "Playoff spots",
+}
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: sans-serif; max-width: 1100px; margin: 2em auto; padding: 0 1em; }}
+table {{ border-collapse: collapse; margin: 1em 0; font-size: 0.9em; }}
+th, td {{ border: 1px solid #ccc; padding: 4px 8px; text-align: right; }}
+img {{ max-width: 100%; }}
+nav a {{ margin-right: 1em; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+<p>Generated {generated} after week {week}. Postseason fantasy weeks are omitted.</p>
+<nav>{navigation}</nav>
+{sections}
+</body>
+</html>
+"""
+
+def _slug(name):
+    return re.sub(r'[^A-Za-z0-9]+', '_', str(name)).strip('_') or "team"
+
+def _write_table(df, path_without_extension):
+    """
+    Write a DataFrame as CSV and return its HTML table (team-name indexes are kept).
+    """
+    import pandas as pd
+
+    keep_index = not isinstance(df.index, pd.RangeIndex)
+    df.to_csv(path_without_extension + ".csv", index=keep_index)
+    return df.to_html(index=keep_index, border=0, float_format=lambda value: f"{value:.2f}")
+
+def _render_value(key, value, metric_dir, metric):
+    """
+    Write one entry of a metric result to metric_dir and return its HTML snippet (or None).
+    """
+    import pandas as pd
+
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        value = pd.DataFrame(value)
+
+    type_name = type(value).__module__ + "." + type(value).__name__
+    relative = f"{metric}/{key}"
+    if isinstance(value, pd.DataFrame):
+        table = _write_table(value, os.path.join(metric_dir, key))
+        return f'{table}\n<p><a href="{relative}.csv">Download CSV</a></p>'
+    if type_name == "matplotlib.figure.Figure":
+        value.savefig(os.path.join(metric_dir, key + ".png"), format="png", dpi=150, bbox_inches="tight")
+        return f'<img src="{relative}.png" alt="{html.escape(key)}">'
+    if type_name.startswith("plotly.graph_objs"):
+        value.write_html(os.path.join(metric_dir, key + ".html"), include_plotlyjs='directory', full_html=True)
+        return f'<p><a href="{relative}.html">Open the interactive chart</a></p>'
+    if key == 'team_figures':
+        links = []
+        for team_name, figure in value.items():
+            file_name = f"team_{_slug(team_name)}.html"
+            figure.write_html(os.path.join(metric_dir, file_name), include_plotlyjs='directory', full_html=True)
+            links.append(f'<a href="{metric}/{file_name}">{html.escape(team_name)}</a>')
+        return "<p>Highlight a team: " + " | ".join(links) + "</p>"
+    if key in SCALAR_LABELS:
+        return f"<p>{SCALAR_LABELS[key]}: {value:.2f}</p>"
+    if key == 'message':
+        return f"<p>{html.escape(value)}</p>"
+    return None
+
+def render_metric(metric, league_data, output_dir):
+    """
+    Compute one metric with the app's builders and write its tables, PNGs and plotly HTML
+    into output_dir/<metric>/. Runs in a worker process.
+
+    Returns:
+    - (metric, html_section)
+    """
+    from metrics import compute_metric
+
+    metric_dir = os.path.join(output_dir, metric)
+    os.makedirs(metric_dir, exist_ok=True)
+
+    result = compute_metric(metric, league_data)
+    snippets = [_render_value(key, value, metric_dir, metric) for key, value in result.items()]
+    body = "\n".join(snippet for snippet in snippets if snippet)
+
+    title = html.escape(BUNDLE_METRICS[metric])
+    return metric, f'<section id="{metric}">\n<h2>{title}</h2>\n{body}\n</section>'
+
+def export_bundle(league_data, output_dir, metrics=None, processes=None):
+    """
+    Render every metric of a league into a self-contained static report: an index.html with all
+    tables and charts, plus CSV files, PNG charts and interactive plotly HTML pages. Metrics are
+    rendered in parallel worker processes. The bundle can be published on any static file host.
+
+    Parameters:
+    - league_data: The dictionary with data on teams and matchups.
+    - output_dir: Directory to write the bundle into (created if needed).
+    - metrics: Optional. Metrics to include (default: all of BUNDLE_METRICS).
+    - processes: Optional. Number of worker processes (default: one per metric, up to the CPU count).
+
+    Returns:
+    - Path of the bundle's index.html.
+    """
+    metrics = list(metrics or BUNDLE_METRICS)
+    os.makedirs(output_dir, exist_ok=True)
+    processes = processes or min(len(metrics), os.cpu_count() or 1)
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(render_metric, metric, league_data, output_dir) for metric in metrics]
+        sections = dict(future.result() for future in futures)
+
+    week = min(league_data['current_week'] - 1, league_data['regular_season_count'])
+    page = PAGE_TEMPLATE.format(
+        title=html.escape(f"{league_data['league_name']}: Luck Analysis"),
+        generated=time.strftime("%Y-%m-%d %H:%M"),
+        week=week,
+        navigation="".join(f'<a href="#{metric}">{html.escape(BUNDLE_METRICS[metric])}</a>' for metric in metrics),
+        sections="\n".join(sections[metric] for metric in metrics),
+    )
+
+    index_path = os.path.join(output_dir, "index.html")
+    with open(index_path, "w", encoding="utf-8") as f:
+        f.write(page)
+    return index_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a league's luck analysis as a static report bundle.")
+    parser.add_argument("output_dir", help="Directory to write the bundle into.")
+    parser.add_argument("--league-id", default=LEAGUE_ID, help="ESPN league ID (default: LEAGUE_ID from the environment).")
+    parser.add_argument("--year", type=int, default=2024)
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: one per metric).")
+    args = parser.parse_args()
+
+    from api_client import create_league, fetch_league_data
+
+    start_time = time.time()
+    league_data = fetch_league_data(create_league(int(args.league_id), args.year, ESPN_S2, SWID))
+    print(f"Fetched league data in {time.time() - start_time:.2f} seconds")
+
+    start_time = time.time()
+    index_path = export_bundle(league_data, args.output_dir, processes=args.processes)
+    print(f"Wrote {index_path} in {time.time() - start_time:.2f} seconds")
+
+if __name__ == "__main__":
+    main()
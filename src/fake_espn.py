@@ -0,0 +1,147 @@
+import os
+import random
+import time
+from types import SimpleNamespace
+
+# Seconds each simulated ESPN request takes (league construction and every box_scores call)
+FAKE_ESPN_LATENCY_ENV = "FAKE_ESPN_LATENCY"
+
+NUM_TEAMS = 12
+REGULAR_SEASON_COUNT = 14
+CURRENT_WEEK = 10
+
+# (lineup slot, position) of every rostered player; the last two are on the bench
+LINEUP = [
+    ("QB", "QB"), ("RB", "RB"), ("RB", "RB"), ("WR", "WR"), ("WR", "WR"), ("TE", "TE"),
+    ("RB/WR/TE", "WR"), ("D/ST", "D/ST"), ("K", "K"), ("BE", "RB"), ("BE", "WR"),
+]
+
+def _simulate_request():
+    latency = float(os.getenv(FAKE_ESPN_LATENCY_ENV, "0") or 0)
+    if latency > 0:
+        time.sleep(latency)
+
+def _lineup(team_id, score, projected, rng):
+    """
+    Split a team's score and projection over a lineup of starters, plus a couple of bench players.
+    """
+    num_starters = sum(slot != "BE" for slot, _ in LINEUP)
+    projected_shares = [rng.uniform(0.5, 1.5) for _ in range(num_starters)]
+    scored_shares = [rng.uniform(0.2, 1.8) for _ in range(num_starters)]
+
+    players = []
+    for index, (slot, position) in enumerate(LINEUP):
+        player_id = team_id * 100 + index
+        if slot == "BE":
+            points, projected_points = rng.uniform(0, 20), rng.uniform(5, 15)
+        else:
+            points = score * scored_shares[index] / sum(scored_shares)
+            projected_points = projected * projected_shares[index] / sum(projected_shares)
+        players.append(SimpleNamespace(
+            name=f"Player {player_id}", playerId=player_id, position=position, slot_position=slot,
+            points=round(points, 2), projected_points=round(projected_points, 2)
+        ))
+    return players
+
+class FakeLeague:
+    """
+    Offline stand-in for espn_api.football.League with the attributes fetch_league_data reads.
+    Every league ID produces its own deterministic season, so tests and load tests are repeatable.
+    """
+
+    def __init__(self, league_id, year=2024, espn_s2=None, swid=None, num_teams=NUM_TEAMS,
+                 reg_season_count=REGULAR_SEASON_COUNT, current_week=CURRENT_WEEK):
+        _simulate_request()
+        self.league_id = league_id
+        self.year = year
+        self.current_week = current_week
+        self.settings = SimpleNamespace(
+            name=f"Fake League {league_id}", reg_season_count=reg_season_count, playoff_team_count=4
+        )
+        self.teams = [
+            SimpleNamespace(team_id=team_id, team_name=f"Team {team_id}", wins=0, losses=0, points_for=0.0, points_against=0.0)
+            for team_id in range(1, num_teams + 1)
+        ]
+        self._rng_seed = f"{league_id}-{year}"
+        self._schedule = self._build_schedule()
+        # Each team's opponent in every week, as espn_api's Team.schedule lists them
+        teams = {team.team_id: team for team in self.teams}
+        for team in self.teams:
+            team.schedule = []
+        for week in range(1, reg_season_count + 1):
+            for home_id, _, _, away_id, _, _ in self._schedule[week]:
+                teams[home_id].schedule.append(teams[away_id])
+                teams[away_id].schedule.append(teams[home_id])
+        # Number of times the current week has been fetched; its games progress with every fetch
+        self._live_fetches = 0
+
+    def _build_schedule(self):
+        rng = random.Random(self._rng_seed)
+        strength = {team.team_id: rng.gauss(0, 8) for team in self.teams}
+
+        schedule = {}
+        for week in range(1, self.settings.reg_season_count + 1):
+            order = [team.team_id for team in self.teams]
+            rng.shuffle(order)
+            matchups = []
+            for home_id, away_id in zip(order[::2], order[1::2]):
+                home_projected = 105 + strength[home_id] + rng.gauss(0, 6)
+                away_projected = 105 + strength[away_id] + rng.gauss(0, 6)
+                if week < self.current_week:
+                    home_score = home_projected + rng.gauss(0, 22)
+                    away_score = away_projected + rng.gauss(0, 22)
+                elif week == self.current_week:
+                    # In progress, see _live_scores
+                    home_score, away_score = 0.0, 0.0
+                else:
+                    home_score, away_score = 0.0, 0.0
+                matchups.append((home_id, round(home_score, 2), round(home_projected, 2),
+                                 away_id, round(away_score, 2), round(away_projected, 2)))
+            schedule[week] = matchups
+
+        # Season totals over the completed weeks, as ESPN reports them
+        teams = {team.team_id: team for team in self.teams}
+        for week in range(1, min(self.current_week - 1, self.settings.reg_season_count) + 1):
+            for home_id, home_score, _, away_id, away_score, _ in schedule[week]:
+                for team_id, scored, allowed in ((home_id, home_score, away_score), (away_id, away_score, home_score)):
+                    teams[team_id].points_for += scored
+                    teams[team_id].points_against += allowed
+                    if scored > allowed:
+                        teams[team_id].wins += 1
+                    elif scored < allowed:
+                        teams[team_id].losses += 1
+        return schedule
+
+    def refresh(self):
+        """
+        Re-fetch the league's status. The fake season never moves past its current week.
+        """
+        _simulate_request()
+
+    def _live_scores(self, index, home_projected, away_projected):
+        # Every matchup of the in-progress week scores on every third fetch, staggered so each
+        # fetch changes only some of them, until the projections are reached
+        progress = min(1.0, 0.4 + 0.1 * ((self._live_fetches + index) // 3))
+        return round(home_projected * progress, 2), round(away_projected * progress, 2)
+
+    def box_scores(self, week=None):
+        _simulate_request()
+        # Like ESPN, a week past the current one returns the current week's matchups
+        if not week or week > self.current_week:
+            week = self.current_week
+        if week == self.current_week:
+            self._live_fetches += 1
+        teams = {team.team_id: team for team in self.teams}
+        rng = random.Random(f"{self._rng_seed}-{week}")
+
+        box_scores = []
+        for index, (home_id, home_score, home_projected, away_id, away_score, away_projected) in enumerate(self._schedule.get(week, [])):
+            if week == self.current_week:
+                home_score, away_score = self._live_scores(index, home_projected, away_projected)
+            box_scores.append(SimpleNamespace(
+                home_team=teams[home_id], home_score=home_score, home_projected=home_projected,
+                home_lineup=_lineup(home_id, home_score, home_projected, rng),
+                away_team=teams[away_id], away_score=away_score, away_projected=away_projected,
+                away_lineup=_lineup(away_id, away_score, away_projected, rng),
+            ))
+        return box_scores
@@ -0,0 +1,169 @@
+import hashlib
+import http.cookiejar
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Keep-alive connections kept open per host (ESPN is served from a single API host)
+POOL_MAXSIZE = 16
+
+# Responses kept for ETag/Last-Modified revalidation
+MAX_CACHED_RESPONSES = 256
+
+_transport = None
+_transport_lock = threading.Lock()
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((str(key), _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return str(value)
+
+class CachingTransport:
+    """
+    Stand-in for the `requests` module inside espn_api, shared by every League in the process:
+    - One pooled keep-alive session, so batch runs and later leagues reuse open HTTPS connections.
+    - gzip is always requested.
+    - Responses that carry an ETag or Last-Modified header are revalidated with If-None-Match /
+      If-Modified-Since, so weeks that have not changed come back as a body-less 304.
+    - Identical requests in flight at the same time share a single network request.
+
+    Anything other than get() is passed through to the real requests module.
+    """
+
+    def __init__(self, pool_maxsize=POOL_MAXSIZE, max_cached_responses=MAX_CACHED_RESPONSES):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        # The session is shared between users, so never keep cookies set by a response
+        self.session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+
+        self.max_cached_responses = max_cached_responses
+        self._cache = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "network_requests": 0,
+            "not_modified": 0,
+            "deduplicated": 0,
+            "bytes_received": 0,
+            "bytes_saved": 0,
+        }
+
+    def __getattr__(self, name):
+        # Exceptions, other verbs, etc. come from requests itself
+        return getattr(requests, name)
+
+    def _cache_key(self, url, params, headers, cookies):
+        # Cookies are credentials: only their hash is kept
+        cookie_hash = hashlib.sha256(json.dumps(_freeze(cookies or {})).encode()).hexdigest()
+        return (url, _freeze(params or {}), _freeze(headers or {}), cookie_hash)
+
+    def get(self, url, params=None, headers=None, cookies=None, **kwargs):
+        """
+        requests.get with connection pooling, compression, revalidation and deduplication.
+        """
+        key = self._cache_key(url, params, headers, cookies)
+
+        with self._lock:
+            self._stats["requests"] += 1
+            pending = self._in_flight.get(key)
+            if pending is None:
+                pending = Future()
+                self._in_flight[key] = pending
+                owner = True
+            else:
+                self._stats["deduplicated"] += 1
+                owner = False
+
+        if not owner:
+            return pending.result()
+
+        try:
+            response = self._fetch(key, url, params, headers, cookies, **kwargs)
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        else:
+            pending.set_result(response)
+            return response
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def _fetch(self, key, url, params, headers, cookies, **kwargs):
+        with self._lock:
+            cached = self._cache.get(key)
+
+        request_headers = dict(headers or {})
+        if cached is not None:
+            if cached.headers.get("ETag"):
+                request_headers["If-None-Match"] = cached.headers["ETag"]
+            if cached.headers.get("Last-Modified"):
+                request_headers["If-Modified-Since"] = cached.headers["Last-Modified"]
+
+        response = self.session.get(url, params=params, headers=request_headers, cookies=cookies, **kwargs)
+
+        # Bytes on the wire: the compressed length when the server reports it
+        received = int(response.headers.get("Content-Length", len(response.content)))
+
+        with self._lock:
+            self._stats["network_requests"] += 1
+            self._stats["bytes_received"] += received
+
+            if response.status_code == 304 and cached is not None:
+                self._stats["not_modified"] += 1
+                self._stats["bytes_saved"] += int(cached.headers.get("Content-Length", len(cached.content)))
+                self._cache.move_to_end(key)
+                return cached
+
+            if response.status_code == 200 and (response.headers.get("ETag") or response.headers.get("Last-Modified")):
+                self._cache[key] = response
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.max_cached_responses:
+                    self._cache.popitem(last=False)
+            else:
+                self._cache.pop(key, None)
+
+        return response
+
+    def stats(self):
+        """
+        Counters since the transport was created, plus the number of connections opened.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        pools = self.session.get_adapter("https://").poolmanager.pools
+        stats["connections_opened"] = sum(pools[pool_key].num_connections for pool_key in pools.keys())
+        return stats
+
+def get_transport():
+    """
+    Return the process-wide transport.
+    """
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = CachingTransport()
+        return _transport
+
+def install_transport(transport=None):
+    """
+    Route every espn_api request through the shared transport. Safe to call repeatedly.
+
+    Returns:
+    - The installed transport.
+    """
+    from espn_api.requests import espn_requests
+
+    transport = transport or get_transport()
+    espn_requests.requests = transport
+    return transport
@@ -0,0 +1,242 @@
+import numpy as np
+
+from analysis import calculate_pythagorean_expectation_luck, projection_luck_records, projection_margin_std, scatterplot_luck_frame, \
+scheduling_luck_counts, scheduling_luck_records
+from close_games import close_game_records, margin_histograms
+from precompute import get_weekly_aggregates
+
+class IncrementalLuckMetrics:
+    """
+    Editable copy of a league's weekly aggregates that keeps every luck metric up to date as
+    individual scores or projections change (what-if edits, live score updates).
+
+    An edit only touches the edited week, the two teams in the matchup and the row/column of the
+    scheduling matrix that compare against the edited score, instead of recomputing the metrics
+    from scratch. Metric outputs are assembled from the maintained state on request and have the
+    same shape as the corresponding functions in analysis.py.
+    """
+
+    def __init__(self, league_data, p=2):
+        """
+        Parameters:
+        - league_data: The dictionary with data on teams and matchups.
+        - p: The exponent for the Pythagorean formula.
+        """
+        self.league_data = league_data
+        self.p = p
+        self.reset()
+
+    def reset(self):
+        """
+        Drop every edit and go back to the league's actual scores.
+        """
+        aggregates = get_weekly_aggregates(self.league_data)
+
+        # Writable copies of the shared (read-only) aggregates; the version no longer applies
+        self.arrays = {
+            key: value.copy() if isinstance(value, np.ndarray) else value
+            for key, value in aggregates.items() if key != 'version'
+        }
+        self.team_index = aggregates['team_index']
+        self.original_scores = aggregates['scores']
+        self.original_projected = aggregates['projected']
+        self.overrides = {}
+
+        # Season totals used by the Pythagorean metric
+        self.teams = [dict(team) for team in self.league_data['teams']]
+
+        # Running sums each metric is derived from
+        self.opponent_luck = np.nansum(self.arrays['opponent_projected'] - self.arrays['opponent_scores'], axis=1)
+        self.weekly_sum = np.where(self.arrays['played'], self.arrays['scores'], 0.0).sum(axis=0)
+        self.weekly_count = self.arrays['played'].sum(axis=0)
+        self.schedule_wins, self.schedule_losses = scheduling_luck_counts(self.arrays)
+
+    def _schedule_cells(self, row, opponent, column):
+        """
+        Week `column`'s contribution to every scheduling matrix cell that involves team `row`'s score:
+        its own row (its score on each schedule) and the column of the schedule it appears on as an
+        opponent (its opponent's schedule). The shared cell is only included once.
+        """
+        scores = self.arrays['scores']
+        opponents = self.arrays['opponents']
+        num_teams = len(scores)
+        everyone = np.arange(num_teams)
+
+        sims = np.concatenate([np.full(num_teams, row), np.delete(everyone, row)])
+        donors = np.concatenate([everyone, np.full(num_teams - 1, opponent)])
+
+        donor_opponents = opponents[donors, column]
+        my_scores = scores[sims, column]
+        opponent_scores = np.where(donor_opponents >= 0, scores[np.maximum(donor_opponents, 0), column], np.nan)
+
+        counted = ~np.isnan(my_scores) & ~np.isnan(opponent_scores) & (donor_opponents != sims)
+        won = my_scores > opponent_scores
+        return sims, donors, (won & counted).astype(int), (~won & counted).astype(int)
+
+    def _update_team_totals(self, row, opponent, old_score, new_score, opponent_score):
+        """
+        Apply a changed score to the season totals (points for/against and wins/losses) of both teams.
+        """
+        team = self.teams[row]
+        opponent_team = self.teams[opponent]
+        team['points_for'] += float(new_score - old_score)
+        opponent_team['points_against'] += float(new_score - old_score)
+
+        old_margin = old_score - opponent_score
+        new_margin = new_score - opponent_score
+        for season, sign in ((team, 1), (opponent_team, -1)):
+            season['wins'] += int(sign * new_margin > 0) - int(sign * old_margin > 0)
+            season['losses'] += int(sign * new_margin < 0) - int(sign * old_margin < 0)
+
+    def _update_week_statistics(self, row, opponent, column):
+        """
+        Bring the edited week's results and league-wide statistics in self.arrays (wins, median,
+        spread, ranks and all-play records) in line with its changed score, as build_weekly_aggregates
+        computes them. Only that week's column is recomputed.
+        """
+        arrays = self.arrays
+        for team in (row, opponent):
+            arrays['wins'][team, column] = arrays['scores'][team, column] > arrays['opponent_scores'][team, column]
+
+        scores = arrays['scores'][:, column]
+        played = arrays['played'][:, column]
+        arrays['weekly_median'][column] = np.median(scores[played])
+        arrays['weekly_std'][column] = np.std(scores[played])
+
+        outscored_by = (scores[None, :] > scores[:, None]).sum(axis=1)
+        arrays['weekly_ranks'][:, column] = np.where(played, outscored_by + 1, 0)
+
+        num_played = played.sum()
+        if num_played > 1:
+            outscored = (scores[:, None] > scores[None, :]).sum(axis=1)
+            tied = (scores[:, None] == scores[None, :]).sum(axis=1) - 1
+            arrays['all_play_wins'][:, column] = np.where(played, (outscored + 0.5 * tied) / (num_played - 1), 0.0)
+
+    def set_score(self, team_id, week, score=None, projected=None):
+        """
+        Override a team's actual and/or projected score for one week.
+
+        Parameters:
+        - team_id: The team whose score changes.
+        - week: The week of the matchup.
+        - score: Optional. The new actual score.
+        - projected: Optional. The new projected score.
+        """
+        row = self.team_index[team_id]
+        column = week - 1
+        if not 0 <= column < len(self.arrays['weeks']) or not self.arrays['played'][row, column]:
+            raise ValueError(f"Team {team_id} has no matchup in week {week}")
+
+        opponent = self.arrays['opponents'][row, column]
+        override = self.overrides.setdefault((team_id, week), {})
+
+        if projected is not None:
+            override['projected'] = projected
+            delta = projected - self.arrays['projected'][row, column]
+            self.arrays['projected'][row, column] = projected
+            self.arrays['opponent_projected'][opponent, column] = projected
+            self.opponent_luck[opponent] += delta
+
+        if score is not None:
+            override['score'] = score
+            old_score = self.arrays['scores'][row, column]
+            completed = column < self.arrays['num_completed_weeks']
+
+            if completed:
+                sims, donors, old_wins, old_losses = self._schedule_cells(row, opponent, column)
+
+            self.arrays['scores'][row, column] = score
+            self.arrays['opponent_scores'][opponent, column] = score
+            self.opponent_luck[opponent] -= score - old_score
+            self.weekly_sum[column] += score - old_score
+            self.arrays['weekly_mean'][column] = self.weekly_sum[column] / self.weekly_count[column]
+            self._update_week_statistics(row, opponent, column)
+
+            # The in-progress week is not part of the season totals or the completed-week metrics
+            if completed:
+                _, _, new_wins, new_losses = self._schedule_cells(row, opponent, column)
+                self.schedule_wins[sims, donors] += new_wins - old_wins
+                self.schedule_losses[sims, donors] += new_losses - old_losses
+                self._update_team_totals(row, opponent, old_score, score, self.arrays['scores'][opponent, column])
+
+    def clear_override(self, team_id, week):
+        """
+        Restore one team-week to its actual score and projection.
+        """
+        if (team_id, week) not in self.overrides:
+            return
+        row = self.team_index[team_id]
+        self.set_score(
+            team_id, week,
+            score=float(self.original_scores[row, week - 1]),
+            projected=float(self.original_projected[row, week - 1])
+        )
+        del self.overrides[(team_id, week)]
+
+    def apply_overrides(self, overrides):
+        """
+        Bring the edits in line with `overrides`, only touching the team-weeks whose edits changed.
+
+        Parameters:
+        - overrides: Dict mapping (team_id, week) to a dict with the edited 'score' and/or 'projected'.
+        """
+        for team_id, week in [key for key in self.overrides if key not in overrides]:
+            self.clear_override(team_id, week)
+
+        for (team_id, week), override in overrides.items():
+            current = self.overrides.get((team_id, week), {})
+            if current == override:
+                continue
+            # A field that is no longer edited goes back to its actual value first
+            if set(current) - set(override):
+                self.clear_override(team_id, week)
+            self.set_score(team_id, week, **override)
+
+    def luck_indices(self):
+        """
+        Opponent underperformance luck indices, shaped like get_luck_index_v3's output.
+        """
+        luck_indices = [0] * (len(self.teams) + 5)
+        for team_id, luck in zip(self.arrays['team_ids'], self.opponent_luck):
+            if 0 <= team_id < len(luck_indices):
+                luck_indices[team_id] += float(luck)
+        return luck_indices
+
+    def pythagorean_luck(self):
+        """
+        Pythagorean expectation luck, shaped like calculate_pythagorean_expectation_luck's output.
+        """
+        season = {
+            'teams': self.teams,
+            'current_week': self.league_data['current_week'],
+            'regular_season_count': self.league_data['regular_season_count'],
+        }
+        return calculate_pythagorean_expectation_luck(season, p=self.p)
+
+    def scatterplot_luck(self):
+        """
+        Scatterplot luck DataFrame, shaped like calculate_scatterplot_luck's output.
+        """
+        return scatterplot_luck_frame(self.arrays)
+
+    def scheduling_luck(self):
+        """
+        Hypothetical records, shaped like calculate_scheduling_luck's output.
+        """
+        return scheduling_luck_records(self.teams, self.schedule_wins, self.schedule_losses)
+
+    def projection_luck(self):
+        """
+        Projection win probability luck, shaped like calculate_projection_luck's output, and the
+        fitted margin uncertainty it used.
+        """
+        num_weeks = self.arrays['num_completed_weeks']
+        return projection_luck_records(self.arrays, num_weeks), projection_margin_std(self.arrays, num_weeks)
+
+    def close_game_luck(self):
+        """
+        Close-game luck and margin histograms, shaped like calculate_close_game_luck's output.
+        """
+        num_weeks = self.arrays['num_completed_weeks']
+        records, sigma = close_game_records(self.arrays, num_weeks)
+        return {"data": records, "sigma": sigma, "histograms": margin_histograms(self.arrays, num_weeks)}
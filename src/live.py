@@ -0,0 +1,245 @@
+import os
+import threading
+import time
+
+# Seconds between fetches of a league's in-progress week. One fetch serves every session viewing the league.
+LIVE_POLL_SECONDS_ENV = "LIVE_POLL_SECONDS"
+DEFAULT_POLL_SECONDS = 60
+
+# Seconds between checks whether ESPN has moved on to the next week
+ROLLOVER_CHECK_SECONDS = 900
+
+# A league's poller stops once no session has looked at it for this long, and is then dropped
+# by the worker hosting it (the next view starts a new one)
+LIVE_IDLE_SECONDS = 120
+
+def poll_interval():
+    """
+    Seconds between live fetches, from LIVE_POLL_SECONDS (default 60).
+    """
+    return float(os.getenv(LIVE_POLL_SECONDS_ENV) or DEFAULT_POLL_SECONDS)
+
+def _matchup_key(box_score):
+    return (box_score['home_team_id'], box_score['away_team_id'])
+
+def diff_box_scores(old_box_scores, new_box_scores):
+    """
+    Find the matchups whose scores or projections changed between two fetches of a week.
+
+    Parameters:
+    - old_box_scores, new_box_scores: Lists of box score dictionaries as in league_data['box_scores'][week].
+
+    Returns:
+    - The box scores of new_box_scores that are new or differ from their previous version.
+    """
+    previous = {_matchup_key(box_score): box_score for box_score in old_box_scores or []}
+    return [box_score for box_score in new_box_scores if previous.get(_matchup_key(box_score)) != box_score]
+
+class LivePoller:
+    """
+    Follows one league's in-progress week for every session viewing it. Hosted by the analysis
+    worker's LeagueStore next to the league's data, one per loaded league.
+
+    A background thread fetches only the current week at a fixed interval, diffs it against the
+    previous fetch and feeds the changed matchups into an IncrementalLuckMetrics engine, so only
+    the opponent luck of the teams in those matchups is updated. Sessions read a snapshot that is
+    rebuilt once per fetch, so ESPN requests do not grow with the number of viewers.
+
+    Every ROLLOVER_CHECK_SECONDS the league status is refreshed; once ESPN has moved on to the next
+    week the poller adds the week's final scores to the team ratings (without refitting the earlier
+    weeks) and stops, and sessions are asked to reload the league.
+    """
+
+    def __init__(self, league_id, year, swid, espn_s2, league_data, interval=None,
+                 rollover_check_seconds=ROLLOVER_CHECK_SECONDS, idle_seconds=LIVE_IDLE_SECONDS, on_rollover=None):
+        """
+        Parameters:
+        - league_id, year, swid, espn_s2: The league and the credentials to fetch it with.
+        - league_data: The league's data as loaded by the session (its current week is followed).
+        - interval: Optional. Seconds between fetches (default: poll_interval()).
+        - rollover_check_seconds: Optional. Seconds between checks for a new week.
+        - idle_seconds: Optional. Stop after this long without a view.
+        - on_rollover: Optional. Called without arguments once ESPN has moved on to the next week.
+        """
+        from incremental import IncrementalLuckMetrics
+        from ratings import TeamRatings
+
+        self.league_id = league_id
+        self.year = year
+        self.swid = swid
+        self.espn_s2 = espn_s2
+        self.week = league_data['current_week']
+        self.interval = interval or poll_interval()
+        self.rollover_check_seconds = rollover_check_seconds
+        self.idle_seconds = idle_seconds
+        self.on_rollover = on_rollover
+
+        self.metrics = IncrementalLuckMetrics(league_data)
+        self.team_names = {team['id']: team['name'] for team in league_data['teams']}
+        self.box_scores = list(league_data['box_scores'].get(self.week) or [])
+        self.opponent_luck = {
+            int(team_id): float(luck) for team_id, luck in zip(self.metrics.arrays['team_ids'], self.metrics.opponent_luck)
+        }
+        self.changed_teams = set()
+        # Ratings over the completed weeks; the followed week is added once it is over
+        self.ratings = TeamRatings.from_aggregates(self.metrics.arrays, self.metrics.arrays['num_completed_weeks'])
+        self.final_ratings = None
+        self.version = 0
+        self.updated_at = None
+        self.rolled_over_at = None
+        self.error = None
+        self.last_viewed = time.monotonic()
+
+        self._league = None
+        self._last_rollover_check = None
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start polling if it is not already running. Does nothing once the week is over.
+        """
+        if self.rolled_over_at is not None or self._stop.is_set() or (self._thread and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._run, name=f"live-{self.league_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def is_idle(self):
+        """
+        Whether the poller's thread has finished and no session has viewed it for idle_seconds.
+        """
+        running = self._thread is not None and self._thread.is_alive()
+        return not running and time.monotonic() - self.last_viewed > self.idle_seconds
+
+    def touch(self):
+        """
+        Record that a session is viewing the league, which keeps the poller running.
+        """
+        self.last_viewed = time.monotonic()
+
+    def _run(self):
+        while not self._stop.is_set() and time.monotonic() - self.last_viewed <= self.idle_seconds:
+            try:
+                self.poll_once()
+            except Exception as e:
+                with self._lock:
+                    self.error = str(e)
+                    self._snapshot = None
+            if self.rolled_over_at is not None:
+                # Kept until it goes idle, so viewers still see the final scores and the reload notice
+                return
+            self._stop.wait(self.interval)
+
+    def poll_once(self):
+        """
+        Fetch the current week once and apply whatever changed.
+
+        Returns:
+        - The box scores of the matchups that changed.
+        """
+        from api_client import create_league, fetch_week_box_scores
+
+        if self._league is None:
+            self._league = create_league(self.league_id, self.year, self.espn_s2, self.swid)
+            self._last_rollover_check = time.monotonic()
+        elif time.monotonic() - self._last_rollover_check >= self.rollover_check_seconds:
+            self._league.refresh()
+            self._last_rollover_check = time.monotonic()
+
+        box_scores = fetch_week_box_scores(self._league, self.week)
+        changed = diff_box_scores(self.box_scores, box_scores)
+
+        with self._lock:
+            self.apply_changes(changed)
+            self.box_scores = box_scores
+            self.updated_at = time.time()
+            self.error = None
+            if self._league.current_week != self.week:
+                # The scores just fetched are the final ones of the week
+                self.rolled_over_at = time.time()
+                self.ratings.add_week(box_scores)
+                self.final_ratings = self.ratings.records()
+            self._snapshot = None
+
+        if self.rolled_over_at is not None and self.on_rollover is not None:
+            self.on_rollover()
+        return changed
+
+    def apply_changes(self, changed_box_scores):
+        """
+        Apply changed matchups of the followed week to the luck metrics (call with the lock held).
+        """
+        changed_teams = set()
+        for box_score in changed_box_scores:
+            for side in ('home', 'away'):
+                team_id = box_score[f'{side}_team_id']
+                try:
+                    self.metrics.set_score(team_id, self.week, score=box_score[f'{side}_score'],
+                                           projected=box_score[f'{side}_projected'])
+                except (KeyError, ValueError):
+                    # A team or matchup the loaded league data does not know about
+                    continue
+                changed_teams.add(team_id)
+
+        # Each team's opponent luck only depends on its own opponent's score and projection
+        for team_id in changed_teams:
+            self.opponent_luck[team_id] = float(self.metrics.opponent_luck[self.metrics.team_index[team_id]])
+
+        # Updated marks only this fetch's changes, so a fetch without changes clears it
+        self.changed_teams = changed_teams
+        if changed_teams:
+            self.version += 1
+
+    def snapshot(self):
+        """
+        The live state for display, built once per fetch and shared by every viewer.
+
+        Returns:
+        - Dictionary with 'week', 'version', 'updated_at', 'rolled_over_at' and 'error', plus:
+            - 'matchups': List of dictionaries with Team, Score, Projected, Opponent, Opponent Score,
+              Opponent Projected and Updated (changed in the latest update), one per matchup.
+            - 'luck': List of dictionaries with Team Name, Luck Index (season opponent
+              underperformance including the live week) and Updated, best luck first.
+            - 'ratings': Team ratings records (see TeamRatings.records) including the followed week,
+              once it is over; otherwise None.
+        """
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = self._build_snapshot()
+            return self._snapshot
+
+    def _build_snapshot(self):
+        matchups = []
+        for box_score in self.box_scores:
+            home_id, away_id = box_score['home_team_id'], box_score['away_team_id']
+            matchups.append({
+                "Team": self.team_names.get(home_id, str(home_id)),
+                "Score": round(box_score['home_score'], 2),
+                "Projected": round(box_score['home_projected'], 2),
+                "Opponent": self.team_names.get(away_id, str(away_id)),
+                "Opponent Score": round(box_score['away_score'], 2),
+                "Opponent Projected": round(box_score['away_projected'], 2),
+                "Updated": home_id in self.changed_teams or away_id in self.changed_teams,
+            })
+
+        luck = [
+            {"Team Name": self.team_names[team_id], "Luck Index": round(value, 2), "Updated": team_id in self.changed_teams}
+            for team_id, value in self.opponent_luck.items() if team_id in self.team_names
+        ]
+        luck.sort(key=lambda record: record["Luck Index"], reverse=True)
+
+        return {
+            "week": self.week,
+            "version": self.version,
+            "updated_at": self.updated_at,
+            "rolled_over_at": self.rolled_over_at,
+            "error": self.error,
+            "matchups": matchups,
+            "luck": luck,
+            "ratings": self.final_ratings,
+        }
@@ -0,0 +1,347 @@
+from dotenv import load_dotenv
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Load environment variables from .env file
+load_dotenv()
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(SRC_DIR, "app.py")
+
+# Concurrent sessions per level of the default run
+DEFAULT_LEVELS = [1, 2, 4, 8, 16]
+
+# Seconds a single script run may take before it counts as failed
+RUN_TIMEOUT_SECONDS = 120
+
+# Every simulated session logs in to its own fake league, starting at this ID
+FIRST_LEAGUE_ID = 100001
+
+# Buttons clicked by every session, in order (the app's metric buttons)
+METRIC_BUTTONS = [
+    "Opponent Underperformance",
+    "Pythagorean Expectation",
+    "Scatterplot Luck",
+    "Scheduling Luck",
+    "Projection Luck",
+    "Close Game Luck",
+    "Playoff Odds",
+]
+
+# Teams highlighted one after the other in the scatterplot (and picked in the player-level breakdown)
+HIGHLIGHT_TEAMS = 3
+
+# What app.py keeps in st.session_state after a successful login
+LOGIN_STATE_KEYS = ['logged_in', 'league_id', 'swid', 'espn_s2', 'league_key', 'league_data', 'include_players',
+                    'metric_results']
+
+PERCENTILES = [50, 95, 99]
+
+# Process-wide test-mode config, see _install_shared_runtime
+_config_patch = None
+
+def _app_test_class():
+    """
+    AppTest variant that many threads can run at the same time, like the sessions of one server.
+
+    AppTest.run installs a fresh mock Runtime singleton and config patch for every script run and
+    clears them when the run ends, which breaks any other session running at that moment. This
+    variant relies on a single runtime and config patch installed once for the whole load test
+    (see _install_shared_runtime), the same way every session of a real server shares one Runtime.
+    Written against the streamlit version pinned in requirements.txt.
+    """
+    from urllib import parse
+
+    from streamlit.runtime.pages_manager import PagesManager
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import AppTest
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+    class ConcurrentAppTest(AppTest):
+        def _run(self, widget_state=None, timeout=None):
+            pages_manager = PagesManager(self._script_path, ScriptCache(), setup_watcher=False)
+            script_runner = LocalScriptRunner(self._script_path, self.session_state, pages_manager,
+                                              args=self.args, kwargs=self.kwargs)
+            self._tree = script_runner.run(widget_state, self.query_params, timeout or self.default_timeout, self._page_hash)
+            self._tree._runner = self
+            # Last event is SHUTDOWN, so the corresponding data includes the query string
+            self.query_params = parse.parse_qs(script_runner.event_data[-1]["client_state"].query_string)
+            return self
+
+    return ConcurrentAppTest
+
+def _install_shared_runtime():
+    """
+    Install the process-wide mock Runtime and test-mode config that ConcurrentAppTest relies on.
+    """
+    from unittest.mock import MagicMock
+
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.testing.v1.util import patch_config_options
+
+    global _config_patch
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    # Kept referenced for the rest of the process: the patch is undone when the manager is collected
+    _config_patch = patch_config_options({"global.appTest": True})
+    _config_patch.__enter__()
+
+def _timed_run(app, timings, action, errors):
+    """
+    Run the script once and record how long the run took under the given action name.
+    """
+    start = time.perf_counter()
+    app.run(timeout=RUN_TIMEOUT_SECONDS)
+    timings.append((action, time.perf_counter() - start))
+    if app.exception:
+        errors.append(f"{action}: {app.exception[0].message}")
+        return False
+    return True
+
+def run_session(app_test_class, league_id, timings, errors, include_players=False):
+    """
+    Drive one user session through the app: open the login page, log in, open every metric and
+    highlight a few teams in the scatterplot. With include_players, the session ticks the player-level
+    breakdown at login and picks a few teams in it. Appends (action, seconds) for every script run.
+    """
+    app = app_test_class(APP_PATH, default_timeout=RUN_TIMEOUT_SECONDS)
+    if not _timed_run(app, timings, "open", errors):
+        return
+
+    inputs = {text_input.label: text_input for text_input in app.text_input}
+    inputs["League ID"].input(str(league_id))
+    inputs["SWID"].input("{LOAD-TEST}")
+    inputs["ESPN_S2"].input("load-test")
+    if include_players:
+        next(checkbox for checkbox in app.checkbox if checkbox.label == "Include player-level breakdown").check()
+    next(button for button in app.button if button.label == "Submit").click()
+    if not _timed_run(app, timings, "login", errors):
+        return
+
+    # The login run ends in st.rerun(), after which AppTest still holds the login form's widgets
+    # and fails on the next interaction. Continue in a new session seeded with the logged-in state,
+    # as the browser would after the rerun.
+    logged_in_state = {key: app.session_state[key] for key in LOGIN_STATE_KEYS if key in app.session_state}
+    if not logged_in_state.get('logged_in'):
+        errors.append("login: not logged in")
+        return
+    app = app_test_class(APP_PATH, default_timeout=RUN_TIMEOUT_SECONDS)
+    for key, value in logged_in_state.items():
+        app.session_state[key] = value
+    if not _timed_run(app, timings, "dashboard", errors):
+        return
+
+    for label in METRIC_BUTTONS:
+        next(button for button in app.button if button.label == label).click()
+        if not _timed_run(app, timings, label, errors):
+            return
+
+        if label == "Opponent Underperformance" and include_players:
+            for index in range(1, HIGHLIGHT_TEAMS + 1):
+                player_team = next(selectbox for selectbox in app.selectbox if selectbox.key == 'player_luck_team')
+                if index >= len(player_team.options):
+                    break
+                player_team.select(player_team.options[index])
+                if not _timed_run(app, timings, "player breakdown team", errors):
+                    return
+
+        if label == "Scatterplot Luck":
+            highlight = next(selectbox for selectbox in app.selectbox if selectbox.label == "Select a team to highlight")
+            for team_name in highlight.options[1:HIGHLIGHT_TEAMS + 1]:
+                highlight = next(selectbox for selectbox in app.selectbox if selectbox.label == "Select a team to highlight")
+                highlight.select(team_name)
+                if not _timed_run(app, timings, "highlight team", errors):
+                    return
+
+def _cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def _max_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+def run_level(num_sessions, shared_league=False, include_players=False):
+    """
+    Run num_sessions sessions at the same time in this process, the way one Streamlit server runs
+    the scripts of its connected users on separate threads.
+
+    Parameters:
+    - num_sessions: Number of concurrent sessions.
+    - shared_league: If True, every session logs in to the same league (cached after the first
+      fetch); otherwise every session loads its own league.
+    - include_players: If True, every session logs in with the player-level breakdown.
+
+    Returns:
+    - Dictionary with the per-run timings, errors, wall time, CPU seconds and memory figures.
+    """
+    app_test_class = _app_test_class()
+    _install_shared_runtime()
+
+    # Import the app's modules before measuring, as a running server would have
+    import app  # noqa: F401
+    import metrics  # noqa: F401
+    import visualization  # noqa: F401
+    baseline_rss = _max_rss_mb()
+
+    timings, errors = [], []
+    start_barrier = threading.Barrier(num_sessions)
+
+    def session(index):
+        start_barrier.wait()
+        league_id = FIRST_LEAGUE_ID if shared_league else FIRST_LEAGUE_ID + index
+        try:
+            run_session(app_test_class, league_id, timings, errors, include_players)
+        except Exception as e:
+            errors.append(f"session {index}: {type(e).__name__}: {e}")
+
+    threads = [threading.Thread(target=session, args=(index,)) for index in range(num_sessions)]
+    cpu_start = _cpu_seconds()
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {
+        "sessions": num_sessions,
+        "timings": timings,
+        "errors": errors,
+        "wall_seconds": time.perf_counter() - start_time,
+        "cpu_seconds": _cpu_seconds() - cpu_start,
+        "baseline_rss_mb": baseline_rss,
+        "peak_rss_mb": _max_rss_mb(),
+    }
+
+def summarize_level(level):
+    """
+    Latency percentiles (overall and per action), CPU and memory of one level's run.
+    """
+    import numpy as np
+
+    by_action = {}
+    for action, seconds in level["timings"]:
+        by_action.setdefault(action, []).append(seconds)
+
+    def percentiles(values):
+        if not values:
+            return {f"p{p}": float("nan") for p in PERCENTILES}
+        return {f"p{p}": float(v) * 1000 for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+    num_sessions = level["sessions"]
+    return {
+        "sessions": num_sessions,
+        "runs": len(level["timings"]),
+        "errors": len(level["errors"]),
+        "latency_ms": percentiles([seconds for _, seconds in level["timings"]]),
+        "action_latency_ms": {action: percentiles(values) for action, values in by_action.items()},
+        "wall_seconds": level["wall_seconds"],
+        "cpu_seconds": level["cpu_seconds"],
+        "cpu_per_session": level["cpu_seconds"] / num_sessions,
+        "cpu_utilization": level["cpu_seconds"] / level["wall_seconds"] if level["wall_seconds"] else 0.0,
+        "peak_rss_mb": level["peak_rss_mb"],
+        "rss_per_session_mb": (level["peak_rss_mb"] - level["baseline_rss_mb"]) / num_sessions,
+    }
+
+def run_levels(levels, shared_league=False, espn_latency=0.0, include_players=False):
+    """
+    Run every level in a fresh interpreter against the offline fake ESPN source, so peak memory
+    and caches are measured per level.
+
+    Parameters:
+    - levels: Numbers of concurrent sessions.
+    - shared_league: See run_level.
+    - espn_latency: Seconds every simulated ESPN request takes.
+    - include_players: See run_level.
+
+    Returns:
+    - List of summarize_level results, plus each level's first errors under 'error_samples'.
+    """
+    summaries = []
+    for num_sessions in levels:
+        with tempfile.TemporaryDirectory() as corpus_dir:
+            env = dict(os.environ)
+            env["ESPN_SOURCE"] = "fake"
+            env["FAKE_ESPN_LATENCY"] = str(espn_latency)
+            # Keep the percentile corpus of the load test apart from the real one
+            env["LUCK_CORPUS_DIR"] = corpus_dir
+            # Sessions must analyze in this process, not on a configured remote worker
+            env.pop("ANALYSIS_WORKER_URL", None)
+
+            command = [sys.executable, os.path.abspath(__file__), "--child", str(num_sessions)]
+            if shared_league:
+                command.append("--shared-league")
+            if include_players:
+                command.append("--players")
+            completed = subprocess.run(command, cwd=SRC_DIR, env=env, capture_output=True, text=True)
+            if completed.returncode != 0:
+                raise RuntimeError(f"Level with {num_sessions} sessions failed:\n{completed.stderr}")
+
+        level = json.loads(completed.stdout.strip().splitlines()[-1])
+        summary = summarize_level(level)
+        summary["error_samples"] = level["errors"][:3]
+        summaries.append(summary)
+    return summaries
+
+def print_report(summaries):
+    header = f"{'Sessions':>8} {'Runs':>5} {'Errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} " \
+             f"{'Wall s':>7} {'CPU s':>7} {'CPU/sess':>8} {'CPU %':>6} {'Peak MB':>8} {'MB/sess':>8}"
+    print(header)
+    print("-" * len(header))
+    for summary in summaries:
+        latency = summary["latency_ms"]
+        print(f"{summary['sessions']:>8} {summary['runs']:>5} {summary['errors']:>6} "
+              f"{latency['p50']:>8.0f} {latency['p95']:>8.0f} {latency['p99']:>8.0f} "
+              f"{summary['wall_seconds']:>7.1f} {summary['cpu_seconds']:>7.1f} {summary['cpu_per_session']:>8.2f} "
+              f"{summary['cpu_utilization'] * 100:>6.0f} {summary['peak_rss_mb']:>8.0f} {summary['rss_per_session_mb']:>8.1f}")
+
+    for summary in summaries:
+        print(f"\n{summary['sessions']} sessions, latency per action (ms):")
+        for action, latency in summary["action_latency_ms"].items():
+            print(f"  {action:<28} p50 {latency['p50']:>7.0f}  p95 {latency['p95']:>7.0f}  p99 {latency['p99']:>7.0f}")
+        for error in summary["error_samples"]:
+            print(f"  error: {error}")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load test the Streamlit app with concurrent simulated sessions against an offline fake ESPN source."
+    )
+    parser.add_argument("--levels", type=int, nargs="+", default=DEFAULT_LEVELS,
+                        help="Numbers of concurrent sessions to run, one level after the other.")
+    parser.add_argument("--shared-league", action="store_true",
+                        help="Log every session in to the same league instead of one league per session.")
+    parser.add_argument("--players", action="store_true",
+                        help="Log in with the player-level breakdown and exercise it in every session.")
+    parser.add_argument("--espn-latency", type=float, default=0.0,
+                        help="Seconds every simulated ESPN request takes (default: 0).")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON instead of a table.")
+    parser.add_argument("--child", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        # One level, run by run_levels in a fresh interpreter
+        print(json.dumps(run_level(args.child, args.shared_league, args.players)))
+        return
+
+    summaries = run_levels(args.levels, args.shared_league, args.espn_latency, args.players)
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+    else:
+        print_report(summaries)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from analysis import scheduling_luck_counts
+from precompute import get_weekly_aggregates
+from pythagorean import FALLBACK_EXPONENT, expected_win_percentages, fit_exponent_to_totals, season_totals, shrink_exponent
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking
+    fcntl = None
+
+# Directory of the corpus shared by every league the app analyzes
+CORPUS_DIR_ENV = "LUCK_CORPUS_DIR"
+DEFAULT_CORPUS_DIR = "luck_corpus"
+
+# Per-game luck rates stored for every team-season, so seasons of any length are comparable
+CORPUS_METRICS = ['opponent_underperformance', 'pythagorean_luck', 'scheduling_luck', 'all_play_gap']
+
+# Pythagorean exponent of the stored Pythagorean luck. Fixed, so every team-season is measured the same way.
+CORPUS_EXPONENT = FALLBACK_EXPONENT
+
+# Season totals stored for every team-season (not indexed), to fit one Pythagorean exponent over all leagues
+TOTALS_COLUMNS = ['points_for', 'points_against', 'wins', 'games']
+
+# Refit the corpus-wide exponent once the corpus has grown by this fraction since the last fit
+EXPONENT_REFIT_GROWTH = 0.1
+
+# Unindexed values kept in memory before they are merged into the sorted index
+TAIL_LIMIT = 65536
+
+ENTRIES_FILE = "entries.jsonl"
+LOCK_FILE = ".lock"
+
+_corpora = {}
+_corpora_lock = threading.Lock()
+
+def team_luck_rates(league_data):
+    """
+    Per-game luck rates of every team over the completed weeks of a season.
+
+    Parameters:
+    - league_data: The dictionary with data on teams and matchups.
+
+    Returns:
+    - (team_ids, rates): team_ids is an array of the teams with at least one completed game and
+      rates maps each of CORPUS_METRICS to an array aligned with it:
+        - 'opponent_underperformance': Opponents' projected minus actual points per game.
+        - 'pythagorean_luck': Actual minus Pythagorean expected win percentage (CORPUS_EXPONENT).
+        - 'scheduling_luck': Actual win percentage minus the average win percentage on every
+          other team's schedule.
+        - 'all_play_gap': Actual minus all-play win percentage.
+    """
+    aggregates = get_weekly_aggregates(league_data)
+    num_weeks = aggregates['num_completed_weeks']
+    played = aggregates['played'][:, :num_weeks]
+    games = played.sum(axis=1)
+    wins = aggregates['wins'][:, :num_weeks].sum(axis=1)
+
+    opponent_luck = np.where(
+        played, aggregates['opponent_projected'][:, :num_weeks] - aggregates['opponent_scores'][:, :num_weeks], 0.0
+    ).sum(axis=1)
+    points_for = np.where(played, aggregates['scores'][:, :num_weeks], 0.0).sum(axis=1)
+    points_against = np.where(played, aggregates['opponent_scores'][:, :num_weeks], 0.0).sum(axis=1)
+    expected = expected_win_percentages(points_for, points_against, [CORPUS_EXPONENT])[0]
+    all_play_wins = aggregates['all_play_wins'][:, :num_weeks].sum(axis=1)
+
+    # Average win percentage on the other teams' schedules (the diagonal is the team's own)
+    hypothetical_wins, hypothetical_losses = scheduling_luck_counts(aggregates)
+    hypothetical_games = hypothetical_wins + hypothetical_losses
+    others = ~np.eye(len(games), dtype=bool) & (hypothetical_games > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hypothetical_pct = np.where(others, hypothetical_wins / hypothetical_games, 0.0).sum(axis=1) / others.sum(axis=1)
+
+    observed = games > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        win_pct = wins / games
+        rates = {
+            'opponent_underperformance': opponent_luck / games,
+            'pythagorean_luck': win_pct - expected,
+            'scheduling_luck': win_pct - hypothetical_pct,
+            'all_play_gap': (wins - all_play_wins) / games,
+        }
+    return aggregates['team_ids'][observed], {metric: rates[metric][observed] for metric in CORPUS_METRICS}
+
+class LuckCorpus:
+    """
+    Append-only store of the luck rates of every team-season ingested, with a sorted index per
+    metric so percentile lookups are two binary searches instead of a scan.
+
+    On disk, each metric has a raw file of float64 values in ingestion order and a sorted .npy
+    index covering a prefix of it (memory-mapped, so opening a corpus of millions of team-seasons
+    is cheap). Values appended since the index was last rebuilt form a small sorted tail held in
+    memory; once the tail exceeds TAIL_LIMIT it is merged into the index. entries.jsonl records
+    every ingested (league_id, year) and is written last, so it defines which rows exist. The
+    team-seasons' totals are kept in raw files too (without an index), so a Pythagorean exponent
+    can be fitted over every league in the corpus.
+
+    Several processes may share a directory: ingestion is serialized with a lock file and readers
+    pick up new rows and rebuilt indexes on their next query.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries_offset = 0
+        self._num_rows = 0
+        self._seasons = set()
+        self._index = {metric: np.empty(0) for metric in CORPUS_METRICS}
+        self._index_stamp = {metric: None for metric in CORPUS_METRICS}
+        self._tail = {metric: np.empty(0) for metric in CORPUS_METRICS}
+        self._tail_rows = 0  # rows covered by the index + tail
+        self._exponent = None
+        self._exponent_rows = 0
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _refresh(self):
+        """
+        Catch up with rows and indexes written since the last call (possibly by other processes).
+        """
+        entries_path = self._path(ENTRIES_FILE)
+        if os.path.exists(entries_path) and os.path.getsize(entries_path) != self._entries_offset:
+            with open(entries_path, "rb") as f:
+                f.seek(self._entries_offset)
+                for line in f:
+                    # A partially written line belongs to an ingest that is still in progress
+                    if not line.endswith(b"\n"):
+                        break
+                    entry = json.loads(line)
+                    self._seasons.add((str(entry["league_id"]), entry["year"]))
+                    self._num_rows += entry["rows"]
+                    self._entries_offset += len(line)
+
+        for metric in CORPUS_METRICS:
+            index_path = self._path(f"{metric}.index.npy")
+            stamp = os.stat(index_path).st_mtime_ns if os.path.exists(index_path) else None
+            if stamp != self._index_stamp[metric]:
+                self._index[metric] = np.load(index_path, mmap_mode="r") if stamp is not None else np.empty(0)
+                self._index_stamp[metric] = stamp
+                self._tail[metric] = np.sort(self._read_rows(metric, len(self._index[metric]), self._num_rows))
+            elif self._tail_rows < self._num_rows:
+                new_values = self._read_rows(metric, self._tail_rows, self._num_rows)
+                self._tail[metric] = np.sort(np.concatenate([self._tail[metric], new_values]))
+        self._tail_rows = self._num_rows
+
+    def _read_rows(self, metric, start, stop):
+        if stop <= start:
+            return np.empty(0)
+        item_size = np.dtype(np.float64).itemsize
+        return np.fromfile(self._path(f"{metric}.f64"), dtype=np.float64, count=stop - start, offset=start * item_size)
+
+    def _read_totals(self, stop):
+        """
+        Totals of the first `stop` rows. Rows ingested without totals (or before totals were kept) have 0 games.
+        """
+        totals = {}
+        for column in TOTALS_COLUMNS:
+            path = self._path(f"totals.{column}.f64")
+            values = np.fromfile(path, dtype=np.float64, count=stop) if os.path.exists(path) else np.empty(0)
+            totals[column] = np.concatenate([values, np.zeros(stop - len(values))])
+        return totals
+
+    def _compact(self, metric):
+        """
+        Merge a metric's tail into its sorted index and write the index atomically.
+        """
+        index = np.asarray(self._index[metric])
+        tail = self._tail[metric]
+        merged = np.insert(index, np.searchsorted(index, tail), tail)
+
+        temporary_path = self._path(f"{metric}.index.tmp.npy")
+        np.save(temporary_path, merged)
+        os.replace(temporary_path, self._path(f"{metric}.index.npy"))
+
+        self._index[metric] = np.load(self._path(f"{metric}.index.npy"), mmap_mode="r")
+        self._index_stamp[metric] = os.stat(self._path(f"{metric}.index.npy")).st_mtime_ns
+        self._tail[metric] = np.empty(0)
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return self._num_rows
+
+    def contains(self, league_id, year):
+        """
+        Whether a league's season has already been ingested.
+        """
+        with self._lock:
+            self._refresh()
+            return (str(league_id), year) in self._seasons
+
+    def ingest(self, league_data):
+        """
+        Append a league's team-season luck rates to the corpus. Only finished regular seasons are
+        ingested, each (league_id, year) at most once.
+
+        Parameters:
+        - league_data: The dictionary with data on teams and matchups (with 'league_id' and 'year').
+
+        Returns:
+        - Number of team-seasons added.
+        """
+        league_id, year = league_data.get('league_id'), league_data.get('year')
+        finished = league_data['current_week'] > league_data['regular_season_count']
+        if league_id is None or year is None or not finished:
+            return 0
+
+        team_ids, rates = team_luck_rates(league_data)
+        totals = season_totals(league_data)
+        rows = {team_id: row for row, team_id in enumerate(totals['team_ids'].tolist())}
+        order = [rows[team_id] for team_id in team_ids.tolist()]
+        return self.append_rates(league_id, year, team_ids, rates, {column: totals[column][order] for column in TOTALS_COLUMNS})
+
+    def append_rates(self, league_id, year, team_ids, rates, totals=None):
+        """
+        Append precomputed team-season luck rates (as returned by team_luck_rates) for one season.
+        totals optionally maps each of TOTALS_COLUMNS to an array aligned with team_ids.
+
+        Returns:
+        - Number of team-seasons added (0 if the season is already in the corpus).
+        """
+        if len(team_ids) == 0:
+            return 0
+
+        with self._lock, open(self._path(LOCK_FILE), "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            self._refresh()
+            if (str(league_id), year) in self._seasons:
+                return 0
+
+            # Truncate leftovers of an ingest that crashed before recording its entry
+            for metric in CORPUS_METRICS:
+                with open(self._path(f"{metric}.f64"), "ab") as f:
+                    f.truncate(self._num_rows * np.dtype(np.float64).itemsize)
+                    f.write(np.asarray(rates[metric], dtype=np.float64).tobytes())
+            for column in TOTALS_COLUMNS:
+                values = totals[column] if totals is not None else np.zeros(len(team_ids))
+                with open(self._path(f"totals.{column}.f64"), "ab") as f:
+                    f.truncate(self._num_rows * np.dtype(np.float64).itemsize)
+                    f.write(np.asarray(values, dtype=np.float64).tobytes())
+
+            entry = {"league_id": str(league_id), "year": year, "rows": len(team_ids), "teams": team_ids.tolist()}
+            with open(self._path(ENTRIES_FILE), "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+            self._refresh()
+            for metric in CORPUS_METRICS:
+                if len(self._tail[metric]) > TAIL_LIMIT:
+                    self._compact(metric)
+
+        return len(team_ids)
+
+    def percentiles(self, metric, values):
+        """
+        Percentile of each value among every team-season in the corpus (ties count half).
+
+        Parameters:
+        - metric: One of CORPUS_METRICS.
+        - values: A value or array of values of that metric's rate.
+
+        Returns:
+        - Array of percentiles between 0 and 100 (NaN when the corpus is empty).
+        """
+        values = np.asarray(values, dtype=float)
+        with self._lock:
+            self._refresh()
+            index, tail = self._index[metric], self._tail[metric]
+
+        total = len(index) + len(tail)
+        if total == 0:
+            return np.full(values.shape, np.nan)
+
+        below = np.searchsorted(index, values, side='left') + np.searchsorted(tail, values, side='left')
+        at_or_below = np.searchsorted(index, values, side='right') + np.searchsorted(tail, values, side='right')
+        return 100.0 * (below + at_or_below) / (2 * total)
+
+    def pythagorean_exponent(self):
+        """
+        The Pythagorean exponent fitted over every team-season in the corpus, shrunk toward
+        FALLBACK_EXPONENT while the corpus is small. Refitted once the corpus has grown by
+        EXPONENT_REFIT_GROWTH since the last fit.
+
+        Returns:
+        - The exponent (FALLBACK_EXPONENT for an empty corpus).
+        """
+        with self._lock:
+            self._refresh()
+            num_rows = self._num_rows
+            if self._exponent is not None and num_rows <= self._exponent_rows * (1 + EXPONENT_REFIT_GROWTH):
+                return self._exponent
+            totals = self._read_totals(num_rows)
+
+        fitted = fit_exponent_to_totals(totals['points_for'], totals['points_against'], totals['wins'], totals['games'])
+        exponent = shrink_exponent(fitted, totals['games'].sum())
+
+        with self._lock:
+            if num_rows >= self._exponent_rows:
+                self._exponent, self._exponent_rows = exponent, num_rows
+            return self._exponent
+
+def get_corpus(directory=None):
+    """
+    Return the process-wide corpus for a directory (LUCK_CORPUS_DIR by default).
+    """
+    directory = os.path.abspath(directory or os.getenv(CORPUS_DIR_ENV, DEFAULT_CORPUS_DIR))
+    with _corpora_lock:
+        if directory not in _corpora:
+            _corpora[directory] = LuckCorpus(directory)
+        return _corpora[directory]
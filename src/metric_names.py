@@ -0,0 +1,18 @@
+# Metric keys in the order their buttons appear in the app, followed by the luck percentiles section
+METRICS = ['opponent_underperformance', 'pythagorean_expectation', 'scatterplot_luck', 'scheduling_luck', 'projection_luck',
+           'close_game_luck', 'playoff_odds', 'luck_percentiles']
+
+# Column names of the luck percentiles table
+CORPUS_METRIC_LABELS = {
+    'opponent_underperformance': 'Opponent Underperformance',
+    'pythagorean_luck': 'Pythagorean Luck',
+    'scheduling_luck': 'Scheduling Luck',
+    'all_play_gap': 'All-Play Luck',
+}
+
+# Shown instead of a metric's chart before the first week of the season is complete
+NO_COMPLETED_GAMES_MESSAGE = "No completed games yet. Check back once the first week is over!"
+
+# Metrics that what-if mode can rebuild from edited scores
+WHAT_IF_METRICS = ['opponent_underperformance', 'pythagorean_expectation', 'scatterplot_luck', 'scheduling_luck',
+                   'projection_luck', 'close_game_luck']
@@ -0,0 +1,287 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import pandas as pd
+
+from analysis import calculate_projection_luck, calculate_pythagorean_expectation_luck, calculate_scatterplot_luck, \
+get_luck_index_v3, projection_margin_std
+from precompute import get_weekly_aggregates, stack_weekly_aggregates
+from visualization import generate_opponent_underperformance_chart, plot_pythagorean_expectation_luck, save_luck_indices_to_file_v3, \
+create_scheduling_luck_dataframe, create_scatterplot_luck_figure, plot_rolling_expected_wins, plot_position_luck_heatmap, \
+plot_margin_histograms, plot_playoff_odds, plot_seed_distribution
+from bootstrap import attach_confidence_intervals, bootstrap_opponent_underperformance, bootstrap_pythagorean_luck
+from pythagorean import FALLBACK_EXPONENT, get_fitted_exponent, rolling_expected_wins
+from ratings import TeamRatings, calculate_team_ratings
+from player_luck import calculate_player_luck
+from close_games import CLOSE_GAME_MARGIN, calculate_close_game_luck
+from simulation import DEFAULT_PLAYOFF_TEAMS, simulate_playoff_odds
+from luck_corpus import CORPUS_METRICS, get_corpus, team_luck_rates
+from metric_names import METRICS, CORPUS_METRIC_LABELS, NO_COMPLETED_GAMES_MESSAGE
+
+# Fixed seed so confidence intervals do not jitter between reruns
+BOOTSTRAP_SEED = 0
+
+# Simulated rest-of-season outcomes behind the playoff odds, with a fixed seed so the odds do not jitter
+PLAYOFF_SIMULATIONS = 100_000
+SIMULATION_SEED = 0
+
+# Worker threads shared by every session in the process
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def compute_opponent_underperformance(league_data):
+    """
+    Compute the opponent underperformance table and bar chart, with bootstrap confidence intervals.
+    Leagues fetched with player data also get the luck broken down by player and position.
+    """
+    luck_indices = get_luck_index_v3(league_data)
+    luck_indices_df = save_luck_indices_to_file_v3(league_data, luck_indices)
+    intervals = bootstrap_opponent_underperformance(league_data, seed=BOOTSTRAP_SEED)
+    luck_indices_df = pd.DataFrame(attach_confidence_intervals(luck_indices_df.to_dict('records'), intervals))
+    result = {
+        "table": luck_indices_df.drop(columns=["CI Minus", "CI Plus"], errors="ignore"),
+        "figure": generate_opponent_underperformance_chart(luck_indices_df)
+    }
+
+    if league_data.get('players'):
+        player_luck = calculate_player_luck(league_data)
+        result.update({
+            "player_positions": player_luck["positions"],
+            "player_starters": player_luck["starters"],
+            "player_opponents": player_luck["opponents"],
+            "position_figure": plot_position_luck_heatmap(player_luck["positions"])
+        })
+
+    return result
+
+def compute_pythagorean_expectation(league_data, prior=FALLBACK_EXPONENT):
+    """
+    Compute the Pythagorean expectation luck data and chart with the league's fitted exponent,
+    bootstrap confidence intervals and the week-by-week luck curves. The exponent is shrunk toward
+    a fixed prior, so the result only depends on the league itself; pass e.g.
+    get_corpus().pythagorean_exponent() to shrink toward the leagues analyzed so far instead.
+    """
+    exponent = get_fitted_exponent(league_data, prior=prior)
+    if get_weekly_aggregates(league_data)['num_completed_weeks'] == 0:
+        return {"data": [], "exponent": exponent, "figure": None, "message": NO_COMPLETED_GAMES_MESSAGE}
+    pythagorean_luck_data = calculate_pythagorean_expectation_luck(league_data, p=exponent)
+    intervals = bootstrap_pythagorean_luck(league_data, p=exponent, seed=BOOTSTRAP_SEED)
+    attach_confidence_intervals(pythagorean_luck_data, intervals)
+    rolling_df = rolling_expected_wins(league_data, p=exponent)
+    return {
+        "data": pythagorean_luck_data,
+        "exponent": exponent,
+        "figure": plot_pythagorean_expectation_luck(pythagorean_luck_data),
+        "rolling_table": rolling_df,
+        "rolling_figure": plot_rolling_expected_wins(rolling_df)
+    }
+
+def compute_scatterplot_luck(league_data):
+    """
+    Compute the scatterplot luck table, the all-teams figure and one highlighted figure per team.
+    """
+    scatterplot_luck_df = calculate_scatterplot_luck(league_data)
+    team_names = list(scatterplot_luck_df["Team Name"].unique())
+    return {
+        "table": scatterplot_luck_df,
+        "team_names": team_names,
+        "figure": create_scatterplot_luck_figure(scatterplot_luck_df),
+        "team_figures": {
+            team_name: create_scatterplot_luck_figure(scatterplot_luck_df, team_name)
+            for team_name in team_names
+        }
+    }
+
+def compute_scheduling_luck(league_data):
+    """
+    Compute the scheduling luck table and the opponent-adjusted team ratings.
+    """
+    return {
+        "table": create_scheduling_luck_dataframe(league_data),
+        "ratings": pd.DataFrame(calculate_team_ratings(league_data))
+    }
+
+def compute_projection_luck(league_data):
+    """
+    Compute the projection win probability luck data and chart, and the fitted margin uncertainty.
+    """
+    projection_luck_data = calculate_projection_luck(league_data)
+    if not projection_luck_data:
+        return {"data": [], "figure": None, "message": NO_COMPLETED_GAMES_MESSAGE}
+    return {
+        "data": projection_luck_data,
+        "sigma": projection_margin_std(stack_weekly_aggregates(league_data)),
+        "figure": plot_pythagorean_expectation_luck(projection_luck_data, title='Projection Win Probability Luck')
+    }
+
+def compute_close_game_luck(league_data):
+    """
+    Compute the close-game luck data and chart, the fitted margin spread and the margin histograms of all teams.
+    """
+    close_game_luck = calculate_close_game_luck(league_data)
+    if not close_game_luck["data"]:
+        return {"data": [], "close_margin": CLOSE_GAME_MARGIN, "figure": None, "message": NO_COMPLETED_GAMES_MESSAGE}
+    return {
+        "data": close_game_luck["data"],
+        "close_margin": CLOSE_GAME_MARGIN,
+        "margin_sigma": close_game_luck["sigma"],
+        "figure": plot_pythagorean_expectation_luck(close_game_luck["data"], title='Close Game Luck'),
+        "histograms": close_game_luck["histograms"],
+        "histogram_figure": plot_margin_histograms(close_game_luck["histograms"], CLOSE_GAME_MARGIN)
+    }
+
+def compute_playoff_odds(league_data):
+    """
+    Simulate the rest of the regular season: playoff odds, luck-adjusted playoff odds and the
+    distribution of final seeds, all in percent.
+    """
+    odds_df = simulate_playoff_odds(league_data, PLAYOFF_SIMULATIONS, seed=SIMULATION_SEED)
+    playoff_teams = league_data.get('playoff_team_count', DEFAULT_PLAYOFF_TEAMS)
+    seed_columns = [column for column in odds_df.columns if column.startswith("Seed ")]
+
+    table = odds_df.drop(columns=seed_columns)
+    for column in ("Playoff Odds", "Luck-Adjusted Playoff Odds", "Playoff Luck"):
+        table[column] = (100 * table[column]).round(1)
+    seeds = (100 * odds_df.set_index("Team Name")[seed_columns]).round(1)
+
+    return {
+        "table": table,
+        "playoff_teams": playoff_teams,
+        "figure": plot_playoff_odds(table),
+        "seeds": seeds,
+        "seed_figure": plot_seed_distribution(seeds, playoff_teams)
+    }
+
+def compute_luck_percentiles(league_data):
+    """
+    Add the league to the cross-league luck corpus (finished seasons only) and look up where each
+    team's per-game luck ranks among every team-season analyzed so far.
+    """
+    corpus = get_corpus()
+    corpus.ingest(league_data)
+
+    team_ids, rates = team_luck_rates(league_data)
+    team_names = {team['id']: team['name'] for team in league_data['teams']}
+    table = pd.DataFrame({"Team Name": [team_names[team_id] for team_id in team_ids]})
+    for metric in CORPUS_METRICS:
+        table[CORPUS_METRIC_LABELS[metric]] = corpus.percentiles(metric, rates[metric]).round(1)
+
+    return {"table": table, "corpus_size": len(corpus)}
+
+METRIC_BUILDERS = {
+    'opponent_underperformance': compute_opponent_underperformance,
+    'pythagorean_expectation': compute_pythagorean_expectation,
+    'scatterplot_luck': compute_scatterplot_luck,
+    'scheduling_luck': compute_scheduling_luck,
+    'projection_luck': compute_projection_luck,
+    'close_game_luck': compute_close_game_luck,
+    'playoff_odds': compute_playoff_odds,
+    'luck_percentiles': compute_luck_percentiles,
+}
+
+def compute_metric(metric, league_data):
+    """
+    Compute a single metric's data and figures.
+
+    Parameters:
+    - metric: One of METRICS.
+    - league_data: The dictionary with data on teams and matchups.
+
+    Returns:
+    - Dictionary with the metric's tables/data and figures.
+    """
+    return METRIC_BUILDERS[metric](league_data)
+
+def compute_what_if_metric(metric, what_if, exponent=None):
+    """
+    Build a metric's result from a what-if engine's edited scores, shaped like compute_metric's results
+    (without the confidence intervals, player breakdown and luck curves, which only exist for the actual scores).
+
+    Parameters:
+    - metric: One of WHAT_IF_METRICS.
+    - what_if: The IncrementalLuckMetrics holding the edits.
+    - exponent: Optional. The Pythagorean exponent fitted for the actual scores, used for 'pythagorean_expectation'.
+
+    Returns:
+    - Dictionary with the metric's tables/data and figures.
+    """
+    league_data = what_if.league_data
+    if metric == 'opponent_underperformance':
+        luck_indices_df = save_luck_indices_to_file_v3(league_data, what_if.luck_indices())
+        return {"table": luck_indices_df, "figure": generate_opponent_underperformance_chart(luck_indices_df)}
+    if metric == 'pythagorean_expectation':
+        if exponent is not None:
+            what_if.p = exponent
+        if what_if.arrays['num_completed_weeks'] == 0:
+            return {"data": [], "exponent": what_if.p, "figure": None, "message": NO_COMPLETED_GAMES_MESSAGE}
+        pythagorean_luck_data = what_if.pythagorean_luck()
+        return {"data": pythagorean_luck_data, "exponent": what_if.p, "figure": plot_pythagorean_expectation_luck(pythagorean_luck_data)}
+    if metric == 'scatterplot_luck':
+        scatterplot_luck_df = what_if.scatterplot_luck()
+        return {"table": scatterplot_luck_df, "team_names": list(scatterplot_luck_df["Team Name"].unique())}
+    if metric == 'scheduling_luck':
+        ratings = TeamRatings.from_aggregates(what_if.arrays, what_if.arrays['num_completed_weeks'])
+        return {
+            "table": create_scheduling_luck_dataframe(league_data, what_if.scheduling_luck()),
+            "ratings": pd.DataFrame(ratings.records())
+        }
+    if metric == 'projection_luck':
+        projection_luck_data, sigma = what_if.projection_luck()
+        if not projection_luck_data:
+            return {"data": [], "figure": None, "message": NO_COMPLETED_GAMES_MESSAGE}
+        return {
+            "data": projection_luck_data,
+            "sigma": sigma,
+            "figure": plot_pythagorean_expectation_luck(projection_luck_data, title='Projection Win Probability Luck')
+        }
+    if metric == 'close_game_luck':
+        close_game_luck = what_if.close_game_luck()
+        if not close_game_luck["data"]:
+            return {"data": [], "close_margin": CLOSE_GAME_MARGIN, "figure": None, "message": NO_COMPLETED_GAMES_MESSAGE}
+        return {
+            "data": close_game_luck["data"],
+            "close_margin": CLOSE_GAME_MARGIN,
+            "margin_sigma": close_game_luck["sigma"],
+            "figure": plot_pythagorean_expectation_luck(close_game_luck["data"], title='Close Game Luck'),
+            "histograms": close_game_luck["histograms"],
+            "histogram_figure": plot_margin_histograms(close_game_luck["histograms"], CLOSE_GAME_MARGIN)
+        }
+    raise ValueError(f"What-if mode does not support {metric}")
+
+def get_executor():
+    """
+    Return the process-wide worker pool used for background metric computation.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="metrics")
+        return _executor
+
+def _publish_result(results, metric, future):
+    if not future.cancelled() and future.exception() is None:
+        results[metric] = future.result()
+
+def submit_all_metrics(league_data, results=None):
+    """
+    Start computing every metric in the background worker pool.
+
+    Parameters:
+    - league_data: The dictionary with data on teams and matchups.
+    - results: Optional. Dictionary that each metric's result is published into as soon as it finishes.
+
+    Returns:
+    - Dictionary mapping each metric to its Future.
+    """
+    executor = get_executor()
+    futures = {}
+    for metric in METRICS:
+        future = executor.submit(compute_metric, metric, league_data)
+        if results is not None:
+            future.add_done_callback(partial(_publish_result, results, metric))
+        futures[metric] = future
+    return futures
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+from precompute import get_weekly_aggregates
+
+def player_luck_arrays(league_data):
+    """
+    Join the starters fetched with fetch_league_data(league, include_players=True) to the weekly
+    aggregates, keeping the starters of every matchup the team-level metrics count.
+
+    Parameters:
+    - league_data: The dictionary with data on teams and matchups, including 'players'.
+
+    Returns:
+    - Dictionary of arrays with one entry per starter per matchup: 'team_rows' and 'opponent_rows'
+      (aggregate row indexes), 'player_codes' and 'position_codes' (indexes into 'player_ids' and
+      'positions'), 'points' and 'projected'; plus the aggregates' 'team_names'.
+    """
+    players = league_data['players']
+    aggregates = get_weekly_aggregates(league_data)
+
+    weeks = np.asarray(players['week'], dtype=np.int64)
+    team_ids = np.asarray(players['team_id'], dtype=np.int64)
+    points = np.asarray(players['points'], dtype=float)
+    projected = np.asarray(players['projected'], dtype=float)
+
+    # Map team IDs to aggregate rows without a Python loop over starters
+    sorter = np.argsort(aggregates['team_ids'])
+    sorted_ids = aggregates['team_ids'][sorter]
+    positions_in_sorted = np.minimum(np.searchsorted(sorted_ids, team_ids), len(sorted_ids) - 1)
+    team_rows = sorter[positions_in_sorted]
+    known = sorted_ids[positions_in_sorted] == team_ids
+
+    # Same weeks as the team-level metrics, and only matchups that made it into the aggregates
+    num_weeks = len(aggregates['weeks'])
+    in_season = known & (weeks >= 1) & (weeks <= num_weeks)
+    opponent_rows = np.where(in_season, aggregates['opponents'][team_rows, np.clip(weeks - 1, 0, num_weeks - 1)], -1)
+    keep = in_season & (opponent_rows >= 0)
+
+    player_ids, player_codes = np.unique(np.asarray(players['player_id'], dtype=np.int64)[keep], return_inverse=True)
+    positions, position_codes = np.unique(np.asarray(players['position'], dtype=str)[keep], return_inverse=True)
+
+    return {
+        'team_names': aggregates['team_names'],
+        'team_rows': team_rows[keep],
+        'opponent_rows': opponent_rows[keep],
+        'player_ids': player_ids,
+        'player_codes': player_codes,
+        'positions': positions,
+        'position_codes': position_codes,
+        'points': points[keep],
+        'projected': projected[keep],
+    }
+
+def _grouped_sums(group_codes, num_groups, values):
+    return [np.bincount(group_codes, weights=value, minlength=num_groups) for value in values]
+
+def calculate_player_luck(league_data):
+    """
+    Attribute each team's luck to individual players and positions.
+
+    A team's own luck from a starter is points - projected; the luck its opponents' starters gave
+    it is projected - points (the player-level version of get_luck_index_v3's opponent
+    underperformance, whose team totals are the sums over the opposing starters).
+
+    Parameters:
+    - league_data: The dictionary with data on teams and matchups, including 'players'.
+
+    Returns:
+    - Dictionary of DataFrames:
+        - 'positions': Team Name, Position, Own Luck, Opponent Luck.
+        - 'starters': Team Name, Player, Position, Starts, Points, Projected, Luck (own starters).
+        - 'opponents': Team Name, Player, Position, Games, Points, Projected, Luck (opposing starters
+          faced, Luck > 0 meaning they underperformed against the team).
+    """
+    arrays = player_luck_arrays(league_data)
+    team_names = np.array(arrays['team_names'], dtype=object)
+    num_teams = len(team_names)
+    num_positions = len(arrays['positions'])
+    num_players = len(arrays['player_ids'])
+    points, projected = arrays['points'], arrays['projected']
+    names = league_data['players']['names']
+    player_names = np.array([names.get(str(player_id), str(player_id)) for player_id in arrays['player_ids']], dtype=object)
+
+    # Per (team, position) for the team's own starters and for the opposing starters it faced
+    own_groups = arrays['team_rows'] * num_positions + arrays['position_codes']
+    opponent_groups = arrays['opponent_rows'] * num_positions + arrays['position_codes']
+    num_groups = num_teams * num_positions
+    own_luck, = _grouped_sums(own_groups, num_groups, [points - projected])
+    opponent_luck, = _grouped_sums(opponent_groups, num_groups, [projected - points])
+    group_teams, group_positions = np.divmod(np.arange(num_groups), max(num_positions, 1))
+    positions_df = pd.DataFrame({
+        "Team Name": team_names[group_teams],
+        "Position": arrays['positions'][group_positions],
+        "Own Luck": np.round(own_luck, 2),
+        "Opponent Luck": np.round(opponent_luck, 2),
+    })
+
+    def player_frame(team_rows, count_label, luck_sign):
+        groups = team_rows * num_players + arrays['player_codes']
+        counts = np.bincount(groups, minlength=num_teams * num_players)
+        total_points, total_projected = _grouped_sums(groups, num_teams * num_players, [points, projected])
+        # A player's position is taken from any of their rows (players keep their position all season)
+        player_positions = np.empty(num_players, dtype=arrays['positions'].dtype)
+        player_positions[arrays['player_codes']] = arrays['positions'][arrays['position_codes']]
+
+        present = np.flatnonzero(counts)
+        present_teams, present_players = np.divmod(present, max(num_players, 1))
+        frame = pd.DataFrame({
+            "Team Name": team_names[present_teams],
+            "Player": player_names[present_players],
+            "Position": player_positions[present_players],
+            count_label: counts[present],
+            "Points": np.round(total_points[present], 2),
+            "Projected": np.round(total_projected[present], 2),
+            "Luck": np.round(luck_sign * (total_points[present] - total_projected[present]), 2),
+        })
+        return frame.sort_values(["Team Name", "Luck"], ascending=[True, False], ignore_index=True)
+
+    return {
+        "positions": positions_df,
+        "starters": player_frame(arrays['team_rows'], "Starts", 1),
+        "opponents": player_frame(arrays['opponent_rows'], "Games", -1),
+    }
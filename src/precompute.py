@@ -0,0 +1,237 @@
+import hashlib
+import threading
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+
+# Number of league_data versions whose aggregates are kept in memory
+AGGREGATE_CACHE_SIZE = 32
+
+_aggregate_cache = OrderedDict()
+_aggregate_cache_lock = threading.Lock()
+
+def league_data_version(league_data):
+    """
+    Compute a content fingerprint of the parts of league_data the weekly aggregates depend on.
+    Any change to teams, weeks or box scores produces a new version.
+
+    Parameters:
+    - league_data: The dictionary with data on teams and matchups.
+
+    Returns:
+    - A short hex string identifying this version of the league data.
+    """
+    teams = [
+        (team['id'], team['name'], team['wins'], team['losses'], team['points_for'], team['points_against'])
+        for team in league_data['teams']
+    ]
+    box_scores = sorted(league_data['box_scores'].items(), key=lambda item: int(item[0]))
+    payload = repr((league_data['current_week'], league_data['regular_season_count'], teams, box_scores))
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+def build_weekly_aggregates(league_data, version=None):
+    """
+    Build the per-team, per-week arrays shared by all luck metrics in a single pass over the box scores.
+
+    Teams are indexed by their position in league_data['teams'] and weeks by week - 1, covering
+    every week up to the current one (the current week may still be in progress). Weeks without
+    a game for a team hold NaN scores and an opponent index of -1.
+
+    Parameters:
+    - league_data: The dictionary with data on teams and matchups.
+    - version: Optional. Precomputed league_data_version(league_data).
+
+    Returns:
+    - Dictionary with:
+        - 'version': Fingerprint of the league data the aggregates were built from.
+        - 'team_ids', 'team_names': Team IDs and names in index order.
+        - 'team_index': Dict mapping team ID to its row index.
+        - 'weeks': Week numbers in column order.
+        - 'num_completed_weeks': Number of leading weeks that are finished.
+        - 'scores', 'projected': (teams x weeks) actual and projected scores.
+        - 'opponents': (teams x weeks) row index of the opponent, -1 if no game.
+        - 'opponent_scores', 'opponent_projected': (teams x weeks) opponent's actual and projected scores.
+        - 'played': (teams x weeks) whether the team had a game.
+        - 'wins': (teams x weeks) whether the team outscored its opponent.
+        - 'weekly_mean', 'weekly_median', 'weekly_std': Per-week league score statistics.
+        - 'weekly_ranks': (teams x weeks) score rank within the week, 1 = highest, 0 if no game.
+        - 'all_play_wins': (teams x weeks) share of the other teams outscored that week (ties count
+          half), i.e. the expected wins against a random opponent. 0 if no game.
+    """
+    teams = league_data['teams']
+    team_ids = np.array([team['id'] for team in teams], dtype=np.int64)
+    team_index = {team['id']: index for index, team in enumerate(teams)}
+    num_teams = len(teams)
+    num_weeks = max(min(league_data['current_week'], league_data['regular_season_count']), 0)
+    num_completed_weeks = max(min(league_data['current_week'] - 1, league_data['regular_season_count']), 0)
+
+    scores = np.full((num_teams, num_weeks), np.nan)
+    projected = np.full((num_teams, num_weeks), np.nan)
+    opponents = np.full((num_teams, num_weeks), -1, dtype=np.int64)
+
+    for week in range(1, num_weeks + 1):
+        # Weeks that failed to fetch are stored as None
+        box_scores = league_data['box_scores'].get(week) or []
+        column = week - 1
+
+        for box_score in box_scores:
+            home_index = team_index.get(box_score['home_team_id'])
+            away_index = team_index.get(box_score['away_team_id'])
+
+            # Skip invalid matchups (Bye weeks or teams we have no record of)
+            if home_index is None or away_index is None:
+                continue
+
+            scores[home_index, column] = box_score['home_score']
+            projected[home_index, column] = box_score['home_projected']
+            opponents[home_index, column] = away_index
+
+            scores[away_index, column] = box_score['away_score']
+            projected[away_index, column] = box_score['away_projected']
+            opponents[away_index, column] = home_index
+
+    played = opponents >= 0
+    week_columns = np.arange(num_weeks)
+    opponent_rows = np.where(played, opponents, 0)
+    opponent_scores = np.where(played, scores[opponent_rows, week_columns], np.nan)
+    opponent_projected = np.where(played, projected[opponent_rows, week_columns], np.nan)
+    wins = played & (scores > opponent_scores)
+
+    # Weeks with no games yet produce all-NaN columns, which numpy warns about
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        weekly_mean = np.nanmean(scores, axis=0)
+        weekly_median = np.nanmedian(scores, axis=0)
+        weekly_std = np.nanstd(scores, axis=0)
+
+    # Rank = 1 + number of teams that outscored this team that week (ties share a rank)
+    outscored_by = (scores[None, :, :] > scores[:, None, :]).sum(axis=1)
+    weekly_ranks = np.where(played, outscored_by + 1, 0)
+
+    # All-play record: every team plays every other team that played that week
+    outscored = (scores[:, None, :] > scores[None, :, :]).sum(axis=1)
+    tied = (scores[:, None, :] == scores[None, :, :]).sum(axis=1) - 1
+    num_played = played.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        all_play_wins = np.where(played & (num_played > 1), (outscored + 0.5 * tied) / (num_played - 1), 0.0)
+
+    aggregates = {
+        'version': version or league_data_version(league_data),
+        'team_ids': team_ids,
+        'team_names': [team['name'] for team in teams],
+        'team_index': team_index,
+        'weeks': np.arange(1, num_weeks + 1),
+        'num_completed_weeks': num_completed_weeks,
+        'scores': scores,
+        'projected': projected,
+        'opponents': opponents,
+        'opponent_scores': opponent_scores,
+        'opponent_projected': opponent_projected,
+        'played': played,
+        'wins': wins,
+        'weekly_mean': weekly_mean,
+        'weekly_median': weekly_median,
+        'weekly_std': weekly_std,
+        'weekly_ranks': weekly_ranks,
+        'all_play_wins': all_play_wins,
+    }
+
+    # Aggregates are shared between metrics (and threads), so guard them against in-place edits
+    for value in aggregates.values():
+        if isinstance(value, np.ndarray):
+            value.setflags(write=False)
+
+    return aggregates
+
+def get_weekly_aggregates(league_data):
+    """
+    Return the weekly aggregates for league_data, building them only once per league_data version.
+    All metrics should read their per-team weekly data from here instead of walking the box scores.
+
+    Parameters:
+    - league_data: The dictionary with data on teams and matchups.
+
+    Returns:
+    - The dictionary produced by build_weekly_aggregates. Its arrays are read-only.
+    """
+    version = league_data_version(league_data)
+
+    with _aggregate_cache_lock:
+        if version in _aggregate_cache:
+            _aggregate_cache.move_to_end(version)
+            return _aggregate_cache[version]
+
+    aggregates = build_weekly_aggregates(league_data, version)
+
+    with _aggregate_cache_lock:
+        _aggregate_cache[version] = aggregates
+        _aggregate_cache.move_to_end(version)
+        while len(_aggregate_cache) > AGGREGATE_CACHE_SIZE:
+            _aggregate_cache.popitem(last=False)
+
+    return aggregates
+
+def stack_weekly_aggregates(seasons, include_current_week=False):
+    """
+    Concatenate the weekly aggregates of several seasons (or leagues) along the week axis,
+    so multi-season metrics can be computed with the same array code as a single season.
+
+    Teams are matched across seasons by team ID; a team that is missing from a season
+    simply has no games in that season's weeks.
+
+    Parameters:
+    - seasons: A league_data dictionary or a list of them.
+    - include_current_week: Whether to keep each season's in-progress current week.
+
+    Returns:
+    - Dictionary with 'team_ids', 'team_names' (most recent name), 'team_index', 'season_of_week'
+      (index into seasons for every week column) and the per-team weekly arrays 'scores',
+      'projected', 'opponents', 'opponent_scores', 'opponent_projected', 'played', 'wins'
+      and 'all_play_wins' laid out as in build_weekly_aggregates.
+    """
+    if isinstance(seasons, dict):
+        seasons = [seasons]
+
+    season_aggregates = [get_weekly_aggregates(league_data) for league_data in seasons]
+
+    team_index = {}
+    team_names = []
+    for aggregates in season_aggregates:
+        for team_id, team_name in zip(aggregates['team_ids'], aggregates['team_names']):
+            team_id = int(team_id)
+            if team_id not in team_index:
+                team_index[team_id] = len(team_names)
+                team_names.append(team_name)
+            else:
+                team_names[team_index[team_id]] = team_name
+
+    num_teams = len(team_names)
+    stacked = {key: [] for key in ['scores', 'projected', 'opponents', 'opponent_scores', 'opponent_projected', 'played', 'wins', 'all_play_wins']}
+    season_of_week = []
+
+    for season_number, aggregates in enumerate(season_aggregates):
+        num_weeks = len(aggregates['weeks']) if include_current_week else aggregates['num_completed_weeks']
+        rows = np.array([team_index[int(team_id)] for team_id in aggregates['team_ids']], dtype=np.int64)
+
+        for key, fill in [('scores', np.nan), ('projected', np.nan), ('opponent_scores', np.nan),
+                          ('opponent_projected', np.nan), ('played', False), ('wins', False), ('all_play_wins', 0.0)]:
+            block = np.full((num_teams, num_weeks), fill, dtype=aggregates[key].dtype)
+            block[rows] = aggregates[key][:, :num_weeks]
+            stacked[key].append(block)
+
+        # Opponent indices have to be remapped into the combined team order
+        season_opponents = aggregates['opponents'][:, :num_weeks]
+        opponents = np.full((num_teams, num_weeks), -1, dtype=np.int64)
+        opponents[rows] = np.where(season_opponents >= 0, rows[np.maximum(season_opponents, 0)], -1)
+        stacked['opponents'].append(opponents)
+        season_of_week.extend([season_number] * num_weeks)
+
+    result = {key: np.concatenate(blocks, axis=1) if blocks else np.empty((num_teams, 0)) for key, blocks in stacked.items()}
+    result.update({
+        'team_ids': np.array(list(team_index), dtype=np.int64),
+        'team_names': team_names,
+        'team_index': team_index,
+        'season_of_week': np.array(season_of_week, dtype=np.int64),
+    })
+    return result
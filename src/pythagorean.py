@@ -0,0 +1,248 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from precompute import get_weekly_aggregates, stack_weekly_aggregates
+
+# Exponent grid evaluated when fitting
+DEFAULT_EXPONENTS = np.round(np.arange(1.0, 10.0 + 1e-9, 0.05), 2)
+
+# Exponent used when there is too little data to fit on, and the default prior fits are shrunk toward
+FALLBACK_EXPONENT = 2.0
+
+# Completed team-games at which a fit and its prior get equal weight
+PRIOR_GAMES = 100
+
+# Team-seasons evaluated against the whole exponent grid at once (bounds memory for large corpora)
+FIT_CHUNK_SIZE = 65536
+
+# Number of fitted exponents kept in memory
+EXPONENT_CACHE_SIZE = 256
+
+_exponent_cache = OrderedDict()
+_exponent_cache_lock = threading.Lock()
+
+def expected_win_percentages(points_for, points_against, exponents):
+    """
+    Evaluate the Pythagorean expected win percentage for a whole grid of exponents at once.
+
+    Parameters:
+    - points_for, points_against: Arrays of any (matching) shape, e.g. (teams x weeks).
+    - exponents: 1-D array of exponents.
+
+    Returns:
+    - Array of shape (len(exponents),) + points_for.shape.
+    """
+    points_for = np.asarray(points_for, dtype=float)[None]
+    points_against = np.asarray(points_against, dtype=float)[None]
+    exponents = np.asarray(exponents, dtype=float).reshape((-1,) + (1,) * (points_for.ndim - 1))
+
+    # PF^p / (PF^p + PA^p) written as 1 / (1 + (PA/PF)^p) so large exponents cannot overflow
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        percentages = 1.0 / (1.0 + (points_against / points_for) ** exponents)
+    return np.where((points_for == 0) & (points_against == 0), 0.5, percentages)
+
+def cumulative_records(seasons):
+    """
+    Season-to-date points for/against, wins and games for every team after every completed week.
+
+    Parameters:
+    - seasons: A league_data dictionary or a list of them.
+
+    Returns:
+    - Dictionary with the stacked aggregates' 'team_ids', 'team_names' and 'season_of_week', plus
+      (teams x weeks) cumulative arrays 'points_for', 'points_against', 'wins' and 'games'.
+      Totals restart at the first week of every season.
+    """
+    aggregates = stack_weekly_aggregates(seasons)
+    played = aggregates['played']
+    weekly = {
+        'points_for': np.where(played, aggregates['scores'], 0.0),
+        'points_against': np.where(played, aggregates['opponent_scores'], 0.0),
+        'wins': aggregates['wins'].astype(float),
+        'games': played.astype(float),
+    }
+
+    season_of_week = aggregates['season_of_week']
+    season_starts = np.flatnonzero(np.diff(season_of_week, prepend=-1))
+
+    records = {key: aggregates[key] for key in ('team_ids', 'team_names', 'season_of_week')}
+    for key, values in weekly.items():
+        totals = np.cumsum(values, axis=1)
+        # Subtract the running total carried over from previous seasons
+        carried = np.zeros_like(totals)
+        for start in season_starts[1:]:
+            carried[:, start:] = totals[:, start - 1:start]
+        records[key] = totals - carried
+    return records
+
+def fit_exponent_to_totals(points_for, points_against, wins, games, exponents=DEFAULT_EXPONENTS):
+    """
+    Fit the Pythagorean exponent to team-season totals by evaluating the whole exponent grid in
+    vectorized chunks and refining the best grid point with a parabola through its neighbours.
+
+    The exponent minimizing the squared error between expected and actual wins is chosen.
+
+    Parameters:
+    - points_for, points_against, wins, games: 1-D arrays with one entry per team-season.
+      Entries without games are ignored.
+    - exponents: 1-D array of exponents to evaluate.
+
+    Returns:
+    - The fitted exponent (FALLBACK_EXPONENT if there are no games).
+    """
+    observed = np.asarray(games) > 0
+    if not observed.any():
+        return FALLBACK_EXPONENT
+    points_for, points_against, wins, games = (
+        np.asarray(values, dtype=float)[observed] for values in (points_for, points_against, wins, games)
+    )
+
+    errors = np.zeros(len(exponents))
+    for start in range(0, len(games), FIT_CHUNK_SIZE):
+        chunk = slice(start, start + FIT_CHUNK_SIZE)
+        percentages = expected_win_percentages(points_for[chunk], points_against[chunk], exponents)
+        errors += ((percentages * games[chunk] - wins[chunk]) ** 2).sum(axis=1)
+
+    best = int(np.argmin(errors))
+    if 0 < best < len(exponents) - 1:
+        left, middle, right = errors[best - 1:best + 2]
+        curvature = left - 2 * middle + right
+        if curvature > 0:
+            step = exponents[best + 1] - exponents[best]
+            return float(exponents[best] + 0.5 * step * (left - right) / curvature)
+    return float(exponents[best])
+
+def shrink_exponent(exponent, num_games, prior=FALLBACK_EXPONENT, exponents=DEFAULT_EXPONENTS):
+    """
+    Shrink a fitted exponent toward a prior exponent, by how many completed games it was fitted on.
+
+    A fit on few games swings wildly, and a fit that lands on the edge of the exponent grid means
+    the data does not pin the exponent down at all, so that case returns the prior.
+
+    Parameters:
+    - exponent: The fitted exponent.
+    - num_games: Completed team-games the fit used.
+    - prior: Optional. The exponent to shrink toward.
+    - exponents: Optional. The exponent grid the fit searched.
+
+    Returns:
+    - The shrunk exponent.
+    """
+    if num_games <= 0 or exponent <= exponents[0] or exponent >= exponents[-1]:
+        return float(prior)
+    weight = num_games / (num_games + PRIOR_GAMES)
+    return float(weight * exponent + (1 - weight) * prior)
+
+def season_totals(seasons):
+    """
+    Points for/against, wins and games of every team-season over the completed weeks.
+
+    Parameters:
+    - seasons: A league_data dictionary or a list of them.
+
+    Returns:
+    - Dictionary of 1-D arrays 'team_ids', 'points_for', 'points_against', 'wins' and 'games', one
+      entry per team per season (teams without games in a season have 0 games).
+    """
+    records = cumulative_records(seasons)
+    season_of_week = records['season_of_week']
+    if season_of_week.size == 0:
+        totals = {key: np.empty(0) for key in ('points_for', 'points_against', 'wins', 'games')}
+        totals['team_ids'] = np.empty(0, dtype=np.int64)
+        return totals
+
+    # Last completed week of every season holds that season's totals
+    season_ends = np.append(np.flatnonzero(np.diff(season_of_week)), season_of_week.size - 1)
+    totals = {key: records[key][:, season_ends].ravel() for key in ('points_for', 'points_against', 'wins', 'games')}
+    totals['team_ids'] = np.repeat(records['team_ids'], len(season_ends))
+    return totals
+
+def fit_pythagorean_exponent(seasons, exponents=DEFAULT_EXPONENTS):
+    """
+    Fit the league-optimal Pythagorean exponent. Each team-season contributes its season-to-date
+    totals (the full season for historical data).
+
+    Parameters:
+    - seasons: A league_data dictionary or a list of them (e.g. several seasons of one league).
+    - exponents: 1-D array of exponents to evaluate.
+
+    Returns:
+    - The fitted exponent, without any shrinkage (see get_fitted_exponent).
+    """
+    totals = season_totals(seasons)
+    return fit_exponent_to_totals(totals['points_for'], totals['points_against'], totals['wins'], totals['games'], exponents)
+
+def get_fitted_exponent(league_data, history=None, prior=FALLBACK_EXPONENT):
+    """
+    Return the league's Pythagorean exponent: fitted on the league's previous and current seasons
+    and shrunk toward a prior (e.g. the exponent fitted over every league analyzed so far), so that
+    early in a season, with few completed games, it stays close to the prior. Fitted only once per
+    league and season (and number of completed weeks, since the fit changes as the season progresses).
+
+    Parameters:
+    - league_data: The dictionary with data on teams and matchups.
+    - history: Optional. List of previous seasons' league_data to fit on as well.
+    - prior: Optional. The exponent to shrink toward (default: FALLBACK_EXPONENT).
+
+    Returns:
+    - The exponent.
+    """
+    aggregates = get_weekly_aggregates(league_data)
+    prior = round(float(prior), 4)
+    if league_data.get('league_id') is not None:
+        cache_key = (league_data['league_id'], league_data.get('year'), aggregates['num_completed_weeks'], len(history or []), prior)
+    else:
+        cache_key = (aggregates['version'], len(history or []), prior)
+
+    with _exponent_cache_lock:
+        if cache_key in _exponent_cache:
+            _exponent_cache.move_to_end(cache_key)
+            return _exponent_cache[cache_key]
+
+    totals = season_totals(list(history or []) + [league_data])
+    fitted = fit_exponent_to_totals(totals['points_for'], totals['points_against'], totals['wins'], totals['games'])
+    exponent = shrink_exponent(fitted, totals['games'].sum(), prior)
+
+    with _exponent_cache_lock:
+        _exponent_cache[cache_key] = exponent
+        _exponent_cache.move_to_end(cache_key)
+        while len(_exponent_cache) > EXPONENT_CACHE_SIZE:
+            _exponent_cache.popitem(last=False)
+    return exponent
+
+def rolling_expected_wins(league_data, p=2):
+    """
+    Week-by-week Pythagorean expected wins for every team, from cumulative points for/against.
+    Like calculate_pythagorean_expectation_luck, each week's expected wins are scaled so they add
+    up to the actual wins handed out so far, so the last week matches the season table.
+
+    Parameters:
+    - league_data: The dictionary with data on teams and matchups.
+    - p: The exponent for the Pythagorean formula.
+
+    Returns:
+    - Pandas DataFrame with one row per team per completed week: Week, Team Name, Team ID,
+      Actual Wins, Expected Wins and Luck Index (actual - expected), all season-to-date.
+    """
+    records = cumulative_records(league_data)
+    expected_wins = expected_win_percentages(records['points_for'], records['points_against'], [p])[0] * records['games']
+    total_expected = expected_wins.sum(axis=0)
+    scaling_factors = np.divide(records['wins'].sum(axis=0), total_expected,
+                                out=np.ones_like(total_expected), where=total_expected > 0)
+    expected_wins = expected_wins * scaling_factors
+
+    num_teams, num_weeks = expected_wins.shape
+    team_rows = np.repeat(np.arange(num_teams), num_weeks)
+    team_names = np.array(records['team_names'], dtype=object)
+
+    return pd.DataFrame({
+        "Week": np.tile(np.arange(1, num_weeks + 1), num_teams),
+        "Team Name": team_names[team_rows],
+        "Team ID": records['team_ids'][team_rows],
+        "Actual Wins": records['wins'].ravel(),
+        "Expected Wins": np.round(expected_wins.ravel(), 2),
+        "Luck Index": np.round((records['wins'] - expected_wins).ravel(), 2),
+    })
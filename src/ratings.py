@@ -0,0 +1,217 @@
+import numpy as np
+
+from analysis import normal_cdf
+from precompute import stack_weekly_aggregates
+
+# Every team is treated as having also played this many games against an average team with a
+# margin of 0. This keeps the system solvable before every team is connected through common
+# opponents (e.g. after week 1) and shrinks ratings built on very few games toward 0.
+PRIOR_GAMES = 1.0
+
+def solve_ratings(laplacians, margin_sums, prior_games=PRIOR_GAMES):
+    """
+    Solve the least-squares rating systems (L + prior_games * I) r = b of one or many leagues at once.
+
+    The least-squares fit of margin = rating(team) - rating(opponent) over all games has the
+    schedule's graph Laplacian L as its normal matrix (games played on the diagonal, minus the
+    number of meetings off the diagonal) and each team's total margin as b.
+
+    Parameters:
+    - laplacians: (teams x teams) or (leagues x teams x teams) array.
+    - margin_sums: (teams,) or (leagues x teams) array.
+    - prior_games: Regularization, see PRIOR_GAMES.
+
+    Returns:
+    - Ratings with the shape of margin_sums. Ratings sum to 0 within every league.
+    """
+    laplacians = np.asarray(laplacians, dtype=float)
+    identity = np.eye(laplacians.shape[-1])
+    return np.linalg.solve(laplacians + prior_games * identity, np.asarray(margin_sums, dtype=float)[..., None])[..., 0]
+
+class TeamRatings:
+    """
+    Opponent-adjusted team ratings fitted over score margins, refit incrementally as weeks arrive.
+
+    Only the normal equations (the schedule Laplacian and each team's total margin) and the list of
+    games are kept; adding a week updates them in place and the (teams x teams) solve is redone on
+    request, which takes microseconds for a league-sized system.
+    """
+
+    def __init__(self, team_ids, team_names, prior_games=PRIOR_GAMES):
+        """
+        Parameters:
+        - team_ids, team_names: Teams in row order.
+        - prior_games: Regularization, see PRIOR_GAMES.
+        """
+        self.team_ids = np.asarray(team_ids)
+        self.team_names = list(team_names)
+        self.team_index = {int(team_id): index for index, team_id in enumerate(self.team_ids)}
+        self.prior_games = prior_games
+
+        num_teams = len(self.team_ids)
+        self.laplacian = np.zeros((num_teams, num_teams))
+        self.margin_sums = np.zeros(num_teams)
+        self.rows = np.empty(0, dtype=np.int64)
+        self.opponent_rows = np.empty(0, dtype=np.int64)
+        self.margins = np.empty(0)
+
+    @classmethod
+    def from_aggregates(cls, aggregates, num_weeks=None, prior_games=PRIOR_GAMES):
+        """
+        Fit ratings on the completed games of weekly aggregates (single season, stacked or edited).
+
+        Parameters:
+        - aggregates: Weekly aggregates with 'team_ids', 'team_names', 'scores', 'opponents' and 'opponent_scores'.
+        - num_weeks: Optional. Only use the first num_weeks week columns (default: all of them).
+        """
+        ratings = cls(aggregates['team_ids'], aggregates['team_names'], prior_games)
+
+        weeks = slice(None, num_weeks)
+        opponents = aggregates['opponents'][:, weeks]
+        margins = aggregates['scores'][:, weeks] - aggregates['opponent_scores'][:, weeks]
+
+        # Every game appears in both teams' rows; keep it once, from the lower row's side
+        rows = np.broadcast_to(np.arange(len(opponents))[:, None], opponents.shape)
+        once = (opponents > rows) & ~np.isnan(margins)
+        ratings.add_games(rows[once], opponents[once], margins[once])
+        return ratings
+
+    @classmethod
+    def from_league(cls, seasons, prior_games=PRIOR_GAMES):
+        """
+        Fit ratings on every completed game of one or more seasons of a league.
+
+        Parameters:
+        - seasons: A league_data dictionary or a list of them.
+        """
+        return cls.from_aggregates(stack_weekly_aggregates(seasons), prior_games=prior_games)
+
+    def add_games(self, rows, opponent_rows, margins):
+        """
+        Add games to the fit.
+
+        Parameters:
+        - rows, opponent_rows: Row indexes of the two teams of every game.
+        - margins: Score of rows minus score of opponent_rows, per game.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        opponent_rows = np.asarray(opponent_rows, dtype=np.int64)
+        margins = np.asarray(margins, dtype=float)
+
+        num_teams = len(self.team_ids)
+        games = np.bincount(rows, minlength=num_teams) + np.bincount(opponent_rows, minlength=num_teams)
+        self.laplacian[np.diag_indices(num_teams)] += games
+        np.subtract.at(self.laplacian, (rows, opponent_rows), 1)
+        np.subtract.at(self.laplacian, (opponent_rows, rows), 1)
+        self.margin_sums += np.bincount(rows, weights=margins, minlength=num_teams)
+        self.margin_sums -= np.bincount(opponent_rows, weights=margins, minlength=num_teams)
+
+        self.rows = np.concatenate([self.rows, rows])
+        self.opponent_rows = np.concatenate([self.opponent_rows, opponent_rows])
+        self.margins = np.concatenate([self.margins, margins])
+
+    def add_week(self, box_scores):
+        """
+        Add one week of games, as stored in league_data['box_scores'][week].
+        Matchups involving unknown teams are skipped.
+        """
+        games = [
+            (self.team_index[box_score['home_team_id']], self.team_index[box_score['away_team_id']],
+             box_score['home_score'] - box_score['away_score'])
+            for box_score in box_scores or []
+            if box_score['home_team_id'] in self.team_index and box_score['away_team_id'] in self.team_index
+        ]
+        if games:
+            self.add_games(*zip(*games))
+
+    def ratings(self):
+        """
+        Points per game each team is better than an average team, adjusted for opponents.
+        """
+        return solve_ratings(self.laplacian, self.margin_sums, self.prior_games)
+
+    def records(self):
+        """
+        Ratings, schedule strength and residual luck of every team with at least one game.
+
+        Schedule Strength is the average rating of the opponents a team faced. Expected Wins sum each
+        game's win probability Φ((rating - opponent rating) / σ), with σ the spread of the margins
+        the ratings do not explain, so the Luck Index is the luck left after adjusting for the quality
+        of both teams in every game.
+
+        Returns:
+        - List of dictionaries with Team Name, Team ID, Rating, Schedule Strength, Actual Wins,
+          Expected Wins, and Luck Index.
+        """
+        if len(self.margins) == 0:
+            return []
+        return _rating_records(self.ratings(), self.team_ids, self.team_names, self.rows, self.opponent_rows, self.margins)
+
+def _rating_records(ratings, team_ids, team_names, rows, opponent_rows, margins):
+    num_teams = len(team_ids)
+    predicted = ratings[rows] - ratings[opponent_rows]
+    sigma = max(float(np.sqrt(np.mean((margins - predicted) ** 2))), 1e-9)
+    win_probabilities = normal_cdf(predicted / sigma)
+
+    # Each game counts for both teams, from opposite sides
+    both_rows = np.concatenate([rows, opponent_rows])
+    both_opponents = np.concatenate([opponent_rows, rows])
+    games = np.bincount(both_rows, minlength=num_teams)
+    opponent_ratings = np.bincount(both_rows, weights=ratings[both_opponents], minlength=num_teams)
+    actual_wins = np.bincount(both_rows, weights=np.concatenate([margins > 0, margins < 0]), minlength=num_teams)
+    expected_wins = np.bincount(both_rows, weights=np.concatenate([win_probabilities, 1 - win_probabilities]), minlength=num_teams)
+
+    team_rating_data = []
+    for index in np.flatnonzero(games):
+        team_rating_data.append({
+            "Team Name": team_names[index],
+            "Team ID": int(team_ids[index]),
+            "Rating": round(float(ratings[index]), 2),
+            "Schedule Strength": round(float(opponent_ratings[index] / games[index]), 2),
+            "Actual Wins": int(actual_wins[index]),
+            "Expected Wins": round(float(expected_wins[index]), 2),
+            "Luck Index": round(float(actual_wins[index] - expected_wins[index]), 2)
+        })
+    return team_rating_data
+
+def calculate_team_ratings(seasons, prior_games=PRIOR_GAMES):
+    """
+    Calculate opponent-adjusted ratings, schedule strength and residual luck for a league.
+
+    Parameters:
+    - seasons: A league_data dictionary or a list of them (e.g. a league's full history).
+
+    Returns:
+    - List of dictionaries as returned by TeamRatings.records.
+    """
+    return TeamRatings.from_league(seasons, prior_games).records()
+
+def calculate_team_ratings_batch(leagues, prior_games=PRIOR_GAMES):
+    """
+    Fit many leagues at once with a single batched solve.
+
+    Parameters:
+    - leagues: List of leagues, each a league_data dictionary or a list of its seasons.
+
+    Returns:
+    - List with one TeamRatings.records()-style list per league.
+    """
+    fits = [TeamRatings.from_league(seasons, prior_games) for seasons in leagues]
+    if not fits:
+        return []
+
+    # Pad every system to the largest league; padded teams have no games and solve to 0
+    size = max(len(fit.team_ids) for fit in fits)
+    laplacians = np.zeros((len(fits), size, size))
+    margin_sums = np.zeros((len(fits), size))
+    for index, fit in enumerate(fits):
+        num_teams = len(fit.team_ids)
+        laplacians[index, :num_teams, :num_teams] = fit.laplacian
+        margin_sums[index, :num_teams] = fit.margin_sums
+    all_ratings = solve_ratings(laplacians, margin_sums, prior_games)
+
+    return [
+        _rating_records(all_ratings[index, :len(fit.team_ids)], fit.team_ids, fit.team_names, fit.rows, fit.opponent_rows, fit.margins)
+        if len(fit.margins) else []
+        for index, fit in enumerate(fits)
+    ]
@@ -0,0 +1,211 @@
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from precompute import get_weekly_aggregates
+
+# Playoff spots assumed when league_data does not carry the league's setting
+DEFAULT_PLAYOFF_TEAMS = 4
+
+# Seasons simulated per vectorized batch (bounds memory and is the unit of parallel work)
+CHUNK_SIZE = 10_000
+
+# Weight of a week's ESPN projection vs. the team's observed scoring mean
+PROJECTION_WEIGHT = 0.5
+
+# Pseudo-weeks of league-wide spread blended into each team's observed spread
+PRIOR_WEEKS = 3
+
+def build_season_model(league_data):
+    """
+    Fit per-team weekly score distributions and collect the remaining regular-season schedule.
+
+    Each team's score in a remaining week is modeled as a normal distribution. Its mean blends the
+    team's observed scoring mean with that week's projection (when ESPN has one), and its spread is
+    the team's observed spread shrunk toward the league-wide spread.
+
+    Parameters:
+    - league_data: The dictionary with data on teams and matchups.
+
+    Returns:
+    - Dictionary of numpy arrays describing the current standings, the fitted distributions
+      and the remaining schedule. Picklable, so it can be shipped to worker processes.
+    """
+    aggregates = get_weekly_aggregates(league_data)
+    team_index = aggregates['team_index']
+    num_teams = len(aggregates['team_ids'])
+    num_completed = aggregates['num_completed_weeks']
+
+    scores = aggregates['scores'][:, :num_completed]
+    played = aggregates['played'][:, :num_completed]
+
+    # Standings so far, plus the standings the teams "deserved" based on their all-play records
+    current_wins = aggregates['wins'][:, :num_completed].sum(axis=1).astype(float)
+    expected_wins = aggregates['all_play_wins'][:, :num_completed].sum(axis=1)
+    current_points = np.where(played, scores, 0.0).sum(axis=1)
+
+    # Remaining regular-season matchups (home index, away index, remaining week column, projections)
+    remaining_weeks = list(range(num_completed + 1, league_data['regular_season_count'] + 1))
+    home_rows, away_rows, week_columns, home_projected, away_projected = [], [], [], [], []
+    for column, week in enumerate(remaining_weeks):
+        for box_score in league_data['box_scores'].get(week) or []:
+            home_index = team_index.get(box_score['home_team_id'])
+            away_index = team_index.get(box_score['away_team_id'])
+            if home_index is None or away_index is None:
+                continue
+            home_rows.append(home_index)
+            away_rows.append(away_index)
+            week_columns.append(column)
+            home_projected.append(box_score['home_projected'] or 0.0)
+            away_projected.append(box_score['away_projected'] or 0.0)
+
+    # Observed scoring distribution, falling back to projections before any week is complete
+    games_played = played.sum(axis=1)
+    observed_scores = scores[played]
+    if observed_scores.size > 1:
+        league_mean = observed_scores.mean()
+        league_std = observed_scores.std()
+    else:
+        known_projections = [p for p in home_projected + away_projected if p > 0]
+        league_mean = float(np.mean(known_projections)) if known_projections else 100.0
+        league_std = 0.25 * league_mean
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        team_mean = np.where(games_played > 0, current_points / np.maximum(games_played, 1), league_mean)
+        squared_deviation = np.where(played, (scores - team_mean[:, None]) ** 2, 0.0).sum(axis=1)
+    team_std = np.sqrt((squared_deviation + PRIOR_WEEKS * league_std ** 2) / (games_played + PRIOR_WEEKS))
+
+    # Per team, per remaining week scoring mean; weeks with a projection lean on it
+    weekly_mean = np.repeat(team_mean[:, None], len(remaining_weeks), axis=1)
+    plays = np.zeros((num_teams, len(remaining_weeks)), dtype=bool)
+    for rows, projections in ((home_rows, home_projected), (away_rows, away_projected)):
+        rows = np.asarray(rows, dtype=np.int64)
+        projections = np.asarray(projections, dtype=float)
+        columns = np.asarray(week_columns, dtype=np.int64)
+        has_projection = projections > 0
+        weekly_mean[rows[has_projection], columns[has_projection]] = (
+            PROJECTION_WEIGHT * projections[has_projection]
+            + (1 - PROJECTION_WEIGHT) * team_mean[rows[has_projection]]
+        )
+        plays[rows, columns] = True
+
+    return {
+        'current_wins': current_wins,
+        'expected_wins': expected_wins,
+        'current_points': current_points,
+        'weekly_mean': weekly_mean,
+        'team_std': team_std,
+        'plays': plays,
+        'home_rows': np.asarray(home_rows, dtype=np.int64),
+        'away_rows': np.asarray(away_rows, dtype=np.int64),
+        'week_columns': np.asarray(week_columns, dtype=np.int64),
+    }
+
+def _seed_counts(wins, points, num_teams):
+    """
+    Count how often each team finishes at each seed. Ties on wins are broken by points for.
+    """
+    # Points for never reach 1e6, so it only matters when wins are equal
+    order = np.argsort(-(wins * 1e6 + points), axis=1, kind='stable')
+    seeds = np.empty_like(order)
+    np.put_along_axis(seeds, order, np.arange(num_teams)[None, :], axis=1)
+    team_rows = np.broadcast_to(np.arange(num_teams), seeds.shape)
+    return np.bincount((team_rows * num_teams + seeds).ravel(), minlength=num_teams * num_teams).reshape(num_teams, num_teams)
+
+def _simulate_chunk(model, num_seasons, seed_sequence):
+    """
+    Simulate num_seasons remaining regular seasons in one vectorized batch.
+
+    Returns:
+    - (seed_counts, adjusted_seed_counts): (teams x seeds) counts starting from the actual
+      standings and from the all-play expected standings respectively.
+    """
+    rng = np.random.default_rng(seed_sequence)
+    num_teams = len(model['current_wins'])
+
+    # Simulated scores: (seasons, teams, remaining weeks)
+    simulated_scores = rng.normal(
+        model['weekly_mean'][None, :, :],
+        model['team_std'][None, :, None],
+        size=(num_seasons,) + model['weekly_mean'].shape
+    )
+
+    home_scores = simulated_scores[:, model['home_rows'], model['week_columns']]
+    away_scores = simulated_scores[:, model['away_rows'], model['week_columns']]
+    home_wins = (home_scores > away_scores).astype(float)
+
+    # Scatter matchup results onto teams with a (matchups x teams) incidence matrix
+    num_matchups = len(model['home_rows'])
+    home_incidence = np.zeros((num_matchups, num_teams))
+    home_incidence[np.arange(num_matchups), model['home_rows']] = 1.0
+    away_incidence = np.zeros((num_matchups, num_teams))
+    away_incidence[np.arange(num_matchups), model['away_rows']] = 1.0
+    new_wins = home_wins @ home_incidence + (1.0 - home_wins) @ away_incidence
+
+    new_points = np.where(model['plays'][None, :, :], simulated_scores, 0.0).sum(axis=2)
+    points = model['current_points'][None, :] + new_points
+
+    seed_counts = _seed_counts(model['current_wins'][None, :] + new_wins, points, num_teams)
+    adjusted_seed_counts = _seed_counts(model['expected_wins'][None, :] + new_wins, points, num_teams)
+    return seed_counts, adjusted_seed_counts
+
+def simulate_playoff_odds(league_data, num_simulations=100_000, seed=None, processes=None, playoff_teams=None):
+    """
+    Monte Carlo simulation of the rest of the regular season.
+
+    Every remaining matchup is played out from each team's fitted score distribution
+    (see build_season_model). Luck-adjusted odds replay the same simulated seasons, but start
+    every team from its all-play expected wins instead of its actual wins, i.e. as if past
+    results had matched how well each team actually scored.
+
+    Parameters:
+    - league_data: The dictionary with data on teams and matchups.
+    - num_simulations: Number of seasons to simulate.
+    - seed: Optional. Seed for the random generator; results are reproducible for a given seed
+      regardless of the number of processes.
+    - processes: Optional. Number of worker processes; None simulates in this process.
+    - playoff_teams: Optional. Number of playoff spots (defaults to the league's setting).
+
+    Returns:
+    - Pandas DataFrame with Team Name, Team ID, Current Wins, Expected Wins, Playoff Odds,
+      Luck-Adjusted Playoff Odds, Playoff Luck and the probability of each final seed (Seed 1..N).
+    """
+    model = build_season_model(league_data)
+    num_teams = len(model['current_wins'])
+    if playoff_teams is None:
+        playoff_teams = league_data.get('playoff_team_count', DEFAULT_PLAYOFF_TEAMS)
+
+    # Independent, reproducible streams per chunk so the result does not depend on scheduling
+    num_chunks = max(math.ceil(num_simulations / CHUNK_SIZE), 1)
+    chunk_sizes = [CHUNK_SIZE] * (num_chunks - 1) + [num_simulations - CHUNK_SIZE * (num_chunks - 1)]
+    chunk_seeds = np.random.SeedSequence(seed).spawn(num_chunks)
+
+    if processes:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            chunk_results = list(executor.map(_simulate_chunk, [model] * num_chunks, chunk_sizes, chunk_seeds))
+    else:
+        chunk_results = [_simulate_chunk(model, size, chunk_seed) for size, chunk_seed in zip(chunk_sizes, chunk_seeds)]
+
+    seed_counts = sum(result[0] for result in chunk_results)
+    adjusted_seed_counts = sum(result[1] for result in chunk_results)
+
+    seed_probabilities = seed_counts / num_simulations
+    playoff_odds = seed_probabilities[:, :playoff_teams].sum(axis=1)
+    adjusted_playoff_odds = (adjusted_seed_counts[:, :playoff_teams] / num_simulations).sum(axis=1)
+
+    aggregates = get_weekly_aggregates(league_data)
+    df = pd.DataFrame({
+        "Team Name": aggregates['team_names'],
+        "Team ID": aggregates['team_ids'],
+        "Current Wins": model['current_wins'].astype(int),
+        "Expected Wins": np.round(model['expected_wins'], 2),
+        "Playoff Odds": playoff_odds,
+        "Luck-Adjusted Playoff Odds": adjusted_playoff_odds,
+        "Playoff Luck": playoff_odds - adjusted_playoff_odds,
+    })
+    for seed_number in range(num_teams):
+        df[f"Seed {seed_number + 1}"] = seed_probabilities[:, seed_number]
+
+    return df.sort_values("Playoff Odds", ascending=False).reset_index(drop=True)
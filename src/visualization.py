@@ -1,10 +1,15 @@
-from matplotlib import cm
+import threading
+
 import pandas as pd
-import matplotlib.pyplot as plt
-import plotly.graph_objects as go
 
+# matplotlib and plotly are imported inside the chart builders that use them, so
+# selecting one metric does not pay the import cost of the other plotting library.
 from analysis import calculate_scheduling_luck
 
+# Metric results (and their matplotlib figures) are cached per league and shared by every
+# session that loaded the league. A figure cannot be drawn by two threads at once.
+FIGURE_RENDER_LOCK = threading.Lock()
+
 def save_luck_indices_to_file_v3(league_data, luck_indices, output_file=None):
     """
     Save the luck indices of all teams to a file using the luck indices
@@ -47,28 +52,47 @@ def generate_opponent_underperformance_chart(luck_indices_df, output_file=None):
     and negative values indicating bad luck.
 
     Parameters:
-    - luck_indices_df (pd.DataFrame): DataFrame containing team names and luck indices.
+    - luck_indices_df (pd.DataFrame): DataFrame containing team names and luck indices, and
+      optionally "CI Lower"/"CI Upper" and "CI Minus"/"CI Plus" columns (as added by
+      attach_confidence_intervals) to draw as error bars.
     - output_file (str): Optional. Filepath to save the plot.
+
+    Returns:
+    - fig: A Matplotlib figure object.
     """
-    
+    # Build the figure without pyplot's global state so charts can be rendered off the main thread
+    from matplotlib.figure import Figure
+
     # Sort data by Luck Index
     luck_indices_df = luck_indices_df.sort_values("Luck Index")
 
+    # Confidence intervals, if present, are drawn as error bars
+    has_intervals = all(column in luck_indices_df for column in ("CI Lower", "CI Upper", "CI Minus", "CI Plus"))
+    yerr = None
+    if has_intervals:
+        yerr = [luck_indices_df["CI Minus"], luck_indices_df["CI Plus"]]
+
     # Create a bar chart
-    plt.figure(figsize=(12, 6))
-    bars = plt.bar(
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    bars = ax.bar(
         luck_indices_df["Team Name"], 
         luck_indices_df["Luck Index"], 
-        color=["green" if x > 0 else "red" for x in luck_indices_df["Luck Index"]]
+        color=["green" if x > 0 else "red" for x in luck_indices_df["Luck Index"]],
+        yerr=yerr,
+        capsize=4
     )
-    plt.axhline(0, color='black', linewidth=0.8, linestyle='--')  # Line at Luck Index = 0
+    ax.axhline(0, color='black', linewidth=0.8, linestyle='--')  # Line at Luck Index = 0
 
-    # Annotate bars with luck index values
-    for bar in bars:
+    # Annotate bars with luck index values, past the end of the error bar if there is one
+    label_ends = luck_indices_df["Luck Index"]
+    if has_intervals:
+        label_ends = luck_indices_df["CI Upper"].where(luck_indices_df["Luck Index"] > 0, luck_indices_df["CI Lower"])
+    for bar, label_end in zip(bars, label_ends):
         yval = bar.get_height()
-        plt.text(
+        ax.text(
             bar.get_x() + bar.get_width() / 2,
-            yval + (1 if yval > 0 else -1),  # Offset above or below the bar
+            label_end + (1 if yval > 0 else -1),  # Offset above or below the bar
             round(yval, 2),
             ha='center',
             va='bottom' if yval > 0 else 'top',
@@ -76,20 +100,22 @@ def generate_opponent_underperformance_chart(luck_indices_df, output_file=None):
         )
 
     # Add titles and labels
-    plt.title("Opponent Underperformance: Luck Index by Team", fontsize=16)
-    plt.xlabel("Team Name", fontsize=12)
-    plt.ylabel("Luck Index", fontsize=12)
-    plt.xticks(rotation=45, ha="right")  # Rotate team names for readability
-    plt.tight_layout()
+    ax.set_title("Opponent Underperformance: Luck Index by Team", fontsize=16)
+    ax.set_xlabel("Team Name", fontsize=12)
+    ax.set_ylabel("Luck Index", fontsize=12)
+    for label in ax.get_xticklabels():  # Rotate team names for readability
+        label.set_rotation(45)
+        label.set_horizontalalignment("right")
+    fig.tight_layout()
 
     # Save to file if specified
     if output_file:
-        plt.savefig(output_file, dpi=300)
+        fig.savefig(output_file, dpi=300)
         print(f"Chart saved to {output_file}")
 
-    return plt
+    return fig
 
-def create_scheduling_luck_dataframe(league_data):
+def create_scheduling_luck_dataframe(league_data, hypothetical_records=None):
     """
     Generate a DataFrame showing each team's hypothetical record if they had every 
     other team's schedule, based on simulated matchup results.
@@ -99,13 +125,15 @@ def create_scheduling_luck_dataframe(league_data):
             - 'teams' (list): Each team is a dict with:
                 - 'id' (int): Unique team identifier.
                 - 'name' (str): Team name.
+        hypothetical_records (dict): Optional. Precomputed output of calculate_scheduling_luck.
 
     Returns:
         pandas.DataFrame: A square DataFrame where both rows and columns are team names.
         Each cell contains a string like "wins-losses", representing how the row team 
         would have performed with the schedule of the column team.
     """
-    hypothetical_records = calculate_scheduling_luck(league_data)
+    if hypothetical_records is None:
+        hypothetical_records = calculate_scheduling_luck(league_data)
 
     teams = [team['name'] for team in league_data['teams']]
     df = pd.DataFrame(index=teams, columns=teams)
@@ -139,6 +167,8 @@ def create_scatterplot_luck_figure(df, selected_team=None):
     Returns:
     - fig: A Plotly figure object ready for Streamlit.
     """
+    import plotly.graph_objects as go
+
     # Add color column for visualization
     df["Color"] = df["Result"].apply(lambda x: "blue" if x == "Win" else "red")
     
@@ -271,27 +301,42 @@ def create_scatterplot_luck_figure(df, selected_team=None):
     
     return fig
 
-def plot_pythagorean_expectation_luck(pythagorean_luck_data):
+def plot_pythagorean_expectation_luck(pythagorean_luck_data, title='Pythagorean Expectation Luck'):
     """
-    Plot Pythagorean Expectation Luck for all teams.
+    Plot Pythagorean Expectation Luck for all teams. Also used for other expected-wins luck
+    metrics with the same data layout.
 
     Parameters:
-    - pythagorean_luck_data: List of dictionaries with Team Name, Actual Wins, Expected Wins, and Luck Index.
+    - pythagorean_luck_data: List of dictionaries with Team Name, Actual Wins, Expected Wins, and Luck Index,
+      and optionally CI Minus/CI Plus (as added by attach_confidence_intervals) to draw as error bars.
+    - title: Optional. The chart title.
 
     Returns:
     - fig: A Matplotlib figure object.
     """
+    from matplotlib import cm
+    from matplotlib.colors import Normalize
+    from matplotlib.figure import Figure
+
     # Sort teams by luck index (best luck on top)
     pythagorean_luck_data.sort(key=lambda x: x['Luck Index'], reverse=True)
-    fig, ax = plt.subplots()
+    fig = Figure()
+    ax = fig.subplots()
     teams = [team['Team Name'] for team in pythagorean_luck_data]
     luck_index = [team['Luck Index'] for team in pythagorean_luck_data]
 
     # Create a color gradient
-    norm = plt.Normalize(min(luck_index), max(luck_index))
+    norm = Normalize(min(luck_index), max(luck_index))
     colors = cm.RdYlGn(norm(luck_index))
 
-    bars = ax.barh(teams, luck_index, color=colors)
+    xerr = None
+    if all('CI Minus' in team and 'CI Plus' in team for team in pythagorean_luck_data):
+        xerr = [
+            [team['CI Minus'] for team in pythagorean_luck_data],
+            [team['CI Plus'] for team in pythagorean_luck_data]
+        ]
+
+    bars = ax.barh(teams, luck_index, color=colors, xerr=xerr, capsize=3, error_kw={'ecolor': 'gray', 'alpha': 0.7})
 
     # Add labels inside the bars
     for bar, value in zip(bars, luck_index):
@@ -305,7 +350,184 @@ def plot_pythagorean_expectation_luck(pythagorean_luck_data):
         )
 
     ax.set_xlabel('Luck Index (Actual Wins - Expected Wins)')
-    ax.set_title('Pythagorean Expectation Luck')
+    ax.set_title(title)
     ax.invert_yaxis()  # Invert y-axis to have the best luck on top
     
-    return fig
\ No newline at end of file
+    return fig
+
+def plot_rolling_expected_wins(rolling_df):
+    """
+    Plot each team's season-to-date Pythagorean luck (actual - expected wins) week by week.
+
+    Parameters:
+    - rolling_df: DataFrame from pythagorean.rolling_expected_wins.
+
+    Returns:
+    - fig: A Matplotlib figure object.
+    """
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    for team_name, team_df in rolling_df.groupby("Team Name", sort=False):
+        ax.plot(team_df["Week"], team_df["Luck Index"], marker='o', markersize=3, label=team_name)
+
+    ax.axhline(0, color='black', linewidth=0.8, linestyle='--')
+    ax.set_xlabel('Week')
+    ax.set_ylabel('Luck Index (Actual Wins - Expected Wins)')
+    ax.set_title('Pythagorean Luck Over the Season')
+    ax.legend(loc='center left', bbox_to_anchor=(1, 0.5), fontsize=8)
+    fig.tight_layout()
+
+    return fig
+
+def plot_position_luck_heatmap(positions_df, value_column='Opponent Luck'):
+    """
+    Plot a teams x positions heatmap of where each team's luck came from.
+
+    Parameters:
+    - positions_df: The 'positions' DataFrame from player_luck.calculate_player_luck.
+    - value_column: Optional. 'Opponent Luck' or 'Own Luck'.
+
+    Returns:
+    - fig: A Matplotlib figure object.
+    """
+    from matplotlib.colors import TwoSlopeNorm
+    from matplotlib.figure import Figure
+
+    table = positions_df.pivot(index="Team Name", columns="Position", values=value_column)
+    table = table.reindex(positions_df["Team Name"].unique())  # keep the league's team order
+    values = table.to_numpy()
+    limit = max(float(abs(values).max()), 1e-9) if values.size else 1.0
+
+    fig = Figure(figsize=(max(6, 0.9 * len(table.columns) + 3), max(4, 0.45 * len(table.index) + 1.5)))
+    ax = fig.subplots()
+    image = ax.imshow(values, cmap='RdYlGn', norm=TwoSlopeNorm(vcenter=0, vmin=-limit, vmax=limit), aspect='auto')
+
+    ax.set_xticks(range(len(table.columns)), labels=table.columns)
+    ax.set_yticks(range(len(table.index)), labels=table.index)
+    for row in range(values.shape[0]):
+        for column in range(values.shape[1]):
+            ax.text(column, row, f'{values[row, column]:.1f}', ha='center', va='center', fontsize=8)
+
+    fig.colorbar(image, ax=ax, label=f'{value_column} (points)')
+    ax.set_title(f'{value_column} by Position')
+    fig.tight_layout()
+
+    return fig
+
+def plot_margin_histograms(histograms_df, close_margin=None):
+    """
+    Plot every team's margin histogram as one teams x margin bins heatmap.
+
+    Parameters:
+    - histograms_df: DataFrame from close_games.margin_histograms.
+    - close_margin: Optional. Outline the bins within this margin of 0 (the close games).
+
+    Returns:
+    - fig: A Matplotlib figure object.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.patches import Rectangle
+
+    values = histograms_df.to_numpy()
+    fig = Figure(figsize=(max(8, 0.7 * len(histograms_df.columns) + 3), max(4, 0.45 * len(histograms_df.index) + 1.5)))
+    ax = fig.subplots()
+    image = ax.imshow(values, cmap='Blues', aspect='auto', vmin=0)
+
+    ax.set_xticks(range(len(histograms_df.columns)), labels=histograms_df.columns, rotation=45, ha='right')
+    ax.set_yticks(range(len(histograms_df.index)), labels=histograms_df.index)
+    threshold = values.max() / 2 if values.size else 0
+    for row in range(values.shape[0]):
+        for column in range(values.shape[1]):
+            if values[row, column]:
+                ax.text(column, row, str(values[row, column]), ha='center', va='center', fontsize=8,
+                        color='white' if values[row, column] > threshold else 'black')
+
+    if close_margin is not None:
+        # Columns whose range lies within +/- close_margin, e.g. "-10 to 0" and "0 to 10"
+        close_columns = []
+        for column, label in enumerate(histograms_df.columns):
+            bounds = label.split(" to ")
+            if len(bounds) == 2 and -close_margin <= float(bounds[0]) and float(bounds[1]) <= close_margin:
+                close_columns.append(column)
+        if close_columns:
+            ax.add_patch(Rectangle((min(close_columns) - 0.5, -0.5), len(close_columns), values.shape[0],
+                                   fill=False, edgecolor='red', linewidth=2, label='Close games'))
+            ax.legend(loc='upper left', bbox_to_anchor=(1.15, 1), fontsize=8)
+
+    fig.colorbar(image, ax=ax, label='Games')
+    ax.set_xlabel('Margin (points scored - points allowed)')
+    ax.set_title('Game Margins by Team')
+    fig.tight_layout()
+
+    return fig
+
+def plot_playoff_odds(odds_df):
+    """
+    Plot every team's simulated playoff odds next to its luck-adjusted playoff odds.
+
+    Parameters:
+    - odds_df: DataFrame with Team Name, Playoff Odds and Luck-Adjusted Playoff Odds (in percent).
+
+    Returns:
+    - fig: A Matplotlib figure object.
+    """
+    import numpy as np
+    from matplotlib.figure import Figure
+
+    odds_df = odds_df.sort_values("Playoff Odds")
+    rows = np.arange(len(odds_df))
+    height = 0.4
+
+    fig = Figure(figsize=(10, max(4, 0.5 * len(odds_df) + 1.5)))
+    ax = fig.subplots()
+    ax.barh(rows + height / 2, odds_df["Playoff Odds"], height, color='steelblue', label='Playoff odds')
+    ax.barh(rows - height / 2, odds_df["Luck-Adjusted Playoff Odds"], height, color='lightgray',
+            label='Luck-adjusted (from expected wins)')
+
+    ax.set_yticks(rows, labels=odds_df["Team Name"])
+    ax.set_xlim(0, 100)
+    ax.set_xlabel('Chance to make the playoffs (%)')
+    ax.set_title('Playoff Odds')
+    ax.legend(loc='lower right', fontsize=8)
+    fig.tight_layout()
+
+    return fig
+
+def plot_seed_distribution(seeds_df, playoff_teams=None):
+    """
+    Plot every team's chance of each final seed as one teams x seeds heatmap.
+
+    Parameters:
+    - seeds_df: DataFrame indexed by Team Name with one column per seed ("Seed 1", ...), in percent.
+    - playoff_teams: Optional. Draw a line after the last playoff seed.
+
+    Returns:
+    - fig: A Matplotlib figure object.
+    """
+    from matplotlib.figure import Figure
+
+    values = seeds_df.to_numpy()
+    fig = Figure(figsize=(max(8, 0.7 * len(seeds_df.columns) + 3), max(4, 0.45 * len(seeds_df.index) + 1.5)))
+    ax = fig.subplots()
+    image = ax.imshow(values, cmap='Blues', aspect='auto', vmin=0, vmax=100)
+
+    ax.set_xticks(range(len(seeds_df.columns)), labels=[column.replace("Seed ", "") for column in seeds_df.columns])
+    ax.set_yticks(range(len(seeds_df.index)), labels=seeds_df.index)
+    for row in range(values.shape[0]):
+        for column in range(values.shape[1]):
+            if values[row, column] >= 0.5:
+                ax.text(column, row, f'{values[row, column]:.0f}', ha='center', va='center', fontsize=8,
+                        color='white' if values[row, column] > 50 else 'black')
+
+    if playoff_teams:
+        ax.axvline(playoff_teams - 0.5, color='red', linewidth=2, label='Playoff cutoff')
+        ax.legend(loc='upper left', bbox_to_anchor=(1.15, 1), fontsize=8)
+
+    fig.colorbar(image, ax=ax, label='Chance (%)')
+    ax.set_xlabel('Final regular-season seed')
+    ax.set_title('Seed Distribution')
+    fig.tight_layout()
+
+    return fig
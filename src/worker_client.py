@@ -0,0 +1,143 @@
+import base64
+import json
+import os
+import threading
+import zlib
+from io import StringIO
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+# Comma-separated worker service URLs; when unset, metrics are computed in-process
+WORKER_URL_ENV = "ANALYSIS_WORKER_URL"
+
+# Seconds to wait on the worker service (covers a full ESPN fetch)
+REQUEST_TIMEOUT_SECONDS = 300
+
+_local_worker = None
+_local_worker_lock = threading.Lock()
+
+class WorkerError(Exception):
+    pass
+
+def restore_league_data(league_data):
+    """
+    Undo JSON's conversion of the integer week keys of league_data['box_scores'] to strings.
+    """
+    league_data["box_scores"] = {int(week): box_scores for week, box_scores in league_data["box_scores"].items()}
+    return league_data
+
+def decode_value(value):
+    """
+    Rebuild a metric result encoded by worker_service.encode_value. Matplotlib figures come back
+    as PNG bytes, which the app renders as images.
+    """
+    if isinstance(value, list):
+        return [decode_value(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    value_type = value.get("__type__")
+    if value_type == "dataframe":
+        import pandas as pd
+        return pd.read_json(StringIO(value["data"]), orient="split")
+    if value_type == "png":
+        return base64.b64decode(value["data"])
+    if value_type == "plotly":
+        import plotly.io as pio
+        return pio.from_json(value["data"])
+    return {key: decode_value(item) for key, item in value.items()}
+
+class LocalWorker:
+    """
+    In-process worker for single-user deployments: fetching and metrics run in this process.
+    """
+
+    def __init__(self, store=None):
+        from worker_service import LeagueStore
+        self.store = store or LeagueStore()
+
+    def load_league(self, league_id, year, swid, espn_s2, include_players=False):
+        return self.store.load(league_id, year, swid, espn_s2, include_players)
+
+    def get_metric(self, league_key, metric):
+        return self.store.get_metric(league_key, metric)
+
+    def get_what_if_metric(self, league_key, session, overrides, metric):
+        return self.store.get_what_if_metric(league_key, session, overrides, metric)
+
+    def ready_metrics(self, league_key):
+        return self.store.ready_metrics(league_key)
+
+    def live_snapshot(self, league_key):
+        return self.store.live_snapshot(league_key)
+
+class RemoteWorker:
+    """
+    Thin client for one or more worker services. Each league is always routed to the same
+    worker (by hashing its key), so its cached data and metrics are reused.
+    """
+
+    def __init__(self, urls):
+        self.urls = [url.rstrip("/") for url in urls]
+
+    def _url_for(self, league_key):
+        return self.urls[zlib.crc32(league_key.encode()) % len(self.urls)]
+
+    def _request(self, url, payload=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        request = Request(url, data=data, headers={"Content-Type": "application/json"})
+        try:
+            with urlopen(request, timeout=REQUEST_TIMEOUT_SECONDS) as response:
+                return json.loads(response.read())
+        except HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("error", e.reason)
+            except ValueError:
+                message = e.reason
+            raise WorkerError(message) from e
+        except URLError as e:
+            # The worker is down or restarting
+            raise WorkerError(f"Analysis worker unavailable: {e.reason}") from e
+
+    def load_league(self, league_id, year, swid, espn_s2, include_players=False):
+        from worker_service import make_league_key
+
+        url = self._url_for(make_league_key(league_id, year, swid, espn_s2, include_players))
+        response = self._request(f"{url}/leagues", {
+            "league_id": league_id, "year": year, "swid": swid, "espn_s2": espn_s2, "include_players": include_players
+        })
+        return response["league_key"], restore_league_data(response["league_data"])
+
+    def get_metric(self, league_key, metric):
+        url = self._url_for(league_key)
+        return decode_value(self._request(f"{url}/leagues/{quote(league_key)}/metrics/{metric}"))
+
+    def get_what_if_metric(self, league_key, session, overrides, metric):
+        url = self._url_for(league_key)
+        return decode_value(self._request(f"{url}/leagues/{quote(league_key)}/what_if", {
+            "session": session, "metric": metric,
+            "overrides": [[team_id, week, fields] for (team_id, week), fields in overrides.items()]
+        }))
+
+    def ready_metrics(self, league_key):
+        url = self._url_for(league_key)
+        return self._request(f"{url}/leagues/{quote(league_key)}/status")["ready"]
+
+    def live_snapshot(self, league_key):
+        url = self._url_for(league_key)
+        return self._request(f"{url}/leagues/{quote(league_key)}/live")
+
+def get_worker():
+    """
+    Return the remote worker client if ANALYSIS_WORKER_URL is set, otherwise the process-wide local worker.
+    """
+    urls = [url.strip() for url in os.getenv(WORKER_URL_ENV, "").split(",") if url.strip()]
+    if urls:
+        return RemoteWorker(urls)
+
+    global _local_worker
+    with _local_worker_lock:
+        if _local_worker is None:
+            _local_worker = LocalWorker()
+        return _local_worker
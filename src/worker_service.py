@@ -0,0 +1,347 @@
+import argparse
+import base64
+import hashlib
+import io
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# How long fetched league data (and its computed metrics) is reused before refetching from ESPN
+LEAGUE_TTL_SECONDS = 600
+
+# Leagues nobody has asked about for this long are dropped from memory
+LEAGUE_IDLE_SECONDS = 3600
+
+# What-if engines (one per app session and league) kept in memory; the least recently used is dropped first
+WHAT_IF_SESSIONS = 64
+
+def make_league_key(league_id, year, swid, espn_s2, include_players=False):
+    """
+    Build a stable key for a league as seen with a given set of credentials (and fetch mode).
+    The credentials are hashed so they never appear in URLs or logs.
+    """
+    credentials = hashlib.sha256(f"{swid}:{espn_s2}".encode()).hexdigest()[:16]
+    return f"{league_id}-{year}-{credentials}" + ("-players" if include_players else "")
+
+class LeagueStore:
+    """
+    Owns ESPN fetching, the fetched league data, the metric computations and the live pollers for
+    every loaded league. Used in-process by the local worker and behind HTTP by the worker service.
+    """
+
+    def __init__(self, ttl_seconds=LEAGUE_TTL_SECONDS, idle_seconds=LEAGUE_IDLE_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.idle_seconds = idle_seconds
+        self._entries = {}
+        self._what_ifs = OrderedDict()
+        self._pollers = {}
+        self._rollovers = {}
+        self._lock = threading.Lock()
+
+    def load(self, league_id, year, swid, espn_s2, include_players=False):
+        """
+        Fetch a league (or reuse a fresh cached copy) and start computing all metrics in the background.
+        Concurrent loads of the same league share a single ESPN fetch. A copy fetched before a live
+        poller saw the league move on to a new week is not reused, so every session reloading after
+        the week ended shares one new fetch.
+
+        Parameters:
+        - include_players: Optional. Also fetch per-player points for the player-level breakdowns.
+
+        Returns:
+        - (league_key, league_data)
+        """
+        league_key = make_league_key(league_id, year, swid, espn_s2, include_players)
+
+        with self._lock:
+            now = time.monotonic()
+            for idle_key in [key for key, entry in self._entries.items() if now - entry["used_at"] > self.idle_seconds]:
+                del self._entries[idle_key]
+                poller = self._pollers.pop(idle_key, None)
+                if poller is not None:
+                    poller.stop()
+
+            entry = self._entries.get(league_key)
+            rolled_over_at = self._rollovers.get((str(league_id), int(year)))
+            if entry is None or now - entry["loaded_at"] > self.ttl_seconds or \
+                    (rolled_over_at is not None and entry["loaded_at"] < rolled_over_at):
+                entry = {"loaded_at": now, "used_at": now, "league_data": Future(), "futures": {}, "results": {},
+                         "credentials": (league_id, year, swid, espn_s2)}
+                self._entries[league_key] = entry
+                owner = True
+            else:
+                owner = False
+
+        if owner:
+            try:
+                league_data = self._fetch(league_id, year, swid, espn_s2, include_players)
+            except Exception as e:
+                with self._lock:
+                    self._entries.pop(league_key, None)
+                entry["league_data"].set_exception(e)
+                raise
+
+            from metrics import submit_all_metrics
+            entry["futures"] = submit_all_metrics(league_data, entry["results"])
+            entry["league_data"].set_result(league_data)
+
+        return league_key, entry["league_data"].result()
+
+    def _fetch(self, league_id, year, swid, espn_s2, include_players=False):
+        from api_client import create_league, fetch_league_data
+
+        return fetch_league_data(create_league(league_id, year, espn_s2, swid), include_players)
+
+    def _entry(self, league_key):
+        with self._lock:
+            entry = self._entries.get(league_key)
+            if entry is not None:
+                entry["used_at"] = time.monotonic()
+        if entry is None:
+            raise KeyError(league_key)
+        # Wait for an in-flight load of this league to finish
+        entry["league_data"].result()
+        return entry
+
+    def get_league_data(self, league_key):
+        """
+        Return the league data of a loaded league. Raises KeyError if it is not loaded.
+        """
+        return self._entry(league_key)["league_data"].result()
+
+    def get_metric(self, league_key, metric):
+        """
+        Return a metric's result, waiting only for that metric's task if it is still running.
+        Raises KeyError if the league is not loaded.
+        """
+        entry = self._entry(league_key)
+        if metric not in entry["results"]:
+            entry["results"][metric] = entry["futures"][metric].result()
+        return entry["results"][metric]
+
+    def get_what_if_metric(self, league_key, session, overrides, metric):
+        """
+        Return a metric's result with a session's what-if edits applied. Each session keeps its own
+        engine, so only the edits that changed since its last request are applied.
+        Raises KeyError if the league is not loaded and ValueError for an edit without a matchup.
+
+        Parameters:
+        - session: Identifies the app session the edits belong to.
+        - overrides: Dict mapping (team_id, week) to a dict with the edited 'score' and/or 'projected'.
+        - metric: One of WHAT_IF_METRICS.
+        """
+        from incremental import IncrementalLuckMetrics
+        from metrics import compute_what_if_metric
+
+        league_data = self.get_league_data(league_key)
+        with self._lock:
+            what_if = self._what_ifs.get((league_key, session))
+            if what_if is None or what_if["league_data"] is not league_data:
+                what_if = {"league_data": league_data, "engine": None, "lock": threading.Lock()}
+                self._what_ifs[(league_key, session)] = what_if
+            self._what_ifs.move_to_end((league_key, session))
+            while len(self._what_ifs) > WHAT_IF_SESSIONS:
+                self._what_ifs.popitem(last=False)
+
+        exponent = self.get_metric(league_key, 'pythagorean_expectation')['exponent'] \
+            if metric == 'pythagorean_expectation' else None
+        with what_if["lock"]:
+            if what_if["engine"] is None:
+                what_if["engine"] = IncrementalLuckMetrics(league_data)
+            what_if["engine"].apply_overrides(overrides)
+            return compute_what_if_metric(metric, what_if["engine"], exponent)
+
+    def live_snapshot(self, league_key):
+        """
+        Return the live snapshot of a loaded league's in-progress week (see LivePoller.snapshot), plus
+        the poller's 'interval'. Starts the league's poller if needed; it is shared by every session
+        viewing the league and keeps running while it is viewed. Raises KeyError if the league is not loaded.
+        """
+        from live import LivePoller
+
+        entry = self._entry(league_key)
+        league_data = entry["league_data"].result()
+        league_id, year = entry["credentials"][:2]
+
+        with self._lock:
+            for idle_key in [key for key, poller in self._pollers.items() if poller.is_idle()]:
+                del self._pollers[idle_key]
+
+            poller = self._pollers.get(league_key)
+            if poller is None or poller.week < league_data['current_week']:
+                if poller is not None:
+                    poller.stop()
+                poller = LivePoller(*entry["credentials"], league_data,
+                                    on_rollover=partial(self._record_rollover, league_id, year))
+                self._pollers[league_key] = poller
+            poller.touch()
+            poller.start()
+
+        return dict(poller.snapshot(), interval=poller.interval)
+
+    def _record_rollover(self, league_id, year):
+        with self._lock:
+            self._rollovers[(str(league_id), int(year))] = time.monotonic()
+
+    def ready_metrics(self, league_key):
+        """
+        Return the metrics whose results are already available.
+        """
+        entry = self._entry(league_key)
+        return [metric for metric in entry["futures"] if metric in entry["results"]]
+
+def encode_value(value):
+    """
+    Recursively convert a metric result into JSON-compatible data.
+    DataFrames, matplotlib figures (as PNG) and plotly figures are tagged with "__type__"
+    so worker_client.decode_value can rebuild them.
+    """
+    if isinstance(value, dict):
+        return {str(key): encode_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(item) for item in value]
+
+    type_name = type(value).__module__ + "." + type(value).__name__
+    if type_name == "pandas.core.frame.DataFrame":
+        return {"__type__": "dataframe", "data": value.to_json(orient="split")}
+    if type_name == "matplotlib.figure.Figure":
+        buffer = io.BytesIO()
+        value.savefig(buffer, format="png", bbox_inches="tight")
+        return {"__type__": "png", "data": base64.b64encode(buffer.getvalue()).decode("ascii")}
+    if type_name.startswith("plotly.graph_objs"):
+        return {"__type__": "plotly", "data": value.to_json()}
+    if hasattr(value, "tolist"):  # numpy scalars and arrays
+        return value.tolist()
+    return value
+
+class WorkerRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP interface of the worker service:
+    - POST /leagues                             {"league_id", "year", "swid", "espn_s2"[, "include_players"]}
+                                                -> {"league_key", "league_data"}
+    - GET  /leagues/<league_key>                -> {"league_data"}
+    - GET  /leagues/<league_key>/status         -> {"ready": [metric, ...]}
+    - GET  /leagues/<league_key>/live           -> live snapshot of the in-progress week
+    - GET  /leagues/<league_key>/metrics/<name> -> encoded metric result
+    - POST /leagues/<league_key>/what_if        {"session", "metric", "overrides": [[team_id, week, {field: value}], ...]}
+                                                -> encoded metric result with the edits applied
+    - GET  /health                              -> {"status": "ok"}
+    """
+    store = None
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        parts = [unquote(part) for part in urlparse(self.path).path.strip("/").split("/")]
+        if len(parts) == 3 and parts[0] == "leagues" and parts[2] == "what_if":
+            self._post_what_if(parts[1])
+            return
+        if parts != ["leagues"]:
+            self._send_json(404, {"error": "Not found"})
+            return
+
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            credentials = [request[field] for field in ("league_id", "year", "swid", "espn_s2")]
+            include_players = bool(request.get("include_players", False))
+        except (KeyError, ValueError, TypeError) as e:
+            self._send_json(400, {"error": f"Invalid request: {e}"})
+            return
+
+        try:
+            league_key, league_data = self.store.load(*credentials, include_players)
+        except Exception as e:
+            self._send_json(502, {"error": f"Could not fetch league: {e}"})
+            return
+
+        self._send_json(200, {"league_key": league_key, "league_data": encode_value(league_data)})
+
+    def _post_what_if(self, league_key):
+        from metric_names import WHAT_IF_METRICS
+
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            session, metric = str(request["session"]), request["metric"]
+            overrides = {(int(team_id), int(week)): dict(fields) for team_id, week, fields in request["overrides"]}
+            if metric not in WHAT_IF_METRICS:
+                raise ValueError(f"unsupported metric {metric}")
+        except (KeyError, ValueError, TypeError) as e:
+            self._send_json(400, {"error": f"Invalid request: {e}"})
+            return
+
+        try:
+            self._send_json(200, encode_value(self.store.get_what_if_metric(league_key, session, overrides, metric)))
+        except KeyError:
+            self._send_json(404, {"error": f"League {league_key} is not loaded"})
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            self._send_json(500, {"error": f"Computation failed: {e}"})
+
+    def do_GET(self):
+        parts = [unquote(part) for part in urlparse(self.path).path.strip("/").split("/")]
+
+        if parts == ["health"]:
+            self._send_json(200, {"status": "ok"})
+            return
+        if len(parts) < 2 or parts[0] != "leagues":
+            self._send_json(404, {"error": "Not found"})
+            return
+
+        from metric_names import METRICS
+
+        league_key = parts[1]
+        try:
+            if len(parts) == 2:
+                self._send_json(200, {"league_data": encode_value(self.store.get_league_data(league_key))})
+            elif parts[2:] == ["status"]:
+                self._send_json(200, {"ready": self.store.ready_metrics(league_key)})
+            elif parts[2:] == ["live"]:
+                self._send_json(200, encode_value(self.store.live_snapshot(league_key)))
+            elif len(parts) == 4 and parts[2] == "metrics" and parts[3] in METRICS:
+                self._send_json(200, encode_value(self.store.get_metric(league_key, parts[3])))
+            else:
+                self._send_json(404, {"error": "Not found"})
+        except KeyError:
+            self._send_json(404, {"error": f"League {league_key} is not loaded"})
+        except Exception as e:
+            self._send_json(500, {"error": f"Computation failed: {e}"})
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, store=None):
+    """
+    Run the worker service until interrupted. Run one service per core (or host) on different
+    ports and list them all in ANALYSIS_WORKER_URL to scale out; leagues are routed to a fixed worker.
+    """
+    WorkerRequestHandler.store = store or LeagueStore()
+    server = ThreadingHTTPServer((host, port), WorkerRequestHandler)
+    print(f"Analysis worker listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the luck analyzer worker service.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Interface to bind (default: localhost only).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    serve(args.host, args.port)
+
+if __name__ == "__main__":
+    main()